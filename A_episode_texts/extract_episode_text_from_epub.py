@@ -14,13 +14,22 @@ import ebooklib
 from ebooklib import epub
 from bs4 import BeautifulSoup
 
-from utils import load_config
+from utils import get_config
 
-CONFIG = load_config()
+CONFIG = get_config()
 TEXT_DIRECTORY = CONFIG['TEXT_DIRECTORY']
 
-if __name__ == '__main__':
-    book = epub.read_epub(f'{TEXT_DIRECTORY}/the_magnus_archives.epub')
+
+def extract_episode_texts(epub_location):
+    """
+    Parses an ebook of transcripts and separates its text by episode
+    :param epub_location: Location of the .epub file
+    :type epub_location: str
+    :return: Dictionary where key is an episode number and value is the
+        episode text
+    :rtype: dict
+    """
+    book = epub.read_epub(epub_location)
     chapters = [
         item.get_content()
         for item in book.get_items()
@@ -33,5 +42,25 @@ if __name__ == '__main__':
         if re.search('^(MAG)+\d\d\d -', text.strip()):
             episode_number = int(text.strip()[3:7])
             episode_text_dict[episode_number] = text.strip()
-    with open(f'{TEXT_DIRECTORY}/tma_text_from_epub.pkl', 'wb') as outfile:
+    return episode_text_dict
+
+
+def save_episode_texts(episode_text_dict, directory=TEXT_DIRECTORY):
+    """
+    Saves the episode texts as tma_text_from_epub.pkl
+    :param episode_text_dict: Dictionary where key is an episode number and
+        value is the episode text
+    :type episode_text_dict: dict
+    :param directory: Directory in which to save the .pkl file
+    :type directory: str
+    :return: None
+    :rtype: None
+    """
+    with open(f'{directory}/tma_text_from_epub.pkl', 'wb') as outfile:
         pickle.dump(episode_text_dict, outfile)
+    return None
+
+
+if __name__ == '__main__':
+    texts = extract_episode_texts(f'{TEXT_DIRECTORY}/the_magnus_archives.epub')
+    save_episode_texts(texts)
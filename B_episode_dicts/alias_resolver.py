@@ -0,0 +1,64 @@
+"""
+Resolves character aliases (e.g. "MAGNUS" -> "ELIAS") in a single pass.
+
+The consolidation table from config.yaml is compiled once into a flat lookup
+of alias -> canonical name, following chains of aliases in table order (the
+same result as applying one str.replace per table entry, in order). Speaker
+lines are then resolved with one dict lookup each, no matter how many aliases
+the table holds.
+"""
+from utils import get_config
+
+CONFIG = get_config()
+CHARACTER_CONSOLIDATION_DICT = CONFIG['CHARACTER_CONSOLIDATION_DICT']
+
+
+class AliasResolver:
+    """
+    A class used to represent a compiled character consolidation table.
+
+    Attributes
+    ---
+    aliases: dict
+        Dictionary where key is an alias and value is the canonical character
+        name it resolves to
+    """
+
+    def __init__(self, consolidation_dict=CHARACTER_CONSOLIDATION_DICT):
+        """
+        :param consolidation_dict: Dictionary where key is an alias and value
+            is the name to replace it with. Keys and values may be wrapped in
+            newlines (as in config.yaml)
+        :type consolidation_dict: dict
+        """
+        table = [
+            (alias.strip('\n'), name.strip('\n'))
+            for alias, name in consolidation_dict.items()
+        ]
+        self.aliases = {}
+        for alias, _ in table:
+            resolved = alias
+            for a, name in table:
+                if resolved == a:
+                    resolved = name
+            if resolved != alias:
+                self.aliases[alias] = resolved
+
+    def resolve(self, line, fired=None):
+        """
+        Resolves a single line (e.g. a speaker name)
+        :param line: Line of the transcript
+        :type line: str
+        :param fired: If provided, the count for the alias is incremented
+            when the line is an alias
+        :type fired: collections.Counter
+        :return: Canonical character name if the line is an alias, otherwise
+            the line unchanged
+        :rtype: str
+        """
+        resolved = self.aliases.get(line)
+        if resolved is None:
+            return line
+        if fired is not None:
+            fired[line] += 1
+        return resolved
@@ -0,0 +1,115 @@
+"""
+Dense (character x episode) and (pair x episode) versions of the node and
+edge appearance dicts.
+
+Row i of the word matrix holds the words spoken by character ID i in each
+episode, and row j of the closeness matrix holds the closeness of pair
+pair_keys[j] (see character_registry.py) in each episode. Column e - 1 is
+episode e. Charts that need a whole row, or every row, read them directly
+instead of walking the nested dicts.
+
+cast_orders() ranks the rows of a word matrix for the all-character
+heatmap, by first appearance or by total words spoken.
+"""
+from utils import get_config, lazy_import
+
+np = lazy_import('numpy')
+
+CONFIG = get_config()
+DICT_DIRECTORY = CONFIG['DICT_DIRECTORY']
+CAST_ORDERS = ('first_appearance', 'total_words')
+
+
+def build_appearance_matrices(
+    node_appearance_dict, edges_appearance_dict, registry, end_episode
+):
+    """
+    Builds the word and closeness matrices from the appearance dicts
+    :param node_appearance_dict: Node appearance dict
+    :type node_appearance_dict: dict
+    :param edges_appearance_dict: Edge appearance dict
+    :type edges_appearance_dict: dict
+    :param registry: Registry whose IDs give the row of each character
+    :type registry: CharacterRegistry
+    :param end_episode: Last episode (number of columns)
+    :type end_episode: int
+    :return: Dictionary with keys:
+        'characters': character names, in ID order
+        'words': (characters x episodes) array of words spoken
+        'pair_keys': packed pair key of each closeness row
+        'closeness': (pairs x episodes) array of closeness scores
+    :rtype: dict
+    """
+    for node in node_appearance_dict:
+        registry.intern(node)
+    pair_keys = [registry.pair_key(edge) for edge in edges_appearance_dict]
+    words = np.zeros((len(registry), end_episode), dtype=np.uint32)
+    for node, appearances in node_appearance_dict.items():
+        row = registry.id_of(node)
+        for e, attributes in appearances.items():
+            if e <= end_episode:
+                words[row, e - 1] = attributes['size']
+    closeness = np.zeros((len(pair_keys), end_episode), dtype=np.float64)
+    for row, appearances in enumerate(edges_appearance_dict.values()):
+        for e, attributes in appearances.items():
+            if e <= end_episode:
+                closeness[row, e - 1] = attributes['weight']
+    return {
+        'characters': np.array(registry.names),
+        'words': words,
+        'pair_keys': np.array(pair_keys, dtype=np.uint32),
+        'closeness': closeness,
+    }
+
+
+def cast_orders(words):
+    """
+    Ranks the characters of a word matrix for the all-character heatmap
+    :param words: (characters x episodes) array of words spoken
+    :type words: numpy.ndarray
+    :return: Dictionary where key is a CAST_ORDERS entry and value is the
+        array of row indices in that order:
+        'first_appearance': earliest first appearance first (characters
+            with no words last), ties broken by total words
+        'total_words': most words first
+    :rtype: dict
+    """
+    spoke = words > 0
+    first = np.where(spoke.any(axis=1), spoke.argmax(axis=1), words.shape[1])
+    total = words.sum(axis=1, dtype=np.int64)
+    return {
+        'first_appearance': np.lexsort((-total, first)),
+        'total_words': np.argsort(-total, kind='stable'),
+    }
+
+
+def open_appearance_matrices(directory=DICT_DIRECTORY):
+    """
+    Opens the matrices saved by save_appearance_matrices
+    :param directory: Directory in which appearance_matrices.npz is saved
+    :type directory: str
+    :return: Output of build_appearance_matrices
+    :rtype: dict
+    """
+    with np.load(f'{directory}/appearance_matrices.npz') as f:
+        matrices = {k: f[k] for k in f.files}
+    return matrices
+
+
+def save_appearance_matrices(matrices, directory=DICT_DIRECTORY, logger=None):
+    """
+    Saves the appearance matrices as a compressed .npz file
+    :param matrices: Output of build_appearance_matrices
+    :type matrices: dict
+    :param directory: Directory in which appearance_matrices.npz is saved
+    :type directory: str
+    :param logger: logging.Logger object
+    :type logger: logging.Logger object
+    :return: None
+    :rtype: None
+    """
+    location = f'{directory}/appearance_matrices.npz'
+    np.savez_compressed(location, **matrices)
+    if logger:
+        logger.info(f'Saved appearance matrices in {location}')
+    return None
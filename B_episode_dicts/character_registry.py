@@ -0,0 +1,124 @@
+"""
+Interns character names as small integer IDs so that the episode dicts can be
+keyed by ints (nodes) and packed int pairs (edges) instead of name strings and
+sorted name tuples.
+"""
+PAIR_SHIFT = 16
+MAX_CHARACTERS = 1 << PAIR_SHIFT
+
+
+class CharacterRegistry:
+    """
+    A class used to represent the mapping between character names and IDs.
+
+    Attributes
+    ---
+    names: list
+        Character names, where the index of a name is its ID
+    ids: dict
+        Dictionary where key is a character name and value is its ID
+    """
+
+    __slots__ = ('names', 'ids')
+
+    def __init__(self, names=None):
+        """
+        :param names: Character names to intern, in ID order
+        :type names: list
+        """
+        self.names = []
+        self.ids = {}
+        for name in names or []:
+            self.intern(name)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.ids
+
+    def __reduce__(self):
+        return self.__class__, (self.names,)
+
+    def intern(self, name):
+        """
+        Returns the ID of a character name, assigning the next free ID if the
+        name has not been seen before
+        :param name: Character name
+        :type name: str
+        :return: Character ID
+        :rtype: int
+        """
+        character_id = self.ids.get(name)
+        if character_id is None:
+            character_id = len(self.names)
+            assert character_id < MAX_CHARACTERS
+            self.names.append(name)
+            self.ids[name] = character_id
+        return character_id
+
+    def id_of(self, name):
+        """
+        :param name: Character name
+        :type name: str
+        :return: Character ID
+        :rtype: int
+        """
+        return self.ids[name]
+
+    def name_of(self, character_id):
+        """
+        :param character_id: Character ID
+        :type character_id: int
+        :return: Character name
+        :rtype: str
+        """
+        return self.names[character_id]
+
+    def pair_key(self, edge):
+        """
+        Interns both characters of an edge and packs their IDs into one int
+        :param edge: Tuple representing a character pair
+        :type edge: tuple
+        :return: Packed pair key
+        :rtype: int
+        """
+        return pack_pair(self.intern(edge[0]), self.intern(edge[1]))
+
+    def pair_names(self, key):
+        """
+        Unpacks a pair key into the edge tuple used by the episode dicts
+        (character names sorted alphabetically)
+        :param key: Packed pair key
+        :type key: int
+        :return: Tuple representing a character pair
+        :rtype: tuple
+        """
+        id_1, id_2 = unpack_pair(key)
+        return tuple(sorted((self.names[id_1], self.names[id_2])))
+
+
+def pack_pair(id_1, id_2):
+    """
+    Packs two character IDs into a single int that does not depend on the
+    order of the IDs
+    :param id_1: ID of a character in the pair
+    :type id_1: int
+    :param id_2: ID of another character in the pair
+    :type id_2: int
+    :return: Packed pair key
+    :rtype: int
+    """
+    if id_1 > id_2:
+        id_1, id_2 = id_2, id_1
+    return (id_1 << PAIR_SHIFT) | id_2
+
+
+def unpack_pair(key):
+    """
+    :param key: Packed pair key
+    :type key: int
+    :return: The two character IDs (lower ID first)
+    :rtype: (int, int)
+    """
+    return key >> PAIR_SHIFT, key & (MAX_CHARACTERS - 1)
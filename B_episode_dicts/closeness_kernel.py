@@ -0,0 +1,170 @@
+"""
+Scores the closeness of every character pair in a scene at once, for any
+kernel over the line distance between their appearances.
+
+Each appearance of a character in a scene is a line number. The kernel
+gives the weight of an exchange between two appearances from their line
+distance, and the closeness of a pair is the sum of the weights over all
+pairs of their appearances. For a scene with characters 1..n, this is the
+matrix product X K X^T, where X is the (characters x appearances) indicator
+matrix of who speaks each line and K holds the kernel weight of every pair
+of appearances.
+
+Kernels (d is the line distance, L is LINES_NEEDED_FOR_CLOSENESS):
+    'window': 1 if d <= L, else 0 (the original hard window, whose integer
+        counts are reproduced exactly)
+    'triangular': (L + 1 - d) / L, falling linearly from 1 at d = 1 to 0
+        beyond L
+    'exponential': exp(-(d - 1) / L), 1 at d = 1 and 1/e at d = L + 1, with
+        no cut-off
+"""
+from utils import get_config, lazy_import
+
+np = lazy_import('numpy')
+
+CONFIG = get_config()
+LINES_NEEDED_FOR_CLOSENESS = CONFIG['LINES_NEEDED_FOR_CLOSENESS']
+CLOSENESS_KERNEL = CONFIG['CLOSENESS_KERNEL']
+
+
+def window_kernel(distances, lines_needed):
+    """
+    1 within lines_needed lines, 0 beyond
+    :param distances: Line distances (at least 1)
+    :type distances: numpy.ndarray
+    :param lines_needed: Width of the kernel in lines
+    :type lines_needed: int
+    :return: Weight of an exchange at each distance
+    :rtype: numpy.ndarray
+    """
+    return (distances <= lines_needed).astype(np.float64)
+
+
+def triangular_kernel(distances, lines_needed):
+    """
+    Falls linearly from 1 at distance 1 to 0 beyond lines_needed
+    :param distances: Line distances (at least 1)
+    :type distances: numpy.ndarray
+    :param lines_needed: Width of the kernel in lines
+    :type lines_needed: int
+    :return: Weight of an exchange at each distance
+    :rtype: numpy.ndarray
+    """
+    return np.clip((lines_needed + 1 - distances) / lines_needed, 0, None)
+
+
+def exponential_kernel(distances, lines_needed):
+    """
+    Decays by a factor of e every lines_needed lines
+    :param distances: Line distances (at least 1)
+    :type distances: numpy.ndarray
+    :param lines_needed: Width of the kernel in lines
+    :type lines_needed: int
+    :return: Weight of an exchange at each distance
+    :rtype: numpy.ndarray
+    """
+    return np.exp(-(distances - 1) / lines_needed)
+
+
+KERNELS = {
+    'window': window_kernel,
+    'triangular': triangular_kernel,
+    'exponential': exponential_kernel,
+}
+
+
+class ClosenessKernel:
+    """
+    A class used to represent a kernel over the line distance between two
+    characters' appearances in a scene.
+
+    Attributes
+    ---
+    kernel: str
+        Name of the kernel (a key of KERNELS)
+    lines_needed: int
+        Line distance that sets the width of the kernel
+    """
+
+    def __init__(
+        self, kernel=CLOSENESS_KERNEL, lines_needed=LINES_NEEDED_FOR_CLOSENESS
+    ):
+        """
+        :param kernel: Name of the kernel (a key of KERNELS)
+        :type kernel: str
+        :param lines_needed: Line distance that sets the width of the kernel
+        :type lines_needed: int
+        """
+        if kernel not in KERNELS:
+            raise ValueError(
+                f'Unknown closeness kernel {kernel!r} '
+                f'(expected one of {", ".join(KERNELS)})'
+            )
+        self.kernel = kernel
+        self.lines_needed = lines_needed
+
+    def weights(self, distances):
+        """
+        :param distances: Line distances (at least 1)
+        :type distances: numpy.ndarray
+        :return: Weight of an exchange at each distance
+        :rtype: numpy.ndarray
+        """
+        return KERNELS[self.kernel](distances, self.lines_needed)
+
+    def scene_scores(self, scene_info):
+        """
+        Scores every pair of characters in a scene
+        :param scene_info: Dictionary where key is a character in the scene
+            and value is a dictionary with their line 'appearances'
+        :type scene_info: dict
+        :return: Characters in the scene, and the (characters x characters)
+            matrix whose [i, j] entry is the summed weight of the exchanges
+            between characters i and j (0 on the diagonal)
+        :rtype: list, numpy.ndarray
+        """
+        characters = list(scene_info)
+        lines = [
+            np.asarray(scene_info[c]['appearances'], dtype=np.int64)
+            for c in characters
+        ]
+        line_numbers = np.concatenate(lines)
+        speakers = np.repeat(
+            np.arange(len(characters)), [len(l) for l in lines]
+        )
+        indicator = np.zeros((len(characters), len(line_numbers)))
+        indicator[speakers, np.arange(len(line_numbers))] = 1
+        distances = np.abs(np.subtract.outer(line_numbers, line_numbers))
+        scores = indicator @ self.weights(distances) @ indicator.T
+        np.fill_diagonal(scores, 0)
+        return characters, scores
+
+    def exchanges(self, appearances_1, appearances_2):
+        """
+        Finds the lines where two characters interact in a scene. Every pair
+        of their appearances with a positive kernel weight (an interaction
+        counted by scene_scores) spans a range of lines; overlapping ranges
+        are merged into one exchange
+        :param appearances_1: Line appearances of a character in the scene
+        :type appearances_1: array.array
+        :param appearances_2: Line appearances of another character
+        :type appearances_2: array.array
+        :return: Exchanges as (first line, last line, number of interactions)
+            tuples, in line order
+        :rtype: list
+        """
+        lines_1 = np.asarray(appearances_1, dtype=np.int64)
+        lines_2 = np.asarray(appearances_2, dtype=np.int64)
+        distances = np.abs(np.subtract.outer(lines_1, lines_2))
+        i, j = np.nonzero(self.weights(distances) > 0)
+        starts = np.minimum(lines_1[i], lines_2[j])
+        ends = np.maximum(lines_1[i], lines_2[j])
+        order = np.lexsort((ends, starts))
+        exchanges = []
+        for start, end in zip(starts[order].tolist(), ends[order].tolist()):
+            if exchanges and start <= exchanges[-1][1]:
+                exchanges[-1][1] = max(exchanges[-1][1], end)
+                exchanges[-1][2] += 1
+            else:
+                exchanges.append([start, end, 1])
+        return [tuple(exchange) for exchange in exchanges]
@@ -0,0 +1,73 @@
+"""
+Closeness between every pair of a set of characters over any range of
+episodes.
+
+The (pairs x episodes) closeness matrix of the appearance matrices is laid
+out as a dense (episodes x characters x characters) array and summed along
+the episodes once. Row e of the running sum holds the closeness of every
+pair up to and including episode e (row 0 is all zeros), flattened, so the
+closeness over episodes start to end is row end minus row start - 1,
+reshaped into a (characters x characters) matrix.
+"""
+from utils import lazy_import
+from B_episode_dicts.character_registry import unpack_pair
+
+np = lazy_import('numpy')
+
+
+class ClosenessMatrix:
+    """
+    A class used to represent the running closeness of every pair of a set
+    of characters.
+
+    Attributes
+    ---
+    characters: list
+        Characters in the order of the matrix rows and columns
+    end_episode: int
+        Last episode covered
+    cumulative: numpy.ndarray
+        (episodes + 1 x characters * characters) array whose row e holds the
+        closeness of every pair up to and including episode e
+    """
+
+    def __init__(self, matrices, characters):
+        """
+        :param matrices: Output of build_appearance_matrices
+        :type matrices: dict
+        :param characters: Characters to include
+        :type characters: list
+        """
+        ids = {name: i for i, name in enumerate(matrices['characters'])}
+        rows = np.full(len(ids), -1)
+        rows[[ids[c] for c in characters]] = np.arange(len(characters))
+        pairs = np.array(
+            [unpack_pair(int(key)) for key in matrices['pair_keys']],
+            dtype=int,
+        ).reshape(-1, 2)
+        a, b = rows[pairs[:, 0]], rows[pairs[:, 1]]
+        kept = (a >= 0) & (b >= 0)
+        closeness = matrices['closeness'][kept].T
+        n, episodes = len(characters), closeness.shape[0]
+        square = np.zeros((episodes + 1, n, n))
+        square[1:, a[kept], b[kept]] = closeness
+        square[1:, b[kept], a[kept]] = closeness
+        self.characters = list(characters)
+        self.end_episode = episodes
+        self.cumulative = np.cumsum(square, axis=0).reshape(episodes + 1, -1)
+
+    def between(self, start_episode, end_episode):
+        """
+        :param start_episode: First episode of the range
+        :type start_episode: int
+        :param end_episode: Last episode of the range
+        :type end_episode: int
+        :return: (characters x characters) matrix of the closeness of each
+            pair over the range
+        :rtype: numpy.ndarray
+        """
+        n = len(self.characters)
+        window = (
+            self.cumulative[end_episode] - self.cumulative[start_episode - 1]
+        )
+        return window.reshape(n, n)
@@ -0,0 +1,282 @@
+"""
+Compact, array-backed records for the episode dicts.
+
+Each record stores character IDs (see character_registry.py) and their
+attributes in typed arrays rather than nested {'size': ...} / {'weight': ...}
+dicts. pack_records flattens the records of a dict into a handful of arrays
+(see shared_dicts.py), and pack_scenes does the same for the parsed scenes
+(see save_scenes_as_pkl).
+"""
+import itertools
+from array import array
+
+NODE_ID_TYPECODE = 'H'
+PAIR_KEY_TYPECODE = 'I'
+LINE_TYPECODE = 'I'
+SIZE_TYPECODE = 'I'
+WEIGHT_TYPECODE = 'd'
+EPISODE_TYPECODE = 'H'
+
+
+class SceneRecord:
+    """
+    A class used to represent the character info in a single scene.
+
+    Attributes
+    ---
+    character_ids: array.array
+        IDs of the characters speaking in the scene
+    word_counts: array.array
+        Words spoken by each character in the scene
+    appearances: tuple
+        Line appearances (array.array) of each character in the scene
+    """
+
+    __slots__ = ('character_ids', 'word_counts', 'appearances')
+
+    def __init__(self, character_ids, word_counts, appearances):
+        self.character_ids = array(NODE_ID_TYPECODE, character_ids)
+        self.word_counts = array(SIZE_TYPECODE, word_counts)
+        self.appearances = tuple(array(LINE_TYPECODE, a) for a in appearances)
+
+    @classmethod
+    def from_character_info(cls, character_info, registry):
+        """
+        :param character_info: A nested dictionary where key is a character
+            name and value is a dictionary with words spoken and line
+            appearances (see TMAEpisode.generate_character_info)
+        :type character_info: dict
+        :param registry: Registry used to intern character names
+        :type registry: CharacterRegistry
+        :return: Scene record
+        :rtype: SceneRecord
+        """
+        return cls(
+            [registry.intern(c) for c in character_info],
+            [info['word_count'] for info in character_info.values()],
+            [info['appearances'] for info in character_info.values()],
+        )
+
+    def to_character_info(self, registry):
+        """
+        :param registry: Registry used to intern character names
+        :type registry: CharacterRegistry
+        :return: A nested dictionary where key is a character name and value
+            is a dictionary with words spoken and line appearances
+        :rtype: dict
+        """
+        return {
+            registry.name_of(c): {'word_count': w, 'appearances': a}
+            for c, w, a in zip(
+                self.character_ids, self.word_counts, self.appearances
+            )
+        }
+
+
+class EpisodeRecord:
+    """
+    A class used to represent the nodes and edges of an (individual or
+    cumulative) episode.
+
+    Attributes
+    ---
+    node_ids: array.array
+        IDs of the characters appearing in the episode
+    sizes: array.array
+        Node size (words spoken) of each character
+    edge_keys: array.array
+        Packed pair keys of the character pairs appearing in the episode
+    weights: array.array
+        Edge weight (closeness) of each character pair
+    """
+
+    __slots__ = ('node_ids', 'sizes', 'edge_keys', 'weights')
+
+    def __init__(self, node_ids, sizes, edge_keys, weights):
+        self.node_ids = array(NODE_ID_TYPECODE, node_ids)
+        self.sizes = array(SIZE_TYPECODE, sizes)
+        self.edge_keys = array(PAIR_KEY_TYPECODE, edge_keys)
+        self.weights = array(WEIGHT_TYPECODE, weights)
+
+    @classmethod
+    def from_dicts(cls, nodes_dict, edges_dict, registry):
+        """
+        :param nodes_dict: Nodes dict attribute from TMAEpisode
+        :type nodes_dict: dict
+        :param edges_dict: Edges dict attribute from TMAEpisode
+        :type edges_dict: dict
+        :param registry: Registry used to intern character names
+        :type registry: CharacterRegistry
+        :return: Episode record
+        :rtype: EpisodeRecord
+        """
+        return cls(
+            [registry.intern(n) for n in nodes_dict],
+            [v['size'] for v in nodes_dict.values()],
+            [registry.pair_key(e) for e in edges_dict],
+            [v['weight'] for v in edges_dict.values()],
+        )
+
+
+class AppearanceRecord:
+    """
+    A class used to represent the episode appearances of a node or edge.
+
+    Attributes
+    ---
+    episodes: array.array
+        Episode numbers in which the node/edge appears
+    values: array.array
+        Appearance attribute (size or weight) in each of those episodes
+    """
+
+    __slots__ = ('episodes', 'values')
+
+    def __init__(self, episodes, values, typecode=WEIGHT_TYPECODE):
+        self.episodes = array(EPISODE_TYPECODE, episodes)
+        self.values = array(typecode, values)
+
+    def __len__(self):
+        return len(self.episodes)
+
+
+def pack_records(records):
+    """
+    Flattens a dictionary of EpisodeRecords or AppearanceRecords into one
+    array per record attribute, so that pickling it costs a handful of array
+    buffers instead of one pickled object per record
+    :param records: A compact TMA dictionary (see compact_dict)
+    :type records: dict
+    :return: Record class, array of keys, and a dictionary where key is a
+        record attribute and value is the array of record lengths and the
+        concatenated attribute array
+    :rtype: (type, array.array, dict)
+    """
+    record_cls = type(next(iter(records.values()), AppearanceRecord((), ())))
+    keys = array('Q', records)
+    columns = {}
+    for slot in record_cls.__slots__:
+        attributes = [getattr(r, slot) for r in records.values()]
+        lengths = array('I', [len(a) for a in attributes])
+        flat = array(attributes[0].typecode if attributes else 'd')
+        for a in attributes:
+            flat.extend(a)
+        columns[slot] = (lengths, flat)
+    return record_cls, keys, columns
+
+
+def pack_scenes(scene_info_dict, registry):
+    """
+    Flattens the character info in each scene of each episode into a handful
+    of arrays
+    :param scene_info_dict: Dictionary where key is an episode number and
+        value is the speaker_info_in_scenes attribute of its TMAEpisode
+    :type scene_info_dict: dict
+    :param registry: Registry used to intern character names
+    :type registry: CharacterRegistry
+    :return: Dictionary where key is a column name and value is its array
+    :rtype: dict
+    """
+    columns = {
+        'episodes': array(EPISODE_TYPECODE),
+        'scenes_per_episode': array('I'),
+        'characters_per_scene': array('I'),
+        'character_ids': array(NODE_ID_TYPECODE),
+        'word_counts': array(SIZE_TYPECODE),
+        'appearances_per_character': array('I'),
+        'appearances': array(LINE_TYPECODE),
+    }
+    for e, scenes in scene_info_dict.items():
+        columns['episodes'].append(e)
+        columns['scenes_per_episode'].append(len(scenes))
+        for scene_i in range(len(scenes)):
+            record = SceneRecord.from_character_info(scenes[scene_i], registry)
+            columns['characters_per_scene'].append(len(record.character_ids))
+            columns['character_ids'].extend(record.character_ids)
+            columns['word_counts'].extend(record.word_counts)
+            for a in record.appearances:
+                columns['appearances_per_character'].append(len(a))
+                columns['appearances'].extend(a)
+    return columns
+
+
+def unpack_scenes(columns):
+    """
+    Rebuilds the scene records flattened with pack_scenes
+    :param columns: Output of pack_scenes
+    :type columns: dict
+    :return: Dictionary where key is an episode number and value is a tuple
+        of SceneRecords, indexed by scene number
+    :rtype: dict
+    """
+    character_ids = iter(columns['character_ids'])
+    word_counts = iter(columns['word_counts'])
+    appearance_lengths = iter(columns['appearances_per_character'])
+    characters_per_scene = iter(columns['characters_per_scene'])
+    appearances = columns['appearances']
+    start = 0
+    scenes_dict = {}
+    for e, n_scenes in zip(columns['episodes'], columns['scenes_per_episode']):
+        scenes = []
+        for _ in range(n_scenes):
+            record = SceneRecord.__new__(SceneRecord)
+            n_characters = next(characters_per_scene)
+            record.character_ids = array(
+                NODE_ID_TYPECODE, itertools.islice(character_ids, n_characters)
+            )
+            record.word_counts = array(
+                SIZE_TYPECODE, itertools.islice(word_counts, n_characters)
+            )
+            scene_appearances = []
+            for _ in range(n_characters):
+                length = next(appearance_lengths)
+                scene_appearances.append(appearances[start : start + length])
+                start += length
+            record.appearances = tuple(scene_appearances)
+            scenes.append(record)
+        scenes_dict[e] = tuple(scenes)
+    return scenes_dict
+
+
+def compact_dict(episode_dict, dict_type, registry):
+    """
+    Converts a TMA dictionary into its compact form
+    :param episode_dict: A TMA dictionary
+    :type episode_dict: dict
+    :param dict_type: One of four options:
+        1. 'individual' for individual episode dict
+        2. 'cumulative' for  cumulative episode dict
+        3. 'ea' for edge appearance dict
+        4. 'na' for node appearance dict
+    :type dict_type: str
+    :param registry: Registry used to intern character names
+    :type registry: CharacterRegistry
+    :return: Dictionary where key is an episode number (individual,
+        cumulative), a character ID (na) or a packed pair key (ea) and value
+        is the corresponding record
+    :rtype: dict
+    """
+    if dict_type in ('individual', 'cumulative'):
+        return {
+            e: EpisodeRecord.from_dicts(
+                v['nodes_dict'], v['edges_dict'], registry
+            )
+            for e, v in episode_dict.items()
+        }
+    assert dict_type in ('na', 'ea')
+    if dict_type == 'na':
+        key_func, attribute, typecode = registry.intern, 'size', SIZE_TYPECODE
+    else:
+        key_func, attribute, typecode = (
+            registry.pair_key,
+            'weight',
+            WEIGHT_TYPECODE,
+        )
+    return {
+        key_func(item): AppearanceRecord(
+            appearances.keys(),
+            [v[attribute] for v in appearances.values()],
+            typecode,
+        )
+        for item, appearances in episode_dict.items()
+    }
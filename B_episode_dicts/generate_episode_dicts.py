@@ -1,4 +1,5 @@
 import copy
+from collections import Counter
 import argparse
 import sys
 import os
@@ -6,17 +7,51 @@ import os
 p = os.path.abspath('.')
 sys.path.insert(1, p)
 
-from utils import create_logger, load_config
-from B_episode_dicts.tma_episode_processor import TMAEpisode
-from B_episode_dicts.save_and_load_dict import save_dict_as_pkl
+from utils import create_logger, get_config
+from B_episode_dicts.tma_episode_processor import (
+    TMAEpisode,
+    open_episode_texts,
+)
+from B_episode_dicts.character_registry import CharacterRegistry
+from B_episode_dicts.interaction_index import (
+    build_interaction_index,
+    save_interaction_index,
+)
+from B_episode_dicts.appearance_matrices import (
+    build_appearance_matrices,
+    save_appearance_matrices,
+)
+from B_episode_dicts.inclusion_index import (
+    build_inclusion_index,
+    save_inclusion_index,
+)
+from B_episode_dicts.leaderboards import (
+    build_leaderboards,
+    save_leaderboards,
+)
+from B_episode_dicts.graph_metrics import (
+    compute_graph_metrics,
+    save_graph_metrics,
+)
+from B_episode_dicts.save_and_load_dict import (
+    open_scenes_as_pkl,
+    save_dict_as_pkl,
+    save_scenes_as_pkl,
+)
+from B_episode_dicts.shared_dicts import save_shared_dicts
 
-CONFIG = load_config()
+CONFIG = get_config()
 MAX_EPISODE = CONFIG['MAX_EPISODE']
 DICT_DIRECTORY = CONFIG['DICT_DIRECTORY']
 
 
 def generate_individual_episode_dict(
-    start_episode, end_episode, logger_object=None
+    start_episode,
+    end_episode,
+    logger_object=None,
+    scene_info_dict=None,
+    episode_texts=None,
+    interactions_dict=None,
 ):
     """
     Generates
@@ -33,21 +68,44 @@ def generate_individual_episode_dict(
     :type end_episode: int
     :param logger_object: a logging.Logger object
     :type logger_object: logging.Logger object
+    :param scene_info_dict: Dictionary where key is an episode number and
+        value is the speaker info in each scene of that episode (see
+        open_scenes_as_pkl). Episodes found in it are built from it without
+        reparsing their transcripts; episodes that are parsed are added to it
+    :type scene_info_dict: dict
+    :param episode_texts: Dictionary where key is an episode number and value
+        is the episode text. If not provided and an episode needs parsing, it
+        is loaded from the text directory
+    :type episode_texts: dict
+    :param interactions_dict: If provided, filled with the interactions_dict
+        attribute of each episode's TMAEpisode, keyed by episode number
+    :type interactions_dict: dict
     :return: Individual episode dictionary, node appearance dict, edge
         appearance dict
     :rtype: dict, dict, dict
     """
     list_of_episodes = [i for i in range(start_episode, end_episode + 1)]
+    if scene_info_dict is None:
+        scene_info_dict = {}
+    if episode_texts is None and any(
+        e not in scene_info_dict for e in list_of_episodes
+    ):
+        episode_texts = open_episode_texts()
     if logger_object:
         logger_object.debug(f'{list_of_episodes=}')
     individual_episode_dict = {}
     edge_appearance_dict = {}
     node_appearance_dict = {}
+    aliases_fired = Counter()
     for e in list_of_episodes:
-        episode = TMAEpisode(e)
+        episode = TMAEpisode(e, episode_texts=episode_texts)
         if logger_object:
             logger_object.info(f'Episode {e} created')
-        episode()
+        episode(scene_info_dict.get(e))
+        scene_info_dict[e] = episode.speaker_info_in_scenes
+        aliases_fired.update(episode.aliases_fired)
+        if interactions_dict is not None:
+            interactions_dict[e] = episode.interactions_dict
         individual_episode_dict[e] = {
             'nodes_dict': episode.nodes_dict,
             'edges_dict': episode.edges_dict,
@@ -58,6 +116,8 @@ def generate_individual_episode_dict(
         update_item_appearance_dict(
             episode.nodes_dict, node_appearance_dict, episode.number
         )
+    if logger_object:
+        logger_object.info(f'Character aliases resolved: {dict(aliases_fired)}')
     return individual_episode_dict, edge_appearance_dict, node_appearance_dict
 
 
@@ -168,6 +228,111 @@ def update_cumulative_items_dict(
     return prev_items_dict_update
 
 
+def generate_episode_dicts(
+    start_episode,
+    end_episode,
+    logger_object=None,
+    scene_info_dict=None,
+    episode_texts=None,
+):
+    """
+    Generates the individual, cumulative, node appearance, and edge
+    appearance dicts and the graph metrics for a range of episodes
+    :param start_episode: First episode to appear in dictionary
+    :type start_episode: int
+    :param end_episode: Last episode to appear in dictionary
+    :type end_episode: int
+    :param logger_object: a logging.Logger object
+    :type logger_object: logging.Logger object
+    :param scene_info_dict: see generate_individual_episode_dict
+    :type scene_info_dict: dict
+    :param episode_texts: see generate_individual_episode_dict
+    :type episode_texts: dict
+    :return: Dictionary where key is 'individual', 'cumulative', 'na', 'ea',
+        'graph_metrics', 'appearance_matrices', 'leaderboards',
+        'interaction_index', 'inclusion_index', or 'registry' and value is
+        the corresponding output
+    :rtype: dict
+    """
+    interactions_dict = {}
+    indi, ea, na = generate_individual_episode_dict(
+        start_episode,
+        end_episode,
+        logger_object,
+        scene_info_dict,
+        episode_texts,
+        interactions_dict,
+    )
+    if logger_object:
+        logger_object.info(
+            '''
+            Finished generating individual episode dict, 
+            node appearance dict, and edge appearance dict
+            '''
+        )
+        logger_object.debug(f'Ending episode (i): {indi[end_episode]}')
+    cumu = generate_cumulative_episode_dict(indi, logger_object)
+    if logger_object:
+        logger_object.info('Finished generating cumulative episode dict')
+        logger_object.debug(f'Ending episode (c): {cumu[end_episode]}')
+    registry = CharacterRegistry(na)
+    graph_metrics = compute_graph_metrics(indi, registry, logger_object)
+    appearance_matrices = build_appearance_matrices(
+        na, ea, registry, end_episode
+    )
+    leaderboards = build_leaderboards(appearance_matrices)
+    interaction_index = build_interaction_index(interactions_dict, registry)
+    return {
+        'individual': indi,
+        'cumulative': cumu,
+        'na': na,
+        'ea': ea,
+        'graph_metrics': graph_metrics,
+        'appearance_matrices': appearance_matrices,
+        'leaderboards': leaderboards,
+        'interaction_index': interaction_index,
+        'inclusion_index': build_inclusion_index(na, ea),
+        'registry': registry,
+    }
+
+
+def save_episode_dicts(
+    episode_dicts, directory=DICT_DIRECTORY, scene_info_dict=None, logger=None
+):
+    """
+    Saves the outputs of generate_episode_dicts (and optionally the parsed
+    scenes) to a directory
+    :param episode_dicts: Output of generate_episode_dicts
+    :type episode_dicts: dict
+    :param directory: Directory to which to save the episode dicts
+    :type directory: str
+    :param scene_info_dict: If provided, saved as scenes.pkl
+    :type scene_info_dict: dict
+    :param logger: logging.Logger object
+    :type logger: logging.Logger object
+    :return: None
+    :rtype: None
+    """
+    if scene_info_dict is not None:
+        save_scenes_as_pkl(scene_info_dict, directory, logger)
+    registry = episode_dicts['registry']
+    for dict_type in ('na', 'ea', 'individual', 'cumulative'):
+        save_dict_as_pkl(
+            episode_dicts[dict_type], dict_type, directory, logger
+        )
+    save_shared_dicts(episode_dicts, registry, directory, logger)
+    save_graph_metrics(episode_dicts['graph_metrics'], directory, logger)
+    save_appearance_matrices(
+        episode_dicts['appearance_matrices'], directory, logger
+    )
+    save_leaderboards(episode_dicts['leaderboards'], directory, logger)
+    save_interaction_index(
+        episode_dicts['interaction_index'], directory, logger
+    )
+    save_inclusion_index(episode_dicts['inclusion_index'], directory, logger)
+    return None
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument(
@@ -200,6 +365,12 @@ if __name__ == '__main__':
         default=DICT_DIRECTORY,
         help='Directory to which to save the episode dicts',
     )
+    parser.add_argument(
+        '--from_scenes',
+        action='store_true',
+        help='Build the dicts from the saved scenes.pkl in the save '
+        'directory instead of reparsing the transcripts',
+    )
     args = parser.parse_args()
     if args.end_episode < args.start_episode:
         parser.error('Start episode # must be less than end episode #')
@@ -207,20 +378,20 @@ if __name__ == '__main__':
         'episode_dicts', logging_level=args.logging_level.upper()
     )
     logger.info(vars(args))
-    indi, ea, na = generate_individual_episode_dict(
-        args.start_episode, args.end_episode, logger
+    scenes = open_scenes_as_pkl(args.save_dir) if args.from_scenes else {}
+    missing = [
+        e
+        for e in range(args.start_episode, args.end_episode + 1)
+        if e not in scenes
+    ]
+    if args.from_scenes and missing:
+        parser.error(f'scenes.pkl is missing episodes {missing}')
+    episode_dicts = generate_episode_dicts(
+        args.start_episode, args.end_episode, logger, scenes
     )
-    logger.info(
-        '''
-        Finished generating individual episode dict, 
-        node appearance dict, and edge appearance dict
-        '''
+    save_episode_dicts(
+        episode_dicts,
+        args.save_dir,
+        None if args.from_scenes else scenes,
+        logger,
     )
-    logger.debug(f'Ending episode (i): {indi[args.end_episode]}')
-    cumu = generate_cumulative_episode_dict(indi, logger)
-    logger.info('Finished generating cumulative episode dict')
-    logger.debug(f'Ending episode (c): {cumu[args.end_episode]}')
-    save_dict_as_pkl(na, 'na', args.save_dir, logger)
-    save_dict_as_pkl(ea, 'ea', args.save_dir, logger)
-    save_dict_as_pkl(indi, 'individual', args.save_dir, logger)
-    save_dict_as_pkl(cumu, 'cumulative', args.save_dir, logger)
@@ -0,0 +1,347 @@
+"""
+This script computes per-episode graph metrics (degree, weighted degree,
+centrality, and community membership) of the cumulative character network.
+
+Rather than building a new graph from each cumulative episode dict, it keeps
+one running graph and applies each episode's individual nodes/edges dicts to
+it as a delta. Only the degrees and weighted degrees are updated
+incrementally, for the touched nodes. The other metrics are recomputed over
+the whole graph for every episode with interactions: eigenvector centrality
+and label-propagation communities are warm-started from the previous
+episode, and betweenness centrality is recomputed from scratch, sampling
+source nodes only once the cast grows past
+GRAPH_METRICS: SAMPLED_CENTRALITY_THRESHOLD (above the whole show's cast, so
+it is exact by default).
+
+It generates and saves the file B_episode_dicts/dicts/graph_metrics.npz,
+where each metric is an (episodes x characters) array.
+"""
+import argparse
+import os
+import random
+import sys
+
+import numpy as np
+
+p = os.path.abspath('.')
+sys.path.insert(1, p)
+
+from utils import create_logger, get_config, lazy_import
+from B_episode_dicts.character_registry import CharacterRegistry
+from B_episode_dicts.save_and_load_dict import open_dict_as_pkl
+
+nx = lazy_import('networkx')
+
+CONFIG = get_config()
+DICT_DIRECTORY = CONFIG['DICT_DIRECTORY']
+GRAPH_METRICS = CONFIG['GRAPH_METRICS']
+METRICS = (
+    'degree',
+    'weighted_degree',
+    'eigenvector_centrality',
+    'betweenness_centrality',
+    'community',
+)
+
+
+class RunningGraphMetrics:
+    """
+    A class used to represent the running cumulative network and its
+    metrics.
+
+    Attributes
+    ---
+    graph: networkx.Graph
+        Cumulative network, with node attribute "size" and edge attributes
+        "weight" (closeness) and "distance" (1 / closeness)
+    degree: dict
+        Dictionary where key is a character and value is their degree
+    weighted_degree: dict
+        Dictionary where key is a character and value is the sum of the
+        closeness of their edges
+    eigenvector_centrality: dict
+        Dictionary where key is a character and value is their (weighted)
+        eigenvector centrality
+    betweenness_centrality: dict
+        Dictionary where key is a character and value is their betweenness
+        centrality (exact, or sampled for large casts)
+    community: dict
+        Dictionary where key is a character and value is their community
+        label
+    sample_threshold: int
+        Number of nodes above which betweenness centrality is sampled
+    sample_size: int
+        Number of source nodes sampled for betweenness centrality
+    rng: random.Random
+        Random number generator for sampling and label propagation order
+    logger : a logging.Logger object
+    """
+
+    def __init__(
+        self,
+        sample_threshold=GRAPH_METRICS['SAMPLED_CENTRALITY_THRESHOLD'],
+        sample_size=GRAPH_METRICS['CENTRALITY_SAMPLE_SIZE'],
+        seed=GRAPH_METRICS['SEED'],
+        logging_level='INFO',
+    ):
+        """
+        :param sample_threshold: Number of nodes above which betweenness
+            centrality is sampled
+        :type sample_threshold: int
+        :param sample_size: Number of source nodes sampled for betweenness
+            centrality
+        :type sample_size: int
+        :param seed: Seed for sampling and label propagation order
+        :type seed: int
+        :param logging_level: A standard Python logging level
+            (DEBUG, INFO, WARNING, ERROR, CRITICAL)
+        :type logging_level: str
+        """
+        self.graph = nx.Graph()
+        self.degree = {}
+        self.weighted_degree = {}
+        self.eigenvector_centrality = {}
+        self.betweenness_centrality = {}
+        self.community = {}
+        self.sample_threshold = sample_threshold
+        self.sample_size = sample_size
+        self.rng = random.Random(seed)
+        self.logger = create_logger(
+            'graph_metrics_engine', logging_level=logging_level
+        )
+
+    def apply_episode(self, nodes_dict, edges_dict):
+        """
+        Adds an individual episode's nodes and edges to the cumulative
+        network and updates the metrics
+        :param nodes_dict: Nodes dict for the individual episode
+        :type nodes_dict: dict
+        :param edges_dict: Edges dict for the individual episode
+        :type edges_dict: dict
+        :return: None
+        :rtype: None
+        """
+        g = self.graph
+        for node, attributes in nodes_dict.items():
+            if node in g:
+                g.nodes[node]['size'] += attributes['size']
+            else:
+                g.add_node(node, size=attributes['size'])
+                self.degree[node] = 0
+                self.weighted_degree[node] = 0
+                self.community[node] = node
+        for (u, v), attributes in edges_dict.items():
+            weight = attributes['weight']
+            if g.has_edge(u, v):
+                g[u][v]['weight'] += weight
+            else:
+                g.add_edge(u, v, weight=weight)
+                self.degree[u] += 1
+                self.degree[v] += 1
+            g[u][v]['distance'] = 1 / g[u][v]['weight']
+            self.weighted_degree[u] += weight
+            self.weighted_degree[v] += weight
+        if edges_dict:
+            self.update_eigenvector_centrality()
+            self.update_betweenness_centrality()
+            self.update_communities()
+        return None
+
+    def update_eigenvector_centrality(self):
+        """
+        Runs the power iteration for weighted eigenvector centrality over the
+        whole graph, starting from the previous episode's values so it
+        converges in a few steps. If it does not converge, it is retried with
+        a looser tolerance and more iterations, and failing that the previous
+        values are kept (new nodes get 0) and a warning is logged
+        :return: None
+        :rtype: None
+        """
+        nstart = {
+            n: self.eigenvector_centrality.get(n, 1.0) or 1.0
+            for n in self.graph
+        }
+        for max_iter, tol in ((1000, 1e-06), (10000, 1e-04)):
+            try:
+                self.eigenvector_centrality = nx.eigenvector_centrality(
+                    self.graph,
+                    max_iter=max_iter,
+                    tol=tol,
+                    nstart=nstart,
+                    weight='weight',
+                )
+                return None
+            except nx.PowerIterationFailedConvergence:
+                self.logger.warning(
+                    f'Eigenvector centrality did not converge in {max_iter} '
+                    f'iterations (tol={tol}) for {len(self.graph)} nodes'
+                )
+        self.logger.warning(
+            'Keeping the previous eigenvector centrality values'
+        )
+        self.eigenvector_centrality = {
+            n: self.eigenvector_centrality.get(n, 0.0) for n in self.graph
+        }
+        return None
+
+    def update_betweenness_centrality(self):
+        """
+        Recomputes betweenness centrality over closeness-based distances from
+        scratch, sampling source nodes once the network is larger than the
+        sample threshold
+        :return: None
+        :rtype: None
+        """
+        k = None
+        if len(self.graph) > self.sample_threshold:
+            k = min(self.sample_size, len(self.graph))
+        self.betweenness_centrality = nx.betweenness_centrality(
+            self.graph,
+            k=k,
+            weight='distance',
+            seed=self.rng.randrange(2**32) if k else None,
+        )
+        return None
+
+    def update_communities(self, max_iterations=100):
+        """
+        Weighted label propagation over the whole graph, warm-started from the
+        previous episode's labels. New nodes start in their own community
+        :param max_iterations: Maximum number of passes over the nodes
+        :type max_iterations: int
+        :return: None
+        :rtype: None
+        """
+        nodes = list(self.graph)
+        for _ in range(max_iterations):
+            self.rng.shuffle(nodes)
+            changed = False
+            for node in nodes:
+                label_weights = {}
+                for neighbor, attributes in self.graph[node].items():
+                    label = self.community[neighbor]
+                    label_weights[label] = (
+                        label_weights.get(label, 0) + attributes['weight']
+                    )
+                if not label_weights:
+                    continue
+                best = max(label_weights.values())
+                current = self.community[node]
+                if label_weights.get(current) == best:
+                    continue
+                self.community[node] = min(
+                    label for label, w in label_weights.items() if w == best
+                )
+                changed = True
+            if not changed:
+                break
+        return None
+
+
+def compute_graph_metrics(
+    individual_episode_dict, registry, logger_object=None
+):
+    """
+    Applies each individual episode in turn to a RunningGraphMetrics and
+    records the metrics after each one
+    :param individual_episode_dict: a nested dictionary where key is an
+        episode number and values contain nodes and edges dictionary for the
+        character appearances and interactions in the individual episode
+    :type individual_episode_dict: dict
+    :param registry: Registry whose IDs give the column of each character
+    :type registry: CharacterRegistry
+    :param logger_object: a logging.Logger object
+    :type logger_object: logging.Logger object
+    :return: Dictionary where key is a metric name (see METRICS), 'episodes'
+        or 'characters' and value is an array. Metric arrays are indexed by
+        [episode position, character ID], with NaN (or -1 for community) for
+        characters who have not yet appeared
+    :rtype: dict
+    """
+    engine = RunningGraphMetrics()
+    for episode in individual_episode_dict.values():
+        for node in episode['nodes_dict']:
+            registry.intern(node)
+    shape = (len(individual_episode_dict), len(registry))
+    metrics = {m: np.full(shape, np.nan) for m in METRICS}
+    metrics['community'] = np.full(shape, -1, dtype=np.int16)
+    for row, (e, episode) in enumerate(individual_episode_dict.items()):
+        engine.apply_episode(episode['nodes_dict'], episode['edges_dict'])
+        for node in engine.graph:
+            column = registry.id_of(node)
+            metrics['degree'][row, column] = engine.degree[node]
+            metrics['weighted_degree'][row, column] = engine.weighted_degree[
+                node
+            ]
+            metrics['eigenvector_centrality'][
+                row, column
+            ] = engine.eigenvector_centrality.get(node, 0.0)
+            metrics['betweenness_centrality'][
+                row, column
+            ] = engine.betweenness_centrality.get(node, 0.0)
+            metrics['community'][row, column] = registry.id_of(
+                engine.community[node]
+            )
+        if logger_object:
+            logger_object.info(f'Computed graph metrics for episode {e}')
+    metrics['episodes'] = np.array(list(individual_episode_dict))
+    metrics['characters'] = np.array(registry.names)
+    return metrics
+
+
+def open_graph_metrics(directory=DICT_DIRECTORY):
+    """
+    Opens the graph metrics saved by save_graph_metrics
+    :param directory: Directory in which graph_metrics.npz is saved
+    :type directory: str
+    :return: Dictionary where key is a metric name, 'episodes' or
+        'characters' and value is an array
+    :rtype: dict
+    """
+    with np.load(f'{directory}/graph_metrics.npz') as f:
+        metrics = {k: f[k] for k in f.files}
+    return metrics
+
+
+def save_graph_metrics(metrics, directory=DICT_DIRECTORY, logger=None):
+    """
+    Saves graph metrics as a compressed .npz file
+    :param metrics: Output of compute_graph_metrics
+    :type metrics: dict
+    :param directory: Directory in which graph_metrics.npz is saved
+    :type directory: str
+    :param logger: logging.Logger object
+    :type logger: logging.Logger object
+    :return: None
+    :rtype: None
+    """
+    location = f'{directory}/graph_metrics.npz'
+    np.savez_compressed(location, **metrics)
+    if logger:
+        logger.info(f'Saved graph metrics in {location}')
+    return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--save_dir',
+        '-D',
+        type=str,
+        default=DICT_DIRECTORY,
+        help='Directory where the individual and na dicts are saved and to '
+        'which to save the graph metrics',
+    )
+    parser.add_argument(
+        '--logging_level',
+        '-L',
+        type=str.upper,
+        default='info',
+        help='Python logging level',
+    )
+    args = parser.parse_args()
+    logger = create_logger('graph_metrics', logging_level=args.logging_level)
+    indi = open_dict_as_pkl('individual', directory=args.save_dir)
+    na = open_dict_as_pkl('na', directory=args.save_dir)
+    graph_metrics = compute_graph_metrics(indi, CharacterRegistry(na), logger)
+    save_graph_metrics(graph_metrics, args.save_dir, logger)
@@ -0,0 +1,165 @@
+"""
+Index of the episode at which each character and pair first qualifies for
+the network charts.
+
+retrieve_included_edges_and_nodes applies MIN_EPISODE_APPEARANCES to the
+appearances over the whole run, so a character who only reaches it late in
+the show is charted from their very first appearance. This index stores,
+for every character in the node appearance dict, the episode of their
+MIN_EPISODE_APPEARANCES-th appearance and, for every pair in the edge
+appearance dict, the episode by which both of its characters have
+qualified. Characters and pairs that never qualify have NEVER. Who is
+included as of episode e is then a comparison of those arrays with e, and
+as of the last episode it is the same as retrieve_included_edges_and_nodes.
+"""
+from utils import get_config, lazy_import
+
+np = lazy_import('numpy')
+
+CONFIG = get_config()
+DICT_DIRECTORY = CONFIG['DICT_DIRECTORY']
+MIN_EPISODE_APPEARANCES = CONFIG['MIN_EPISODE_APPEARANCES']
+NEVER = 32767
+
+
+def build_inclusion_index(
+    node_appearance_dict,
+    edges_appearance_dict,
+    minimum_episode_appearances=MIN_EPISODE_APPEARANCES,
+):
+    """
+    Finds the episode at which each character and pair first qualifies
+    :param node_appearance_dict: Node appearance dict
+    :type node_appearance_dict: dict
+    :param edges_appearance_dict: Edge appearance dict
+    :type edges_appearance_dict: dict
+    :param minimum_episode_appearances: Minimum number of episodes a
+        character must appear in to be included
+    :type minimum_episode_appearances: int
+    :return: Dictionary with keys:
+        'characters': character names, in node appearance dict order
+        'pairs': (pairs x 2) array of the characters of each pair, in edge
+            appearance dict order
+        'character_episodes': episode at which each character qualifies
+        'pair_episodes': episode at which each pair qualifies
+    :rtype: dict
+    """
+    characters = list(node_appearance_dict)
+    ids = {name: i for i, name in enumerate(characters)}
+    character_episodes = np.full(len(characters), NEVER, dtype=np.int16)
+    for i, appearances in enumerate(node_appearance_dict.values()):
+        if len(appearances) >= minimum_episode_appearances:
+            episodes = sorted(appearances)
+            character_episodes[i] = episodes[minimum_episode_appearances - 1]
+    pairs = np.array(
+        [[ids[a], ids[b]] for a, b in edges_appearance_dict],
+        dtype=np.int16,
+    ).reshape(-1, 2)
+    pair_episodes = np.maximum(
+        character_episodes[pairs[:, 0]], character_episodes[pairs[:, 1]]
+    )
+    return {
+        'characters': np.array(characters),
+        'pairs': pairs,
+        'character_episodes': character_episodes,
+        'pair_episodes': pair_episodes,
+    }
+
+
+class InclusionIndex:
+    """
+    A class used to represent the episode at which each character and pair
+    first qualifies for the network charts.
+
+    Attributes
+    ---
+    names: list
+        Character names, in node appearance dict order
+    edges: list
+        Character pairs (tuples), in edge appearance dict order
+    character_episodes: numpy.ndarray
+        Episode at which each character qualifies (NEVER if they do not)
+    pair_episodes: numpy.ndarray
+        Episode at which each pair qualifies (NEVER if it does not)
+    """
+
+    def __init__(self, arrays):
+        """
+        :param arrays: Output of build_inclusion_index
+        :type arrays: dict
+        """
+        self.names = arrays['characters'].tolist()
+        self.edges = [
+            (self.names[a], self.names[b]) for a, b in arrays['pairs'].tolist()
+        ]
+        self.character_episodes = arrays['character_episodes']
+        self.pair_episodes = arrays['pair_episodes']
+
+    def included_as_of(self, episode_number):
+        """
+        :param episode_number: episode number
+        :type episode_number: int
+        :return: list of the nodes and list of the edges that have qualified
+            by the episode, in the order of retrieve_included_edges_and_nodes
+        :rtype: list, list
+        """
+        nodes_incl = [
+            self.names[i]
+            for i in np.flatnonzero(self.character_episodes <= episode_number)
+        ]
+        edges_incl = [
+            self.edges[i]
+            for i in np.flatnonzero(self.pair_episodes <= episode_number)
+        ]
+        return nodes_incl, edges_incl
+
+    def first_episodes(self, nodes_incl, edges_incl):
+        """
+        :param nodes_incl: Nodes
+        :type nodes_incl: list
+        :param edges_incl: Edges
+        :type edges_incl: list
+        :return: Episode at which each of the nodes qualifies, and episode
+            at which each of the edges qualifies
+        :rtype: list, list
+        """
+        character_episodes = dict(
+            zip(self.names, self.character_episodes.tolist())
+        )
+        pair_episodes = dict(zip(self.edges, self.pair_episodes.tolist()))
+        return (
+            [character_episodes[n] for n in nodes_incl],
+            [pair_episodes[e] for e in edges_incl],
+        )
+
+
+def open_inclusion_index(directory=DICT_DIRECTORY):
+    """
+    Opens the inclusion index saved by save_inclusion_index
+    :param directory: Directory in which inclusion_index.npz is saved
+    :type directory: str
+    :return: InclusionIndex object
+    :rtype: InclusionIndex
+    """
+    with np.load(f'{directory}/inclusion_index.npz') as f:
+        arrays = {k: f[k] for k in f.files}
+    return InclusionIndex(arrays)
+
+
+def save_inclusion_index(arrays, directory=DICT_DIRECTORY, logger=None):
+    """
+    Saves the inclusion index as a compressed .npz file
+    :param arrays: Output of build_inclusion_index
+    :type arrays: dict
+    :param directory: Directory in which inclusion_index.npz is saved
+    :type directory: str
+    :param logger: logging.Logger object
+    :type logger: logging.Logger object
+    :return: None
+    :rtype: None
+    """
+    location = f'{directory}/inclusion_index.npz'
+    np.savez_compressed(location, **arrays)
+    if logger:
+        logger.info(f'Saved inclusion index in {location}')
+    return None
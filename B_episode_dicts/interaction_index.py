@@ -0,0 +1,207 @@
+"""
+Index of where each character pair interacts.
+
+Every interaction counted towards a pair's closeness (the two speaking within
+LINES_NEEDED_FOR_CLOSENESS lines of each other) is recorded as a range of
+lines in a scene, and overlapping ranges are merged into exchanges (see
+TMAEpisode.get_edge_interactions_in_scene). The index stores each pair's
+exchanges, sorted by episode, as line ranges only, so it can be built from
+the saved scenes without the transcripts. The text of an exchange is read
+from its episode's transcript when it is shown (see read_exchange_texts).
+"""
+from utils import get_config, lazy_import
+from B_episode_dicts.character_registry import pack_pair
+from B_episode_dicts.tma_episode_processor import (
+    ALIAS_RESOLVER,
+    TMAEpisode,
+    open_episode_texts,
+)
+
+np = lazy_import('numpy')
+
+CONFIG = get_config()
+DICT_DIRECTORY = CONFIG['DICT_DIRECTORY']
+EXCHANGE_COLUMNS = ('episodes', 'scenes', 'starts', 'ends', 'counts')
+
+
+def build_interaction_index(interactions_dict, registry):
+    """
+    Builds the index from the interactions dicts of each episode
+    :param interactions_dict: Dictionary where key is an episode number and
+        value is the interactions_dict attribute of its TMAEpisode
+    :type interactions_dict: dict
+    :param registry: Registry used to key the character pairs
+    :type registry: CharacterRegistry
+    :return: Dictionary of arrays (see InteractionIndex)
+    :rtype: dict
+    """
+    rows = []
+    for e, episode_interactions in interactions_dict.items():
+        for pair, exchanges in episode_interactions.items():
+            key = registry.pair_key(pair)
+            for scene_i, start, end, count in exchanges:
+                rows.append((key, e, scene_i, start, end, count))
+    table = np.array(sorted(rows), dtype=np.uint32).reshape(-1, 6)
+    pair_keys, pair_starts = np.unique(table[:, 0], return_index=True)
+    arrays = {
+        'characters': np.array(registry.names),
+        'pair_keys': pair_keys,
+        'pair_offsets': np.append(pair_starts, len(table)).astype(np.uint32),
+    }
+    for i, column in enumerate(EXCHANGE_COLUMNS, start=1):
+        arrays[column] = table[:, i].astype(np.uint16)
+    return arrays
+
+
+class InteractionIndex:
+    """
+    A class used to represent the exchanges of every character pair.
+
+    Attributes
+    ---
+    ids: dict
+        Dictionary where key is a character name and value is its ID
+    pair_keys: numpy.ndarray
+        Sorted packed pair keys of the pairs with at least one exchange
+    pair_offsets: numpy.ndarray
+        The exchanges of pair_keys[i] are at [pair_offsets[i],
+        pair_offsets[i+1])
+    episodes, scenes, starts, ends, counts: numpy.ndarray
+        Episode, scene, first line, last line, and number of interactions of
+        each exchange
+    """
+
+    def __init__(self, arrays):
+        """
+        :param arrays: Output of build_interaction_index
+        :type arrays: dict
+        """
+        self.ids = {n: i for i, n in enumerate(arrays['characters'].tolist())}
+        self.pair_keys = arrays['pair_keys']
+        self.pair_offsets = arrays['pair_offsets']
+        for column in EXCHANGE_COLUMNS:
+            setattr(self, column, arrays[column])
+
+    def pair_slice(self, character_a, character_b):
+        """
+        :param character_a: A character from The Magnus Archives
+        :type character_a: str
+        :param character_b: A second character from The Magnus Archives
+        :type character_b: str
+        :return: Slice of the exchange arrays for the pair
+        :rtype: slice
+        """
+        if character_a not in self.ids or character_b not in self.ids:
+            return slice(0, 0)
+        key = pack_pair(self.ids[character_a], self.ids[character_b])
+        i = np.searchsorted(self.pair_keys, key)
+        if i == len(self.pair_keys) or self.pair_keys[i] != key:
+            return slice(0, 0)
+        return slice(self.pair_offsets[i], self.pair_offsets[i + 1])
+
+    def episodes_of(self, character_a, character_b):
+        """
+        :param character_a: A character from The Magnus Archives
+        :type character_a: str
+        :param character_b: A second character from The Magnus Archives
+        :type character_b: str
+        :return: Episodes in which the pair has at least one exchange
+        :rtype: list
+        """
+        s = self.pair_slice(character_a, character_b)
+        return np.unique(self.episodes[s]).tolist()
+
+    def exchanges(self, character_a, character_b, episode=None):
+        """
+        :param character_a: A character from The Magnus Archives
+        :type character_a: str
+        :param character_b: A second character from The Magnus Archives
+        :type character_b: str
+        :param episode: If provided, only the exchanges in this episode
+        :type episode: int
+        :return: Exchanges in episode order. Each is a dictionary with the
+            episode, scene, first line, last line, and number of interactions
+        :rtype: list
+        """
+        s = self.pair_slice(character_a, character_b)
+        rows = np.arange(s.start, s.stop)
+        if episode is not None:
+            lo, hi = np.searchsorted(self.episodes[s], [episode, episode + 1])
+            rows = rows[lo:hi]
+        return [
+            {
+                'episode': int(self.episodes[i]),
+                'scene': int(self.scenes[i]),
+                'start': int(self.starts[i]),
+                'end': int(self.ends[i]),
+                'count': int(self.counts[i]),
+            }
+            for i in rows
+        ]
+
+
+def read_exchange_texts(exchanges, episode_texts=None):
+    """
+    Adds the text of their lines to exchanges, reading the transcript of each
+    of their episodes once
+    :param exchanges: Output of InteractionIndex.exchanges
+    :type exchanges: list
+    :param episode_texts: Dictionary where key is an episode number and value
+        is the episode text. If not provided, it is loaded from the text
+        directory
+    :type episode_texts: dict
+    :return: The exchanges, each with its text under 'text'
+    :rtype: list
+    """
+    if episode_texts is None:
+        episode_texts = open_episode_texts()
+    scene_lines = {}
+    for exchange in exchanges:
+        e = exchange['episode']
+        if e not in scene_lines:
+            episode = TMAEpisode(
+                e, logging_level='WARNING', episode_texts=episode_texts
+            )
+            episode.extract_transcript()
+            episode.clean_up_character_names()
+            scene_lines[e] = [
+                scene.split('\n') for scene in episode.split_scenes()
+            ]
+        lines = scene_lines[e][exchange['scene']]
+        exchange['text'] = '\n'.join(
+            ALIAS_RESOLVER.resolve(line)
+            for line in lines[exchange['start'] : exchange['end'] + 1]
+        )
+    return exchanges
+
+
+def open_interaction_index(directory=DICT_DIRECTORY):
+    """
+    Opens the index saved by save_interaction_index
+    :param directory: Directory in which interaction_index.npz is saved
+    :type directory: str
+    :return: InteractionIndex object
+    :rtype: InteractionIndex
+    """
+    with np.load(f'{directory}/interaction_index.npz') as f:
+        arrays = {k: f[k] for k in f.files}
+    return InteractionIndex(arrays)
+
+
+def save_interaction_index(arrays, directory=DICT_DIRECTORY, logger=None):
+    """
+    Saves the index as a compressed .npz file
+    :param arrays: Output of build_interaction_index
+    :type arrays: dict
+    :param directory: Directory in which interaction_index.npz is saved
+    :type directory: str
+    :param logger: logging.Logger object
+    :type logger: logging.Logger object
+    :return: None
+    :rtype: None
+    """
+    location = f'{directory}/interaction_index.npz'
+    np.savez_compressed(location, **arrays)
+    if logger:
+        logger.info(f'Saved interaction index in {location}')
+    return None
@@ -0,0 +1,213 @@
+"""
+Top-K leaderboards of the characters who spoke the most words and, for each
+character, the partners they were closest to.
+
+Leaderboards are computed from the appearance matrices for the whole run and
+for each season (LEADERBOARDS: SEASON_LENGTH episodes), sorted, and stored
+as arrays of character IDs and values, so a lookup is a row read rather than
+a pass over the node or edge appearance dicts. Unused slots (fewer than K
+speakers or partners) have ID -1.
+"""
+from utils import get_config, lazy_import
+from B_episode_dicts.character_registry import unpack_pair
+
+np = lazy_import('numpy')
+
+CONFIG = get_config()
+DICT_DIRECTORY = CONFIG['DICT_DIRECTORY']
+LEADERBOARDS = CONFIG['LEADERBOARDS']
+
+
+def season_windows(end_episode, season_length=LEADERBOARDS['SEASON_LENGTH']):
+    """
+    :param end_episode: Last episode
+    :type end_episode: int
+    :param season_length: Number of episodes in a season
+    :type season_length: int
+    :return: (first episode, last episode) of the whole run followed by each
+        season
+    :rtype: list
+    """
+    windows = [(1, end_episode)]
+    for start in range(1, end_episode + 1, season_length):
+        windows.append((start, min(start + season_length - 1, end_episode)))
+    return windows
+
+
+def top_k(values, k):
+    """
+    :param values: Array whose last axis is ranked
+    :type values: numpy.ndarray
+    :param k: Number of entries to keep
+    :type k: int
+    :return: Indices of the k largest positive values along the last axis
+        (-1 where there are fewer), and those values
+    :rtype: numpy.ndarray, numpy.ndarray
+    """
+    order = np.argsort(-values, axis=-1, kind='stable')[..., :k]
+    top = np.take_along_axis(values, order, axis=-1)
+    order = np.where(top > 0, order, -1)
+    if order.shape[-1] < k:
+        padding = [(0, 0)] * (order.ndim - 1) + [(0, k - order.shape[-1])]
+        order = np.pad(order, padding, constant_values=-1)
+        top = np.pad(top, padding)
+    return order.astype(np.int16), top
+
+
+def build_leaderboards(matrices, top=LEADERBOARDS['TOP_K']):
+    """
+    Ranks speakers and partners for the whole run and each season
+    :param matrices: Output of build_appearance_matrices
+    :type matrices: dict
+    :param top: Number of entries in each leaderboard
+    :type top: int
+    :return: Dictionary with keys:
+        'characters': character names, in ID order
+        'windows': (windows x 2) array of first and last episode
+        'speaker_ids', 'speaker_words': (windows x K) arrays
+        'partner_ids', 'partner_closeness': (windows x characters x K)
+            arrays
+    :rtype: dict
+    """
+    words = matrices['words']
+    closeness = matrices['closeness']
+    n = len(matrices['characters'])
+    pairs = np.array(
+        [unpack_pair(int(key)) for key in matrices['pair_keys']], dtype=int
+    ).reshape(-1, 2)
+    windows = season_windows(words.shape[1])
+    speaker_ids, speaker_words = [], []
+    partner_ids, partner_closeness = [], []
+    for start, end in windows:
+        window_words = words[:, start - 1 : end].sum(axis=1, dtype=np.int64)
+        ids, values = top_k(window_words, top)
+        speaker_ids.append(ids)
+        speaker_words.append(values)
+        pair_closeness = closeness[:, start - 1 : end].sum(axis=1)
+        square = np.zeros((n, n))
+        square[pairs[:, 0], pairs[:, 1]] = pair_closeness
+        square[pairs[:, 1], pairs[:, 0]] = pair_closeness
+        ids, values = top_k(square, top)
+        partner_ids.append(ids)
+        partner_closeness.append(values)
+    return {
+        'characters': matrices['characters'],
+        'windows': np.array(windows, dtype=np.uint16),
+        'speaker_ids': np.array(speaker_ids),
+        'speaker_words': np.array(speaker_words),
+        'partner_ids': np.array(partner_ids),
+        'partner_closeness': np.array(partner_closeness),
+    }
+
+
+class Leaderboards:
+    """
+    A class used to represent the precomputed leaderboards.
+
+    Attributes
+    ---
+    names: list
+        Character names, indexed by ID
+    ids: dict
+        Dictionary where key is a character name and value is its ID
+    windows: list
+        (first episode, last episode) of each leaderboard window. The first
+        window is the whole run, followed by each season
+    speaker_ids, speaker_words: numpy.ndarray
+        Top speakers of each window and the words they spoke
+    partner_ids, partner_closeness: numpy.ndarray
+        Top partners of each character in each window and their closeness
+    """
+
+    def __init__(self, arrays):
+        """
+        :param arrays: Output of build_leaderboards
+        :type arrays: dict
+        """
+        self.names = arrays['characters'].tolist()
+        self.ids = {name: i for i, name in enumerate(self.names)}
+        self.windows = [tuple(w) for w in arrays['windows'].tolist()]
+        self.speaker_ids = arrays['speaker_ids']
+        self.speaker_words = arrays['speaker_words']
+        self.partner_ids = arrays['partner_ids']
+        self.partner_closeness = arrays['partner_closeness']
+
+    @property
+    def seasons(self):
+        """
+        :return: Season numbers that have leaderboards
+        :rtype: list
+        """
+        return list(range(1, len(self.windows)))
+
+    def rows(self, ids, values, k):
+        """
+        :return: (character name, value) tuples, skipping unused slots
+        :rtype: list
+        """
+        return [
+            (self.names[i], v)
+            for i, v in zip(ids[:k].tolist(), values[:k].tolist())
+            if i >= 0
+        ]
+
+    def top_speakers(self, season=None, k=None):
+        """
+        :param season: Season number. If not provided, the whole run
+        :type season: int
+        :param k: Number of entries (at most LEADERBOARDS: TOP_K)
+        :type k: int
+        :return: (character, words spoken) tuples, most words first
+        :rtype: list
+        """
+        w = season or 0
+        return self.rows(self.speaker_ids[w], self.speaker_words[w], k)
+
+    def top_partners(self, character, season=None, k=None):
+        """
+        :param character: A character from The Magnus Archives
+        :type character: str
+        :param season: Season number. If not provided, the whole run
+        :type season: int
+        :param k: Number of entries (at most LEADERBOARDS: TOP_K)
+        :type k: int
+        :return: (partner, closeness) tuples, closest first
+        :rtype: list
+        """
+        w = season or 0
+        c = self.ids[character]
+        return self.rows(
+            self.partner_ids[w, c], self.partner_closeness[w, c], k
+        )
+
+
+def open_leaderboards(directory=DICT_DIRECTORY):
+    """
+    Opens the leaderboards saved by save_leaderboards
+    :param directory: Directory in which leaderboards.npz is saved
+    :type directory: str
+    :return: Leaderboards object
+    :rtype: Leaderboards
+    """
+    with np.load(f'{directory}/leaderboards.npz') as f:
+        arrays = {k: f[k] for k in f.files}
+    return Leaderboards(arrays)
+
+
+def save_leaderboards(arrays, directory=DICT_DIRECTORY, logger=None):
+    """
+    Saves the leaderboards as a compressed .npz file
+    :param arrays: Output of build_leaderboards
+    :type arrays: dict
+    :param directory: Directory in which leaderboards.npz is saved
+    :type directory: str
+    :param logger: logging.Logger object
+    :type logger: logging.Logger object
+    :return: None
+    :rtype: None
+    """
+    location = f'{directory}/leaderboards.npz'
+    np.savez_compressed(location, **arrays)
+    if logger:
+        logger.info(f'Saved leaderboards in {location}')
+    return None
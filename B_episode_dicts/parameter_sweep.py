@@ -0,0 +1,397 @@
+"""
+This script sweeps over combinations of the closeness and inclusion
+thresholds (LINES_NEEDED_FOR_CLOSENESS, MIN_CLOSENESS, and
+MIN_EPISODE_APPEARANCES) without reparsing the transcripts.
+
+The scenes of each episode are read from scenes.pkl (see
+generate_episode_dicts.py), and only episodes missing from it are parsed.
+For every character pair sharing a scene, the
+line distances between their appearances are binned, so the closeness for
+any LINES_NEEDED_FOR_CLOSENESS is the sum of those bins weighted by the
+CLOSENESS_KERNEL at that width (see closeness_kernel.py), plus MIN_CLOSENESS
+per shared scene.
+
+It prints (or saves as a .csv) one row of node and edge stats per
+configuration.
+"""
+import argparse
+import csv
+import itertools
+import os
+import sys
+
+import numpy as np
+
+p = os.path.abspath('.')
+sys.path.insert(1, p)
+
+from utils import create_logger, get_config
+from B_episode_dicts.closeness_kernel import (
+    CLOSENESS_KERNEL,
+    KERNELS,
+    ClosenessKernel,
+)
+from B_episode_dicts.save_and_load_dict import open_scenes_as_pkl
+from B_episode_dicts.tma_episode_processor import (
+    TMAEpisode,
+    open_episode_texts,
+)
+
+CONFIG = get_config()
+MAX_EPISODE = CONFIG['MAX_EPISODE']
+DICT_DIRECTORY = CONFIG['DICT_DIRECTORY']
+LINES_NEEDED_FOR_CLOSENESS = CONFIG['LINES_NEEDED_FOR_CLOSENESS']
+MIN_CLOSENESS = CONFIG['MIN_CLOSENESS']
+MIN_EPISODE_APPEARANCES = CONFIG['MIN_EPISODE_APPEARANCES']
+SWEEP_COLUMNS = [
+    'lines_needed_for_closeness',
+    'min_closeness',
+    'min_episode_appearances',
+    'nodes',
+    'edges',
+    'edges_with_interactions',
+    'total_words',
+    'total_closeness',
+    'mean_closeness',
+    'max_closeness',
+]
+
+
+def load_episode_scenes(
+    start_episode, end_episode, directory=DICT_DIRECTORY, logger_object=None
+):
+    """
+    Loads the character info in each scene from scenes.pkl, resolving
+    character aliases, and parses the episodes that are not in it
+    :param start_episode: First episode to load
+    :type start_episode: int
+    :param end_episode: Last episode to load
+    :type end_episode: int
+    :param directory: Directory in which scenes.pkl is saved
+    :type directory: str
+    :param logger_object: a logging.Logger object
+    :type logger_object: logging.Logger object
+    :return: Dictionary where key is an episode number and value is the
+        character_info_in_scenes attribute of its TMAEpisode
+    :rtype: dict
+    """
+    if os.path.exists(f'{directory}/scenes.pkl'):
+        scenes = open_scenes_as_pkl(directory)
+    else:
+        scenes = {}
+    episode_texts = None
+    parsed = {}
+    for e in range(start_episode, end_episode + 1):
+        if e in scenes:
+            episode = TMAEpisode(e, logging_level='WARNING')
+            episode.speaker_info_in_scenes = scenes[e]
+            episode.resolve_aliases()
+        else:
+            if episode_texts is None:
+                episode_texts = open_episode_texts()
+            episode = TMAEpisode(
+                e, logging_level='WARNING', episode_texts=episode_texts
+            )
+            episode.extract_transcript()
+            episode.clean_up_character_names()
+            episode.extract_character_info_in_scenes()
+            if logger_object:
+                logger_object.info(f'Parsed episode {e}')
+        parsed[e] = episode.character_info_in_scenes
+    if logger_object:
+        loaded = sum(e in scenes for e in parsed)
+        logger_object.info(f'Loaded {loaded} episodes from scenes.pkl')
+    return parsed
+
+
+class InteractionStats:
+    """
+    A class used to represent the threshold-independent statistics of a
+    parsed corpus, from which any sweep configuration can be evaluated.
+
+    Attributes
+    ---
+    characters: list
+        Character names, indexed by node position
+    node_words: numpy.ndarray
+        Total words spoken by each character
+    node_episodes: numpy.ndarray
+        Number of episodes in which each character appears
+    pairs: numpy.ndarray
+        (n_pairs, 2) array of node positions for each character pair sharing
+        at least one scene
+    pair_scenes: numpy.ndarray
+        Number of scenes each pair shares
+    pair_distance_counts: numpy.ndarray
+        (n_pairs, max_lines + 1) array where column d is the number of times
+        the pair spoke d lines apart
+    kernel: str
+        Name of the closeness kernel (a key of KERNELS)
+    """
+
+    def __init__(self, parsed, max_lines, kernel=CLOSENESS_KERNEL):
+        """
+        :param parsed: Output of load_episode_scenes
+        :type parsed: dict
+        :param max_lines: Largest line separation that will be evaluated.
+            Kernels without a cut-off (exponential) need every separation, so
+            the counts extend to the longest separation in any scene instead
+        :type max_lines: int
+        :param kernel: Name of the closeness kernel (a key of KERNELS)
+        :type kernel: str
+        """
+        widest = ClosenessKernel(kernel, max_lines)
+        if widest.weights(np.array([max_lines + 1]))[0] > 0:
+            max_lines = max(
+                (
+                    max(info['appearances'], default=0)
+                    for scenes in parsed.values()
+                    for scene_info in scenes.values()
+                    for info in scene_info.values()
+                ),
+                default=max_lines,
+            )
+        index = {}
+        words = []
+        episodes = []
+        pair_index = {}
+        pair_scenes = []
+        pair_counts = []
+        for scenes in parsed.values():
+            in_episode = set()
+            for scene_info in scenes.values():
+                for character, info in scene_info.items():
+                    if character not in index:
+                        index[character] = len(words)
+                        words.append(0)
+                        episodes.append(0)
+                    words[index[character]] += info['word_count']
+                    in_episode.add(index[character])
+                for c1, c2 in itertools.combinations(scene_info, 2):
+                    pair = tuple(sorted((index[c1], index[c2])))
+                    if pair not in pair_index:
+                        pair_index[pair] = len(pair_scenes)
+                        pair_scenes.append(0)
+                        pair_counts.append(np.zeros(max_lines + 1, int))
+                    i = pair_index[pair]
+                    pair_scenes[i] += 1
+                    pair_counts[i] += self.distance_counts(
+                        scene_info[c1]['appearances'],
+                        scene_info[c2]['appearances'],
+                        max_lines,
+                    )
+            for i in in_episode:
+                episodes[i] += 1
+        self.characters = list(index)
+        self.node_words = np.array(words)
+        self.node_episodes = np.array(episodes)
+        self.pairs = np.array(list(pair_index), dtype=int).reshape(-1, 2)
+        self.pair_scenes = np.array(pair_scenes)
+        self.pair_distance_counts = np.array(pair_counts).reshape(
+            -1, max_lines + 1
+        )
+        self.kernel = kernel
+
+    @staticmethod
+    def distance_counts(appearances_1, appearances_2, max_lines):
+        """
+        Counts how often two characters speak d lines apart, for each d up to
+        max_lines
+        :param appearances_1: Line appearances of a character in a scene
+        :type appearances_1: array.array
+        :param appearances_2: Line appearances of another character
+        :type appearances_2: array.array
+        :param max_lines: Largest line separation to count
+        :type max_lines: int
+        :return: Array of counts indexed by line separation
+        :rtype: numpy.ndarray
+        """
+        distances = np.abs(
+            np.subtract.outer(
+                np.asarray(appearances_1, dtype=int),
+                np.asarray(appearances_2, dtype=int),
+            )
+        ).ravel()
+        return np.bincount(
+            distances[distances <= max_lines], minlength=max_lines + 1
+        )
+
+    def evaluate(
+        self, lines_needed_for_closeness, min_closeness, min_appearances
+    ):
+        """
+        Computes node and edge stats for a single configuration. An edge has
+        interactions when the kernel gives it a positive score
+        :param lines_needed_for_closeness: Threshold line number separation
+            for increasing closeness score
+        :type lines_needed_for_closeness: int
+        :param min_closeness: Base closeness score for appearance in same scene
+        :type min_closeness: float
+        :param min_appearances: Minimum number of episodes node must appear in
+            to be included
+        :type min_appearances: int
+        :return: One row of the results table (see SWEEP_COLUMNS)
+        :rtype: dict
+        """
+        distance_counts = self.pair_distance_counts[:, 1:]
+        kernel = ClosenessKernel(self.kernel, lines_needed_for_closeness)
+        distances = np.arange(1, distance_counts.shape[1] + 1)
+        scores = distance_counts @ kernel.weights(distances)
+        closeness = scores + min_closeness * self.pair_scenes
+        nodes_mask = self.node_episodes >= min_appearances
+        edges_mask = nodes_mask[self.pairs].all(axis=1)
+        edge_closeness = closeness[edges_mask]
+        return {
+            'lines_needed_for_closeness': lines_needed_for_closeness,
+            'min_closeness': min_closeness,
+            'min_episode_appearances': min_appearances,
+            'nodes': int(nodes_mask.sum()),
+            'edges': int(edges_mask.sum()),
+            'edges_with_interactions': int((scores[edges_mask] > 0).sum()),
+            'total_words': int(self.node_words[nodes_mask].sum()),
+            'total_closeness': round(float(edge_closeness.sum()), 3),
+            'mean_closeness': round(float(edge_closeness.mean()), 3)
+            if edge_closeness.size
+            else 0.0,
+            'max_closeness': round(float(edge_closeness.max()), 3)
+            if edge_closeness.size
+            else 0.0,
+        }
+
+
+def sweep_parameters(
+    parsed,
+    lines_needed_list,
+    min_closeness_list,
+    min_appearances_list,
+    kernel=CLOSENESS_KERNEL,
+):
+    """
+    Evaluates every combination of thresholds over a parsed corpus
+    :param parsed: Output of load_episode_scenes
+    :type parsed: dict
+    :param lines_needed_list: LINES_NEEDED_FOR_CLOSENESS values to evaluate
+    :type lines_needed_list: list
+    :param min_closeness_list: MIN_CLOSENESS values to evaluate
+    :type min_closeness_list: list
+    :param min_appearances_list: MIN_EPISODE_APPEARANCES values to evaluate
+    :type min_appearances_list: list
+    :param kernel: Name of the closeness kernel (a key of KERNELS)
+    :type kernel: str
+    :return: Results table, one dict per configuration
+    :rtype: list
+    """
+    stats = InteractionStats(parsed, max(lines_needed_list), kernel)
+    return [
+        stats.evaluate(*config)
+        for config in itertools.product(
+            lines_needed_list, min_closeness_list, min_appearances_list
+        )
+    ]
+
+
+def write_results(results, outfile):
+    """
+    Writes the results table as .csv
+    :param results: Output of sweep_parameters
+    :type results: list
+    :param outfile: File object to write to
+    :type outfile: file object
+    :return: None
+    :rtype: None
+    """
+    writer = csv.DictWriter(outfile, fieldnames=SWEEP_COLUMNS)
+    writer.writeheader()
+    writer.writerows(results)
+    return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--start_episode',
+        '-S',
+        type=int,
+        default=1,
+        choices=range(1, MAX_EPISODE + 1),
+        help='First episode to include in the sweep',
+    )
+    parser.add_argument(
+        '--end_episode',
+        '-E',
+        type=int,
+        default=MAX_EPISODE,
+        choices=range(1, MAX_EPISODE + 1),
+        help='Last episode to include in the sweep',
+    )
+    parser.add_argument(
+        '--lines_needed',
+        type=int,
+        nargs='+',
+        default=[LINES_NEEDED_FOR_CLOSENESS],
+        help='LINES_NEEDED_FOR_CLOSENESS values to evaluate',
+    )
+    parser.add_argument(
+        '--min_closeness',
+        type=float,
+        nargs='+',
+        default=[MIN_CLOSENESS],
+        help='MIN_CLOSENESS values to evaluate',
+    )
+    parser.add_argument(
+        '--min_appearances',
+        type=int,
+        nargs='+',
+        default=[MIN_EPISODE_APPEARANCES],
+        help='MIN_EPISODE_APPEARANCES values to evaluate',
+    )
+    parser.add_argument(
+        '--kernel',
+        type=str,
+        default=CLOSENESS_KERNEL,
+        choices=KERNELS,
+        help='CLOSENESS_KERNEL to score closeness with',
+    )
+    parser.add_argument(
+        '--save_dir',
+        '-D',
+        type=str,
+        default=DICT_DIRECTORY,
+        help='Directory from which to read scenes.pkl',
+    )
+    parser.add_argument(
+        '--output',
+        '-O',
+        type=str,
+        default=None,
+        help='Path of a .csv file to which to save the results table. '
+        'If not provided, the table is printed',
+    )
+    parser.add_argument(
+        '--logging_level',
+        '-L',
+        type=str.upper,
+        default='info',
+        help='Python logging level',
+    )
+    args = parser.parse_args()
+    if args.end_episode < args.start_episode:
+        parser.error('Start episode # must be less than end episode #')
+    logger = create_logger('parameter_sweep', logging_level=args.logging_level)
+    logger.info(vars(args))
+    episode_scenes = load_episode_scenes(
+        args.start_episode, args.end_episode, args.save_dir, logger
+    )
+    results = sweep_parameters(
+        episode_scenes,
+        args.lines_needed,
+        args.min_closeness,
+        args.min_appearances,
+        args.kernel,
+    )
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            write_results(results, f)
+        logger.info(f'Saved sweep results to {args.output}')
+    else:
+        write_results(results, sys.stdout)
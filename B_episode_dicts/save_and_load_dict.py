@@ -1,8 +1,10 @@
 import pickle
 
-from utils import load_config
+from utils import get_config
+from B_episode_dicts.compact_records import pack_scenes, unpack_scenes
+from B_episode_dicts.character_registry import CharacterRegistry
 
-CONFIG = load_config()
+CONFIG = get_config()
 DICT_TYPES = CONFIG['DICT_TYPES']
 DICT_DIRECTORY = CONFIG['DICT_DIRECTORY']
 
@@ -55,3 +57,48 @@ def save_dict_as_pkl(
     if logger:
         logger.info(f'Saved {dict_type} in {location}')
     return None
+
+
+def open_scenes_as_pkl(directory=DICT_DIRECTORY):
+    """
+    Opens the parsed-scene artifact saved by save_scenes_as_pkl
+    :param directory: Directory in which scenes.pkl is saved
+    :type directory: str
+    :return: Dictionary where key is an episode number and value is the
+        speaker_info_in_scenes attribute of its TMAEpisode
+    :rtype: dict
+    """
+    with open(f'{directory}/scenes.pkl', 'rb') as f:
+        registry, columns = pickle.load(f)
+    return {
+        e: {
+            scene_i: record.to_character_info(registry)
+            for scene_i, record in enumerate(scenes)
+        }
+        for e, scenes in unpack_scenes(columns).items()
+    }
+
+
+def save_scenes_as_pkl(scene_info_dict, directory=DICT_DIRECTORY, logger=None):
+    """
+    Saves the speaker info (word counts and line appearances, before character
+    aliases are resolved) in each scene of each episode, so that the episode
+    dicts can be rebuilt without reparsing the transcripts
+    :param scene_info_dict: Dictionary where key is an episode number and
+        value is the speaker_info_in_scenes attribute of its TMAEpisode
+    :type scene_info_dict: dict
+    :param directory: Directory in which scenes.pkl is saved
+    :type directory: str
+    :param logger: logging.Logger object
+    :type logger: logging.Logger object
+    :return: None
+    :rtype: None
+    """
+    registry = CharacterRegistry()
+    columns = pack_scenes(scene_info_dict, registry)
+    location = f'{directory}/scenes.pkl'
+    with open(location, 'wb') as outfile:
+        pickle.dump((registry, columns), outfile, pickle.HIGHEST_PROTOCOL)
+    if logger:
+        logger.info(f'Saved scenes in {location}')
+    return None
@@ -0,0 +1,364 @@
+"""
+Publishes the individual, cumulative, na, and ea dicts once, as flat arrays
+in a single file (shared_dicts.bin), which every process memory-maps
+read-only instead of unpickling its own copy of the dicts.
+
+Each dict is stored as its compact records (see compact_records.py): the
+array of record keys and, for each record attribute, the concatenated
+values of every record and the offset at which each record starts. The
+file starts with a JSON header holding the character names (the name index
+of the IDs in the keys) and the dtype, offset, and length of each array.
+
+The arrays are only ever read through the page cache, so however many app
+processes attach to the file, the host holds one copy of the data.
+SharedDictView presents each dict as a read-only mapping in the original
+layout, building the entry of an episode, character, or pair only when it
+is looked up.
+
+Run it on its own to publish the dicts already saved in a directory:
+    $ python3 B_episode_dicts/shared_dicts.py
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+from collections.abc import Mapping
+
+p = os.path.abspath('.')
+sys.path.insert(1, p)
+
+from utils import create_logger, get_config, lazy_import
+from B_episode_dicts.character_registry import CharacterRegistry, pack_pair
+from B_episode_dicts.compact_records import compact_dict, pack_records
+from B_episode_dicts.save_and_load_dict import open_dict_as_pkl
+
+np = lazy_import('numpy')
+
+CONFIG = get_config()
+DICT_TYPES = CONFIG['DICT_TYPES']
+DICT_DIRECTORY = CONFIG['DICT_DIRECTORY']
+MAGIC = b'TMASHARE'
+PREAMBLE = struct.Struct('<8sQ')
+ALIGNMENT = 64
+
+
+def aligned(offset):
+    """
+    :param offset: Byte offset
+    :type offset: int
+    :return: The first multiple of ALIGNMENT at or after offset
+    :rtype: int
+    """
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def flatten_shared_dicts(episode_dicts, registry):
+    """
+    Flattens the four dicts into the arrays stored in shared_dicts.bin
+    :param episode_dicts: Dictionary where key is 'individual',
+        'cumulative', 'na', or 'ea' and value is the corresponding dict
+    :type episode_dicts: dict
+    :param registry: Registry whose IDs key the records
+    :type registry: CharacterRegistry
+    :return: Dictionary where key is an array name ('<dict type>/keys',
+        '<dict type>/<attribute>', or '<dict type>/<attribute>/offsets')
+        and value is the array
+    :rtype: dict
+    """
+    arrays = {}
+    for dict_type in DICT_TYPES:
+        records = compact_dict(episode_dicts[dict_type], dict_type, registry)
+        _, keys, columns = pack_records(records)
+        arrays[f'{dict_type}/keys'] = np.array(keys, dtype=np.uint64)
+        for slot, (lengths, flat) in columns.items():
+            offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=offsets[1:])
+            arrays[f'{dict_type}/{slot}'] = np.frombuffer(
+                flat, dtype=flat.typecode
+            )
+            arrays[f'{dict_type}/{slot}/offsets'] = offsets
+    return arrays
+
+
+def save_shared_dicts(
+    episode_dicts, registry, directory=DICT_DIRECTORY, logger=None
+):
+    """
+    Publishes the four dicts to shared_dicts.bin. The file is written under
+    a temporary name and moved into place, so processes that are attached
+    to the previous version keep reading it until they reattach
+    :param episode_dicts: Dictionary where key is 'individual',
+        'cumulative', 'na', or 'ea' and value is the corresponding dict
+    :type episode_dicts: dict
+    :param registry: Registry shared by the four dicts
+    :type registry: CharacterRegistry
+    :param directory: Directory in which shared_dicts.bin is saved
+    :type directory: str
+    :param logger: logging.Logger object
+    :type logger: logging.Logger object
+    :return: None
+    :rtype: None
+    """
+    arrays = flatten_shared_dicts(episode_dicts, registry)
+    index, offset = {}, 0
+    for name, a in arrays.items():
+        index[name] = [a.dtype.str, offset, len(a)]
+        offset = aligned(offset + a.nbytes)
+    header = json.dumps({'characters': registry.names, 'arrays': index})
+    header = header.encode()
+    data_start = aligned(PREAMBLE.size + len(header))
+    location = f'{directory}/shared_dicts.bin'
+    with open(f'{location}.tmp', 'wb') as outfile:
+        outfile.write(PREAMBLE.pack(MAGIC, len(header)) + header)
+        for name, a in arrays.items():
+            outfile.seek(data_start + index[name][1])
+            outfile.write(a.tobytes())
+        outfile.truncate(data_start + offset)
+    os.replace(f'{location}.tmp', location)
+    if logger:
+        logger.info(f'Saved shared dicts in {location}')
+    return None
+
+
+def open_shared_dicts(directory=DICT_DIRECTORY):
+    """
+    Attaches to the dicts published by save_shared_dicts
+    :param directory: Directory in which shared_dicts.bin is saved
+    :type directory: str
+    :return: SharedDicts object, or None if the dicts have not been
+        published
+    :rtype: SharedDicts
+    """
+    location = f'{directory}/shared_dicts.bin'
+    if not os.path.exists(location):
+        return None
+    return SharedDicts(location)
+
+
+class SharedDicts:
+    """
+    A class used to represent the dicts published in shared_dicts.bin,
+    memory-mapped read-only.
+
+    Attributes
+    ---
+    location: str
+        Location of shared_dicts.bin
+    buffer: mmap.mmap
+        Read-only mapping of the file
+    registry: CharacterRegistry
+        Registry whose IDs key the records
+    arrays: dict
+        Dictionary where key is an array name and value is a read-only
+        numpy.ndarray backed by the mapping
+    """
+
+    def __init__(self, location):
+        """
+        :param location: Location of shared_dicts.bin
+        :type location: str
+        """
+        self.location = location
+        with open(location, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, header_length = PREAMBLE.unpack_from(self.buffer)
+        if magic != MAGIC:
+            raise ValueError(f'{location} is not a shared dicts file')
+        header = json.loads(
+            self.buffer[PREAMBLE.size : PREAMBLE.size + header_length]
+        )
+        data_start = aligned(PREAMBLE.size + header_length)
+        self.registry = CharacterRegistry(header['characters'])
+        self.arrays = {
+            name: np.frombuffer(
+                self.buffer,
+                dtype=dtype,
+                count=length,
+                offset=data_start + offset,
+            )
+            for name, (dtype, offset, length) in header['arrays'].items()
+        }
+
+    def __getitem__(self, dict_type):
+        """
+        :param dict_type: 'individual', 'cumulative', 'ea', or 'na'
+        :type dict_type: str
+        :return: Read-only view of the dict in its original layout
+        :rtype: SharedDictView
+        """
+        assert dict_type in DICT_TYPES
+        return SharedDictView(self, dict_type)
+
+    def episode_dict_dict(self):
+        """
+        :return: Dictionary containing the individual and cumulative episode
+            dicts, as taken by TMANetworkChart
+        :rtype: dict
+        """
+        return {
+            'individual': self['individual'],
+            'cumulative': self['cumulative'],
+        }
+
+
+class SharedDictView(Mapping):
+    """
+    A class used to represent one of the shared dicts as a read-only
+    mapping with the same keys and values as the dict returned by
+    open_dict_as_pkl. Values are built from the shared arrays on each
+    lookup and are not kept.
+
+    Attributes
+    ---
+    dict_type: str
+        'individual', 'cumulative', 'ea', or 'na'
+    registry: CharacterRegistry
+        Registry whose IDs key the records
+    keys_array: numpy.ndarray
+        Record keys (episode numbers, character IDs, or packed pair keys)
+    arrays: dict
+        Dictionary where key is a record attribute and value is its
+        concatenated values and record offsets
+    positions: dict
+        Dictionary where key is a record key and value is its position
+    """
+
+    def __init__(self, shared_dicts, dict_type):
+        """
+        :param shared_dicts: Attached shared dicts
+        :type shared_dicts: SharedDicts
+        :param dict_type: 'individual', 'cumulative', 'ea', or 'na'
+        :type dict_type: str
+        """
+        self.dict_type = dict_type
+        self.registry = shared_dicts.registry
+        self.keys_array = shared_dicts.arrays[f'{dict_type}/keys']
+        self.arrays = {
+            name.split('/')[1]: (
+                shared_dicts.arrays[name],
+                shared_dicts.arrays[f'{name}/offsets'],
+            )
+            for name in shared_dicts.arrays
+            if name.startswith(f'{dict_type}/')
+            and name.count('/') == 1
+            and name != f'{dict_type}/keys'
+        }
+        self.positions = {k: i for i, k in enumerate(self.keys_array.tolist())}
+
+    def __len__(self):
+        return len(self.keys_array)
+
+    def __iter__(self):
+        for key in self.keys_array.tolist():
+            yield self.unpack_key(key)
+
+    def __getitem__(self, key):
+        try:
+            position = self.positions[self.pack_key(key)]
+        except (KeyError, IndexError, TypeError):
+            raise KeyError(key) from None
+        return self.entry(position)
+
+    def pack_key(self, key):
+        """
+        :param key: Key in the original layout
+        :type key: int, str, or tuple
+        :return: Record key
+        :rtype: int
+        """
+        if self.dict_type == 'na':
+            return self.registry.id_of(key)
+        if self.dict_type == 'ea':
+            return pack_pair(
+                self.registry.id_of(key[0]), self.registry.id_of(key[1])
+            )
+        return key
+
+    def unpack_key(self, key):
+        """
+        :param key: Record key
+        :type key: int
+        :return: Key in the original layout
+        :rtype: int, str, or tuple
+        """
+        if self.dict_type == 'na':
+            return self.registry.name_of(key)
+        if self.dict_type == 'ea':
+            return self.registry.pair_names(key)
+        return key
+
+    def column(self, slot, position):
+        """
+        :param slot: Record attribute
+        :type slot: str
+        :param position: Position of the record
+        :type position: int
+        :return: Values of the attribute for the record
+        :rtype: list
+        """
+        values, offsets = self.arrays[slot]
+        return values[offsets[position] : offsets[position + 1]].tolist()
+
+    def entry(self, position):
+        """
+        :param position: Position of the record
+        :type position: int
+        :return: Value of the record in the original layout
+        :rtype: dict
+        """
+        if self.dict_type in ('individual', 'cumulative'):
+            names = self.registry.names
+            return {
+                'nodes_dict': {
+                    names[n]: {'size': s}
+                    for n, s in zip(
+                        self.column('node_ids', position),
+                        self.column('sizes', position),
+                    )
+                },
+                'edges_dict': {
+                    self.registry.pair_names(k): {'weight': w}
+                    for k, w in zip(
+                        self.column('edge_keys', position),
+                        self.column('weights', position),
+                    )
+                },
+            }
+        attribute = 'size' if self.dict_type == 'na' else 'weight'
+        return {
+            e: {attribute: v}
+            for e, v in zip(
+                self.column('episodes', position),
+                self.column('values', position),
+            )
+        }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--save_dir',
+        '-D',
+        type=str,
+        default=DICT_DIRECTORY,
+        help='Directory where the individual, cumulative, na and ea dicts '
+        'are saved, and to which to save shared_dicts.bin',
+    )
+    parser.add_argument(
+        '--logging_level',
+        '-L',
+        type=str.upper,
+        default='info',
+        help='Python logging level',
+    )
+    args = parser.parse_args()
+    logger = create_logger('shared_dicts', logging_level=args.logging_level)
+    dicts = {
+        dict_type: open_dict_as_pkl(dict_type, directory=args.save_dir)
+        for dict_type in DICT_TYPES
+    }
+    save_shared_dicts(
+        dicts, CharacterRegistry(dicts['na']), args.save_dir, logger
+    )
@@ -1,21 +1,34 @@
 import itertools
+from array import array
 import pprint
 import pickle
 import re
-from collections import defaultdict
+from collections import Counter, defaultdict
 
-from utils import create_logger, load_config
+from utils import create_logger, get_config
+from B_episode_dicts.alias_resolver import AliasResolver
+from B_episode_dicts.closeness_kernel import ClosenessKernel
 
-CONFIG = load_config()
+CONFIG = get_config()
 
-CHARACTER_CONSOLIDATION_DICT = CONFIG['CHARACTER_CONSOLIDATION_DICT']
-CHARACTER_CONSOLIDATION_DICT_2 = {
-    '\nMAGNUS\n': '\nELIAS\n',
-    '\nJOHN\n': '\nARCHIVIST\n',
-}
 LINES_NEEDED_FOR_CLOSENESS = CONFIG['LINES_NEEDED_FOR_CLOSENESS']
 MIN_CLOSENESS = CONFIG['MIN_CLOSENESS']
 TEXT_DIRECTORY = CONFIG['TEXT_DIRECTORY']
+ALIAS_RESOLVER = AliasResolver()
+
+
+def open_episode_texts(directory=TEXT_DIRECTORY):
+    """
+    Opens the .pkl file of episode texts extracted from the ebook
+    :param directory: Directory in which tma_text_from_epub.pkl is saved
+    :type directory: str
+    :return: Dictionary where key is an episode number and value is the
+        episode text
+    :rtype: dict
+    """
+    with open(f'{directory}/tma_text_from_epub.pkl', 'rb') as f:
+        episode_texts = pickle.load(f)
+    return episode_texts
 
 
 class TMAEpisode:
@@ -27,11 +40,25 @@ class TMAEpisode:
     number : int
         Episode number
     logger : a logging.Logger object
+    episode_texts: dict
+        Dictionary where key is an episode number and value is the episode
+        text
+    alias_resolver: AliasResolver
+        Resolver used to consolidate character aliases
+    aliases_fired: collections.Counter
+        Number of times each alias was resolved in the episode's scenes
+    closeness_kernel: ClosenessKernel
+        Kernel used to score the closeness of each pair in a scene
     transcript: str
         Episode transcript (stripped of title, summary, notes etc.)
-    character_info_in_scenes: dict
+    speaker_info_in_scenes: dict
         Nested dictionary where key is a scene number and value is a dictionary
-        of characters, their word counts, and line appearances in the scene
+        of speakers, as named in the transcript, and their word counts and
+        line appearances in the scene (what scenes.pkl stores)
+    character_info_in_scenes: dict
+        speaker_info_in_scenes with character aliases resolved, so that key is
+        a scene number and value is a dictionary of characters, their word
+        counts, and line appearances in the scene
     nodes_dict: dict
         Nested dictionary where key is a character in the episode and value is
         a dictionary of their attributes in the episode (currently just total
@@ -41,31 +68,79 @@ class TMAEpisode:
         least one scene together in the episode and value is a dictionary
         of their interaction attributes (currently just the "closeness" of
         interaction, labeled "weight" since it will be the weight of the edge)
+    interactions_dict: dict
+        Dictionary where key is a character pair and value is a list of
+        their exchanges in the episode as (scene number, first line, last
+        line, number of interactions) tuples
+    closeness_in_scenes: dict
+        Dictionary where key is a scene number and value is the index of
+        each character in the scene and the matrix of their pair scores
+        (see ClosenessKernel.scene_scores)
     """
 
-    def __init__(self, episode_number, logging_level='INFO'):
+    def __init__(
+        self,
+        episode_number,
+        logging_level='INFO',
+        episode_texts=None,
+        alias_resolver=ALIAS_RESOLVER,
+        closeness_kernel=None,
+    ):
         """
         :param episode_number: Episode number
         :type episode_number: int
         :param logging_level: A standard Python logging level
             (DEBUG, INFO, WARNING, ERROR, CRITICAL)
         :type logging_level: str
+        :param episode_texts: Dictionary where key is an episode number and
+            value is the episode text (see open_episode_texts). If not
+            provided, it is loaded from TEXT_DIRECTORY
+        :type episode_texts: dict
+        :param alias_resolver: Resolver applied to the speakers of each scene
+            to consolidate character aliases
+        :type alias_resolver: AliasResolver
+        :param closeness_kernel: Kernel used to score the closeness of each
+            pair in a scene. If not provided, the CLOSENESS_KERNEL config is
+            used
+        :type closeness_kernel: ClosenessKernel
         """
         self.number = episode_number
+        self.episode_texts = episode_texts
+        self.alias_resolver = alias_resolver
+        self.aliases_fired = Counter()
+        if closeness_kernel is None:
+            closeness_kernel = ClosenessKernel()
+        self.closeness_kernel = closeness_kernel
         self.logger = create_logger('tma_ep', logging_level=logging_level)
         self.transcript = None
+        self.speaker_info_in_scenes = {}
         self.character_info_in_scenes = {}
         self.nodes_dict = {}
         self.edges_dict = {}
+        self.interactions_dict = {}
+        self.closeness_in_scenes = {}
 
-    def __call__(self):
-        self.logger.info(f'{self.number} Extracting transcript')
-        self.extract_transcript()
-        self.clean_up_character_names()
-        self.logger.info(f'{self.number} Extracting character info in scene')
-        self.extract_character_info_in_scenes()
+    def __call__(self, speaker_info_in_scenes=None):
+        """
+        :param speaker_info_in_scenes: Previously parsed speaker info in each
+            scene (see save_scenes_as_pkl). If provided, the nodes and edges
+            dicts are built from it without touching the transcript
+        :type speaker_info_in_scenes: dict
+        """
+        if speaker_info_in_scenes is not None:
+            self.speaker_info_in_scenes = speaker_info_in_scenes
+            self.resolve_aliases()
+        else:
+            self.logger.info(f'{self.number} Extracting transcript')
+            self.extract_transcript()
+            self.clean_up_character_names()
+            self.logger.info(
+                f'{self.number} Extracting character info in scene'
+            )
+            self.extract_character_info_in_scenes()
         self.logger.info(f'{self.number} Generating nodes dict and edges dict')
         self.generate_nodes_and_edges_dict()
+        self.generate_interactions_dict()
 
     def extract_transcript(self):
         """
@@ -73,9 +148,9 @@ class TMAEpisode:
         :return: None
         :rtype: None
         """
-        with open(f'{TEXT_DIRECTORY}/tma_text_from_epub.pkl', 'rb') as f:
-            all_episode_texts = pickle.load(f)
-        html_text = all_episode_texts[self.number]
+        if self.episode_texts is None:
+            self.episode_texts = open_episode_texts()
+        html_text = self.episode_texts[self.number]
         tmarker1 = '[CLICK'
         tmarker2 = '[TAPE CLICKS'
         tmarker3 = 'End supplement'
@@ -113,23 +188,59 @@ class TMAEpisode:
     def extract_character_info_in_scenes(self):
         """
         Parses the transcript for scenes (denoted by the click of the tape
-        recorder) and generates character info for each scene
+        recorder) and generates speaker info for each scene, then resolves
+        character aliases in it (see resolve_aliases)
         :return: None
         :rtype: None
         """
-        for k, v in CHARACTER_CONSOLIDATION_DICT.items():
-            self.transcript = self.transcript.replace(k, v)
-        scene_list = re.split(
-            r'\[TAPE CLICKS OFF.\][\n][\n][^\n][A-Za-z0-9 _.,!"\'\’\]]*|\[CLICK\]\n\n\[CLICK\]|\[TAPE CLICKS OFF\][\n][\n]\[TAPE CLICKS ON\]',
-            self.transcript,
-        )
+        scene_list = self.split_scenes()
         self.logger.debug(scene_list)
         for i, scene in enumerate(scene_list):
-            self.character_info_in_scenes[i] = self.generate_character_info(
+            self.speaker_info_in_scenes[i] = self.generate_character_info(
                 scene
             )
+        self.resolve_aliases()
+        return None
+
+    def resolve_aliases(self):
+        """
+        Generates character info for each scene from its speaker info, merging
+        the word counts and line appearances of every alias into the
+        character it resolves to
+        :return: None
+        :rtype: None
+        """
+        for i, speaker_info in self.speaker_info_in_scenes.items():
+            character_info = {}
+            for speaker, info in speaker_info.items():
+                character = self.alias_resolver.resolve(
+                    speaker, self.aliases_fired
+                )
+                if character not in character_info:
+                    character_info[character] = info
+                else:
+                    merged = character_info[character]
+                    word_count = merged['word_count'] + info['word_count']
+                    appearances = merged['appearances'] + info['appearances']
+                    character_info[character] = {
+                        'word_count': word_count,
+                        'appearances': array('I', sorted(appearances)),
+                    }
+            self.character_info_in_scenes[i] = character_info
         return None
 
+    def split_scenes(self):
+        """
+        Splits the transcript into scenes (denoted by the click of the tape
+        recorder)
+        :return: Text of each scene, in order
+        :rtype: list
+        """
+        return re.split(
+            r'\[TAPE CLICKS OFF.\][\n][\n][^\n][A-Za-z0-9 _.,!"\'\’\]]*|\[CLICK\]\n\n\[CLICK\]|\[TAPE CLICKS OFF\][\n][\n]\[TAPE CLICKS ON\]',
+            self.transcript,
+        )
+
     def generate_character_info(self, scene):
         """
         Parses a scene and, for each character in the scene, extracts the
@@ -149,7 +260,7 @@ class TMAEpisode:
         character_info = defaultdict(self.character_dict_default_value)
         current_character = ''
         counter = 0
-        appearances = []
+        appearances = array('I')
         for i, line in enumerate(lines):
             self.logger.debug(f'On line {i}: {line}')
             if re.match(
@@ -194,7 +305,7 @@ class TMAEpisode:
                         self.logger.debug(f'Updated dict: {character_info}')
                     current_character = line
                     counter = 0
-                    appearances = [i]
+                    appearances = array('I', [i])
             elif re.match(
                 '\[[A-Za-z0-9 _.,!"\'\’]*\]', line
             ):  # check if this is an action
@@ -208,6 +319,25 @@ class TMAEpisode:
         self.logger.debug(' ')
         return dict(character_info)
 
+    def dialogue_lines(self, scene):
+        """
+        Walks a scene with the same rules as generate_character_info and
+        yields each line of dialogue along with the character speaking it
+        :param scene: Text of a scene
+        :type scene: str
+        :return: Generator of (line number, character name, line) tuples
+        :rtype: generator
+        """
+        current_character = ''
+        for i, line in enumerate(scene.split('\n')):
+            line = self.alias_resolver.resolve(line)
+            if re.match('^[A-Z!]*$', line):
+                current_character = line
+            elif re.match('\[[A-Za-z0-9 _.,!"\'\’]*\]', line):
+                continue
+            elif current_character:
+                yield i, current_character, line
+
     @staticmethod
     def character_dict_default_value():
         """
@@ -215,7 +345,7 @@ class TMAEpisode:
         :return: default dictionary for character info in scene
         :rtype: dict
         """
-        return {'word_count': 0, 'appearances': []}
+        return {'word_count': 0, 'appearances': array('I')}
 
     def generate_nodes_and_edges_dict(self):
         """
@@ -276,49 +406,76 @@ class TMAEpisode:
         scene_i,
         character_1,
         character_2,
-        lines_needed_for_interaction=LINES_NEEDED_FOR_CLOSENESS,
         min_closeness=MIN_CLOSENESS,
     ):
         """
         Calculates the closeness of a character pair in the scene
         The pair will start with a min_closeness score for just being in the
         same scene.
-        Closeness increases by 2 every time the pair speak within min_lines
-        of each other.
+        Closeness then increases by the kernel weight of every pair of their
+        lines (with the default window kernel, by 1 for every pair of lines
+        within LINES_NEEDED_FOR_CLOSENESS of each other). The pair scores of
+        the whole scene are computed once, on the first call for the scene
         :param scene_i: Scene number
         :type scene_i: int
         :param character_1: Name of a character in the pair
         :type character_1: str
         :param character_2: Name of another character in the pair
         :type character_2: str
-        :param lines_needed_for_interaction: Threshold line number separation
-            for increasing closeness score
-        :type lines_needed_for_interaction: int
         :param min_closeness: Base closeness score for appearance in same scene
         :type min_closeness: float
         :return: Closeness score
         :rtype: float
         """
-        list_1 = self.character_info_in_scenes[scene_i][character_1][
-            'appearances'
-        ]
-        list_2 = self.character_info_in_scenes[scene_i][character_2][
-            'appearances'
-        ]
-        l_idx, r_idx, counter, curr_count = 0, 0, 0, 0
-        for num in list_1:
-            while (
-                l_idx < len(list_2)
-                and num - list_2[l_idx] > lines_needed_for_interaction
-            ):
-                l_idx += 1
-                curr_count -= 1
-            while (
-                r_idx < len(list_2)
-                and list_2[r_idx] - num <= lines_needed_for_interaction
-            ):
-                r_idx += 1
-                curr_count += 1
-            counter += curr_count
+        if scene_i not in self.closeness_in_scenes:
+            characters, scores = self.closeness_kernel.scene_scores(
+                self.character_info_in_scenes[scene_i]
+            )
+            index = {character: i for i, character in enumerate(characters)}
+            self.closeness_in_scenes[scene_i] = index, scores
+        index, scores = self.closeness_in_scenes[scene_i]
+        counter = scores[index[character_1], index[character_2]].item()
         closeness = counter + min_closeness
         return closeness
+
+    def generate_interactions_dict(self):
+        """
+        Records where each character pair interacts (see
+        get_edge_interactions_in_scene) in every scene of the episode
+        :return: None
+        :rtype: None
+        """
+        for scene_i, scene_info in self.character_info_in_scenes.items():
+            for pair in itertools.combinations(scene_info, 2):
+                pair = tuple(sorted(pair))
+                exchanges = self.get_edge_interactions_in_scene(
+                    scene_i, pair[0], pair[1]
+                )
+                if exchanges:
+                    self.interactions_dict.setdefault(pair, []).extend(
+                        (scene_i, *exchange) for exchange in exchanges
+                    )
+        return None
+
+    def get_edge_interactions_in_scene(
+        self, scene_i, character_1, character_2
+    ):
+        """
+        Finds the lines where a character pair interacts in the scene (see
+        ClosenessKernel.exchanges), with the same kernel as
+        get_edge_closeness_in_scene
+        :param scene_i: Scene number
+        :type scene_i: int
+        :param character_1: Name of a character in the pair
+        :type character_1: str
+        :param character_2: Name of another character in the pair
+        :type character_2: str
+        :return: Exchanges as (first line, last line, number of interactions)
+            tuples, in line order
+        :rtype: list
+        """
+        scene_info = self.character_info_in_scenes[scene_i]
+        return self.closeness_kernel.exchanges(
+            scene_info[character_1]['appearances'],
+            scene_info[character_2]['appearances'],
+        )
@@ -0,0 +1,303 @@
+"""
+This script builds a full-text inverted index over the episode transcripts.
+
+Transcripts are split into scenes and speakers with the same rules TMAEpisode
+uses for the dicts, so each indexed document is the dialogue of one character
+in one scene of one episode. For every term, the index stores a positional
+posting (document, token position, line of the scene) per occurrence, which
+answers single-word and phrase queries without scanning the transcripts.
+
+It generates and saves the file TRANSCRIPT_INDEX: LOCATION.
+"""
+import argparse
+import os
+import re
+import sys
+
+p = os.path.abspath('.')
+sys.path.insert(1, p)
+
+from utils import create_logger, get_config, lazy_import
+from B_episode_dicts.character_registry import CharacterRegistry
+from B_episode_dicts.tma_episode_processor import (
+    TMAEpisode,
+    open_episode_texts,
+)
+
+np = lazy_import('numpy')
+
+CONFIG = get_config()
+MAX_EPISODE = CONFIG['MAX_EPISODE']
+TRANSCRIPT_INDEX = CONFIG['TRANSCRIPT_INDEX']
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:['’][a-z]+)*")
+
+
+def tokenize(text):
+    """
+    :param text: Text to tokenize
+    :type text: str
+    :return: Lower case word tokens, in order
+    :rtype: list
+    """
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def build_transcript_index(
+    start_episode, end_episode, episode_texts=None, logger_object=None
+):
+    """
+    Tokenizes each episode by scene and speaker and builds the inverted index
+    :param start_episode: First episode to index
+    :type start_episode: int
+    :param end_episode: Last episode to index
+    :type end_episode: int
+    :param episode_texts: Dictionary where key is an episode number and value
+        is the episode text. If not provided, it is loaded from the text
+        directory
+    :type episode_texts: dict
+    :param logger_object: a logging.Logger object
+    :type logger_object: logging.Logger object
+    :return: Dictionary of arrays (see TranscriptIndex)
+    :rtype: dict
+    """
+    if episode_texts is None:
+        episode_texts = open_episode_texts()
+    speakers = CharacterRegistry()
+    term_ids = {}
+    documents = []
+    postings = {'term': [], 'document': [], 'position': [], 'line': []}
+    for e in range(start_episode, end_episode + 1):
+        episode = TMAEpisode(
+            e, logging_level='WARNING', episode_texts=episode_texts
+        )
+        episode.extract_transcript()
+        episode.clean_up_character_names()
+        for scene_i, scene in enumerate(episode.split_scenes()):
+            scene_documents = {}
+            for line_i, speaker, line in episode.dialogue_lines(scene):
+                if speaker not in scene_documents:
+                    scene_documents[speaker] = [len(documents), 0]
+                    documents.append((e, scene_i, speakers.intern(speaker)))
+                document = scene_documents[speaker]
+                for token in tokenize(line):
+                    postings['term'].append(
+                        term_ids.setdefault(token, len(term_ids))
+                    )
+                    postings['document'].append(document[0])
+                    postings['position'].append(document[1])
+                    postings['line'].append(line_i)
+                    document[1] += 1
+                # Leave a gap between lines so phrases do not match across
+                # separate lines of dialogue
+                document[1] += 1
+        if logger_object:
+            logger_object.info(f'Indexed episode {e}')
+    terms = sorted(term_ids)
+    rank = np.empty(len(terms), dtype=np.uint32)
+    rank[[term_ids[t] for t in terms]] = np.arange(len(terms))
+    term_rank = rank[np.array(postings['term'], dtype=np.uint32)]
+    document = np.array(postings['document'], dtype=np.uint32)
+    position = np.array(postings['position'], dtype=np.uint32)
+    order = np.lexsort((position, document, term_rank))
+    return {
+        'terms': np.array(terms),
+        'term_offsets': np.searchsorted(
+            term_rank[order], np.arange(len(terms) + 1)
+        ).astype(np.uint32),
+        'documents': np.array(documents, dtype=np.uint16).reshape(-1, 3),
+        'speakers': np.array(speakers.names),
+        'posting_documents': document[order],
+        'posting_positions': position[order],
+        'posting_lines': np.array(postings['line'], dtype=np.uint16)[order],
+    }
+
+
+class TranscriptIndex:
+    """
+    A class used to represent the inverted index of the transcripts.
+
+    Attributes
+    ---
+    term_rows: dict
+        Dictionary where key is a term and value is its row in term_offsets
+    term_offsets: numpy.ndarray
+        The postings of term row i are at [term_offsets[i], term_offsets[i+1])
+    documents: numpy.ndarray
+        (documents x 3) array of episode, scene, and speaker ID
+    speakers: list
+        Character names, indexed by speaker ID
+    posting_documents: numpy.ndarray
+        Document of each posting
+    posting_positions: numpy.ndarray
+        Token position of each posting within its document
+    posting_lines: numpy.ndarray
+        Line of the scene of each posting
+    """
+
+    def __init__(self, arrays):
+        """
+        :param arrays: Output of build_transcript_index
+        :type arrays: dict
+        """
+        self.term_rows = {t: i for i, t in enumerate(arrays['terms'].tolist())}
+        self.term_offsets = arrays['term_offsets']
+        self.documents = arrays['documents']
+        self.speakers = arrays['speakers'].tolist()
+        self.posting_documents = arrays['posting_documents']
+        self.posting_positions = arrays['posting_positions']
+        self.posting_lines = arrays['posting_lines']
+
+    def postings(self, term):
+        """
+        :param term: A single (lower case) term
+        :type term: str
+        :return: Slice of the postings arrays for the term
+        :rtype: slice
+        """
+        row = self.term_rows.get(term)
+        if row is None:
+            return slice(0, 0)
+        return slice(self.term_offsets[row], self.term_offsets[row + 1])
+
+    def match(self, query):
+        """
+        Finds every occurrence of a word or phrase
+        :param query: Word or phrase
+        :type query: str
+        :return: Posting indices (of the first word of the phrase) of each
+            occurrence
+        :rtype: numpy.ndarray
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return np.array([], dtype=np.int64)
+        first = self.postings(tokens[0])
+        matches = np.arange(first.start, first.stop)
+        keys = (
+            self.posting_documents[matches].astype(np.int64) << 32
+        ) | self.posting_positions[matches]
+        for k, token in enumerate(tokens[1:], start=1):
+            s = self.postings(token)
+            token_keys = (
+                self.posting_documents[s].astype(np.int64) << 32
+            ) | self.posting_positions[s]
+            found = np.isin(keys + k, token_keys)
+            matches, keys = matches[found], keys[found]
+        return matches
+
+    def search(self, query):
+        """
+        Searches the transcripts for a word or phrase
+        :param query: Word or phrase
+        :type query: str
+        :return: One hit per episode, scene, and speaker, in episode order.
+            Each hit is a dictionary with the episode, scene, speaker, line
+            of the scene of the first occurrence, and number of occurrences
+        :rtype: list
+        """
+        matches = self.match(query)
+        documents, first, counts = np.unique(
+            self.posting_documents[matches],
+            return_index=True,
+            return_counts=True,
+        )
+        hits = []
+        for document, i, count in zip(
+            documents.tolist(), first.tolist(), counts.tolist()
+        ):
+            episode, scene, speaker = self.documents[document].tolist()
+            hits.append(
+                {
+                    'episode': episode,
+                    'scene': scene,
+                    'speaker': self.speakers[speaker],
+                    'line': int(self.posting_lines[matches[i]]),
+                    'count': count,
+                }
+            )
+        return hits
+
+
+def open_transcript_index(location=TRANSCRIPT_INDEX['LOCATION']):
+    """
+    Opens the index saved by save_transcript_index
+    :param location: Location of the .npz file
+    :type location: str
+    :return: TranscriptIndex object
+    :rtype: TranscriptIndex
+    """
+    with np.load(location) as f:
+        arrays = {k: f[k] for k in f.files}
+    return TranscriptIndex(arrays)
+
+
+def save_transcript_index(
+    arrays, location=TRANSCRIPT_INDEX['LOCATION'], logger=None
+):
+    """
+    Saves the index as a compressed .npz file
+    :param arrays: Output of build_transcript_index
+    :type arrays: dict
+    :param location: Location of the .npz file
+    :type location: str
+    :param logger: logging.Logger object
+    :type logger: logging.Logger object
+    :return: None
+    :rtype: None
+    """
+    np.savez_compressed(location, **arrays)
+    if logger:
+        logger.info(f'Saved transcript index to {location}')
+    return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--start_episode',
+        '-S',
+        type=int,
+        default=1,
+        choices=range(1, MAX_EPISODE + 1),
+        help='First episode to index',
+    )
+    parser.add_argument(
+        '--end_episode',
+        '-E',
+        type=int,
+        default=MAX_EPISODE,
+        choices=range(1, MAX_EPISODE + 1),
+        help='Last episode to index',
+    )
+    parser.add_argument(
+        '--query',
+        '-Q',
+        type=str,
+        default=None,
+        help='If provided, search the saved index for a word or phrase '
+        'instead of building it',
+    )
+    parser.add_argument(
+        '--logging_level',
+        '-L',
+        type=str.upper,
+        default='info',
+        help='Python logging level',
+    )
+    args = parser.parse_args()
+    if args.end_episode < args.start_episode:
+        parser.error('Start episode # must be less than end episode #')
+    logger = create_logger(
+        'transcript_index', logging_level=args.logging_level
+    )
+    if args.query:
+        for hit in open_transcript_index().search(args.query):
+            print(
+                f"MAG{hit['episode']:03} scene {hit['scene']} "
+                f"{hit['speaker']}: {hit['count']}"
+            )
+    else:
+        index_arrays = build_transcript_index(
+            args.start_episode, args.end_episode, logger_object=logger
+        )
+        save_transcript_index(index_arrays, logger=logger)
@@ -2,25 +2,142 @@
 This script creates an animation of multiple network charts for multiple
 episodes.
 
-It generates and saves a .mp4 file in the C_episode_charts/charts directory.
+It generates and saves, in the C_episode_charts/charts directory:
+    1. a web-optimized (faststart) .mp4 file at the default bitrate
+    2. the same animation at each bitrate in ANIMATION: BITRATES
+    3. a .png poster frame (the final frame of the animation)
+
+Frames are rendered through the on-disk frame cache (see frame_cache.py), so
+re-running it only renders episodes that are new or whose data or chart
+config has changed.
 """
 import argparse
 import os
+import shutil
+import subprocess
 import sys
-
-from celluloid import Camera
-import matplotlib.pyplot as plt
+import tempfile
 
 p = os.path.abspath('.')
 sys.path.insert(1, p)
 
-from utils import create_logger, load_config
+from utils import create_logger, get_config
 from C_episode_charts.retrieve_en import retrieve_included_edges_and_nodes
 from C_episode_charts.generate_network_charts import TMANetworkChart
+from C_episode_charts.frame_cache import FrameCache
+from C_episode_charts.animation_files import (
+    animation_file_name,
+    poster_file_name,
+)
 
-CONFIG = load_config()
+CONFIG = get_config()
 MAX_EPISODE = CONFIG['MAX_EPISODE']
 CHART_DIRECTORY = CONFIG['CHART_DIRECTORY']
+ANIMATION = CONFIG['ANIMATION']
+
+
+def concat_entry(frame_path):
+    """
+    :param frame_path: Location of a frame
+    :type frame_path: str
+    :return: Line of an ffmpeg concat list for the frame, with the quotes in
+        its absolute path escaped
+    :rtype: str
+    """
+    quoted = os.path.abspath(frame_path).replace("'", "'\\''")
+    return f"file '{quoted}'\n"
+
+
+def save_web_optimized_animation(frame_paths, save_location, bitrate=None):
+    """
+    Assembles frames into an H.264 .mp4 with its index at the start of the
+    file (faststart), so browsers can begin playback before the whole video
+    has downloaded
+    :param frame_paths: Locations of the frames, in order
+    :type frame_paths: list
+    :param save_location: Path of the .mp4 file
+    :type save_location: str
+    :param bitrate: Video bitrate in kbps. If not provided, ffmpeg's default
+        is used
+    :type bitrate: int
+    :return: None
+    :rtype: None
+    """
+    frame_duration = ANIMATION['FRAME_INTERVAL'] / 1000
+    with tempfile.NamedTemporaryFile('w', suffix='.txt') as frame_list:
+        for frame_path in frame_paths:
+            frame_list.write(concat_entry(frame_path))
+            frame_list.write(f'duration {frame_duration}\n')
+        # The concat demuxer ignores the duration of the final entry unless
+        # the frame is listed again
+        frame_list.write(concat_entry(frame_paths[-1]))
+        frame_list.flush()
+        command = (
+            ['ffmpeg', '-y', '-loglevel', 'error', '-f', 'concat']
+            + ['-safe', '0', '-i', frame_list.name]
+            + ['-vf', f'fps={1 / frame_duration}', '-c:v', 'libx264']
+            + ['-pix_fmt', 'yuv420p', '-movflags', '+faststart']
+        )
+        if bitrate:
+            command += ['-b:v', f'{bitrate}k']
+        subprocess.run(command + [save_location], check=True)
+    return None
+
+
+def animate_network_chart(
+    start_episode,
+    end_episode,
+    bitrates=ANIMATION['BITRATES'],
+    chart=None,
+    nodes_incl=None,
+    edges_incl=None,
+    logger=None,
+):
+    """
+    Renders (or reuses cached) frames for a range of episodes and saves the
+    animation at the default and each additional bitrate, plus a poster frame
+    :param start_episode: First episode to include in the animation
+    :type start_episode: int
+    :param end_episode: Last episode to include in the animation
+    :type end_episode: int
+    :param bitrates: Additional bitrates (kbps) at which to save the animation
+    :type bitrates: list
+    :param chart: Chart used to render frames. If not provided, one is created
+        from the saved episode dicts
+    :type chart: TMANetworkChart
+    :param nodes_incl: Nodes to include in the chart. If not provided (along
+        with edges_incl), they are retrieved from the saved dicts
+    :type nodes_incl: list
+    :param edges_incl: Edges to include in the chart
+    :type edges_incl: list
+    :param logger: logging.Logger object
+    :type logger: logging.Logger object
+    :return: Locations of the saved animations, in bitrate order
+    :rtype: list
+    """
+    if nodes_incl is None or edges_incl is None:
+        nodes_incl, edges_incl = retrieve_included_edges_and_nodes()
+    if chart is None:
+        chart = TMANetworkChart()
+    frame_cache = FrameCache(chart, nodes_incl, edges_incl)
+    frames = frame_cache(start_episode, end_episode)
+    save_locations = []
+    for bitrate in [None] + list(bitrates):
+        save_location = f'{CHART_DIRECTORY}/' + animation_file_name(
+            start_episode, end_episode, bitrate
+        )
+        save_web_optimized_animation(frames, save_location, bitrate)
+        save_locations.append(save_location)
+        if logger:
+            logger.info(f'Saved animation to {save_location}')
+    poster_location = f'{CHART_DIRECTORY}/' + poster_file_name(
+        start_episode, end_episode
+    )
+    shutil.copyfile(frames[-1], poster_location)
+    if logger:
+        logger.info(f'Saved poster frame to {poster_location}')
+    return save_locations
+
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
@@ -47,22 +164,18 @@ if __name__ == '__main__':
         default='info',
         help='Python logging level',
     )
+    parser.add_argument(
+        '--bitrates',
+        '-B',
+        type=int,
+        nargs='*',
+        default=ANIMATION['BITRATES'],
+        help='Additional bitrates (kbps) at which to save the animation',
+    )
     args = parser.parse_args()
     if args.end_episode < args.start_episode:
         parser.error('Start episode # must be less than end episode #')
     logger = create_logger('animator', logging_level=args.logging_level)
-    nodes_included, edges_included = retrieve_included_edges_and_nodes()
-    chart = TMANetworkChart()
-    plt.rcParams['font.serif'] = ['Baskerville']
-    fig, ax = chart.set_up_individual_plot()
-    camera = Camera(fig)
-    for i in range(args.start_episode, args.end_episode + 1):
-        chart.generate_network_chart(
-            'cumulative', i, ax, nodes_included, edges_included
-        )
-        camera.snap()
-    animation = camera.animate(interval=300)
-    save_location = f'{CHART_DIRECTORY}/tma_network_{args.start_episode}_to_{args.end_episode}.mp4'
-    animation.save(save_location)
-    logger.info(f'Saved gif to {save_location}')
-    plt.close('all')
+    animate_network_chart(
+        args.start_episode, args.end_episode, args.bitrates, logger=logger
+    )
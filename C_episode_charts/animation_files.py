@@ -0,0 +1,66 @@
+"""
+Locations of the network animation outputs written by
+animate_network_chart.py (videos at each bitrate and the poster frame),
+shared by the animation build and the app.
+"""
+import os
+
+from utils import get_config
+
+CONFIG = get_config()
+CHART_DIRECTORY = CONFIG['CHART_DIRECTORY']
+ANIMATION = CONFIG['ANIMATION']
+
+
+def animation_file_name(start_episode, end_episode, bitrate=None):
+    """
+    :param start_episode: First episode in the animation
+    :type start_episode: int
+    :param end_episode: Last episode in the animation
+    :type end_episode: int
+    :param bitrate: Video bitrate in kbps. If not provided, the name of the
+        default rendition is returned
+    :type bitrate: int
+    :return: File name of the animation
+    :rtype: str
+    """
+    suffix = f'_{bitrate}k' if bitrate else ''
+    return f'tma_network_{start_episode}_to_{end_episode}{suffix}.mp4'
+
+
+def poster_file_name(start_episode, end_episode):
+    """
+    :param start_episode: First episode in the animation
+    :type start_episode: int
+    :param end_episode: Last episode in the animation
+    :type end_episode: int
+    :return: File name of the poster frame (the final frame) of the animation
+    :rtype: str
+    """
+    return f'tma_network_{start_episode}_to_{end_episode}_poster.png'
+
+
+def select_animation_file(
+    start_episode,
+    end_episode,
+    bitrate=ANIMATION['DEFAULT_BITRATE'],
+    directory=CHART_DIRECTORY,
+):
+    """
+    Picks the rendition of the animation at the requested bitrate, falling
+    back to the default rendition if it has not been built
+    :param start_episode: First episode in the animation
+    :type start_episode: int
+    :param end_episode: Last episode in the animation
+    :type end_episode: int
+    :param bitrate: Preferred video bitrate in kbps
+    :type bitrate: int
+    :param directory: Directory in which the animations are saved
+    :type directory: str
+    :return: File name of the animation
+    :rtype: str
+    """
+    file_name = animation_file_name(start_episode, end_episode, bitrate)
+    if os.path.exists(f'{directory}/{file_name}'):
+        return file_name
+    return animation_file_name(start_episode, end_episode)
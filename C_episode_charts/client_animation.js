@@ -0,0 +1,161 @@
+// Animates the cumulative network chart in the browser from the client
+// animation bundle (see client_animation.py). BUNDLE (a base64 string of the
+// gzipped bundle) is defined by the page that includes this script. Frames
+// are drawn with the same limits, colours and size scaling as the
+// matplotlib charts (a 10 x 10 inch figure, i.e. 720 points across).
+(async function () {
+    const response = await fetch('data:application/gzip;base64,' + BUNDLE);
+    const bundle = await new Response(
+        response.body.pipeThrough(new DecompressionStream('gzip'))
+    ).json();
+    const canvas = document.getElementById('network');
+    const context = canvas.getContext('2d');
+    const play = document.getElementById('play');
+    const scrubber = document.getElementById('episode');
+    const label = document.getElementById('episode_label');
+    const tooltip = document.getElementById('tooltip');
+    const size = canvas.width;
+    const pixelsPerPoint = size / 720;
+    const frames = bundle.sizes.length;
+    const points = bundle.positions.map(([x, y]) => [
+        ((x + 1.2) / 2.3) * size,
+        ((1.2 - y) / 2.3) * size,
+    ]);
+    let frame = 0;
+    let timer = null;
+
+    function episodeName(i) {
+        return 'MAG' + String(bundle.start_episode + i).padStart(3, '0');
+    }
+
+    function nodeRadius(words) {
+        // matplotlib node sizes are marker areas in points^2
+        return (Math.sqrt(words / bundle.node_scaling) / 2) * pixelsPerPoint;
+    }
+
+    // With a time-aware bundle, characters and pairs are only drawn from the
+    // frame by which they have qualified
+    function qualified(values, from) {
+        return from ? values.map((v, i) => (frame >= from[i] ? v : 0)) : values;
+    }
+
+    function draw() {
+        const sizes = qualified(bundle.sizes[frame], bundle.character_from);
+        const weights = qualified(bundle.weights[frame], bundle.pair_from);
+        context.fillStyle = 'black';
+        context.fillRect(0, 0, size, size);
+        context.strokeStyle = 'rgba(35, 207, 119, 0.5)';
+        bundle.pairs.forEach(([i, j], k) => {
+            if (weights[k] > 0) {
+                context.lineWidth = (weights[k] / bundle.edge_scaling) * pixelsPerPoint;
+                context.beginPath();
+                context.moveTo(...points[i]);
+                context.lineTo(...points[j]);
+                context.stroke();
+            }
+        });
+        context.fillStyle = '#1a9340';
+        context.strokeStyle = '#126840';
+        context.lineWidth = pixelsPerPoint;
+        points.forEach(([x, y], i) => {
+            if (sizes[i] > 0) {
+                context.beginPath();
+                context.arc(x, y, nodeRadius(sizes[i]), 0, 2 * Math.PI);
+                context.fill();
+                context.stroke();
+            }
+        });
+        context.fillStyle = 'white';
+        context.textAlign = 'center';
+        context.textBaseline = 'middle';
+        context.font = `${12 * pixelsPerPoint}px Baskerville, serif`;
+        points.forEach(([x, y], i) => {
+            if (sizes[i] > 0) {
+                context.fillText(bundle.characters[i], x, y);
+            }
+        });
+        const title = `${episodeName(frame)} (CUMULATIVE)`;
+        context.font = `bold ${18 * pixelsPerPoint}px Baskerville, serif`;
+        const width = context.measureText(title).width + 10 * pixelsPerPoint;
+        context.fillStyle = 'rgba(26, 147, 64, 0.5)';
+        context.fillRect((size - width) / 2, 0.03 * size - 14 * pixelsPerPoint,
+            width, 28 * pixelsPerPoint);
+        context.fillStyle = 'white';
+        context.fillText(title, size / 2, 0.03 * size);
+        scrubber.value = frame;
+        label.textContent = episodeName(frame);
+    }
+
+    function distanceToSegment(x, y, [x1, y1], [x2, y2]) {
+        const dx = x2 - x1;
+        const dy = y2 - y1;
+        const t = Math.max(0, Math.min(1,
+            ((x - x1) * dx + (y - y1) * dy) / (dx * dx + dy * dy || 1)));
+        return Math.hypot(x - (x1 + t * dx), y - (y1 + t * dy));
+    }
+
+    function hovered(x, y) {
+        const sizes = qualified(bundle.sizes[frame], bundle.character_from);
+        const weights = qualified(bundle.weights[frame], bundle.pair_from);
+        for (let i = 0; i < points.length; i++) {
+            const radius = Math.max(nodeRadius(sizes[i]), 6);
+            if (sizes[i] > 0 && Math.hypot(x - points[i][0], y - points[i][1]) <= radius) {
+                return `${bundle.characters[i]}: ${sizes[i].toLocaleString()} words`;
+            }
+        }
+        for (let k = 0; k < bundle.pairs.length; k++) {
+            const [i, j] = bundle.pairs[k];
+            if (weights[k] > 0 && distanceToSegment(x, y, points[i], points[j]) <= 4) {
+                return `${bundle.characters[i]} & ${bundle.characters[j]}: `
+                    + `${weights[k].toFixed(0)} closeness`;
+            }
+        }
+        return null;
+    }
+
+    function pause() {
+        clearInterval(timer);
+        timer = null;
+        play.textContent = 'Play';
+    }
+
+    function start() {
+        if (frame === frames - 1) {
+            frame = 0;
+            draw();
+        }
+        play.textContent = 'Pause';
+        timer = setInterval(() => {
+            if (frame === frames - 1) {
+                pause();
+                return;
+            }
+            frame += 1;
+            draw();
+        }, bundle.frame_interval);
+    }
+
+    scrubber.min = 0;
+    scrubber.max = frames - 1;
+    scrubber.addEventListener('input', () => {
+        pause();
+        frame = Number(scrubber.value);
+        draw();
+    });
+    play.addEventListener('click', () => (timer ? pause() : start()));
+    canvas.addEventListener('mousemove', (event) => {
+        const box = canvas.getBoundingClientRect();
+        const text = hovered(event.clientX - box.left, event.clientY - box.top);
+        tooltip.style.display = text ? 'block' : 'none';
+        if (text) {
+            tooltip.textContent = text;
+            tooltip.style.left = `${event.pageX + 12}px`;
+            tooltip.style.top = `${event.pageY + 12}px`;
+        }
+    });
+    canvas.addEventListener('mouseleave', () => {
+        tooltip.style.display = 'none';
+    });
+    draw();
+    start();
+})();
@@ -0,0 +1,236 @@
+"""
+This script exports the cumulative network chart of every episode as a
+compact bundle that the browser animates on its own.
+
+Instead of rendering a video frame per episode, the bundle holds the fixed
+position of each included character, the included pairs (as indices into
+the characters), and for each episode the cumulative words spoken by each
+character and closeness of each pair. client_animation_html() embeds it,
+along with client_animation.js, in a single page that draws the frames on a
+canvas with the same look as the matplotlib charts, plays them at
+ANIMATION: FRAME_INTERVAL, and lets viewers pause, scrub to an episode, and
+hover over a character or pair.
+
+It generates and saves the file CLIENT_ANIMATION: LOCATION.
+"""
+import argparse
+import base64
+import gzip
+import json
+import os
+import sys
+
+p = os.path.abspath('.')
+sys.path.insert(1, p)
+
+from utils import create_logger, get_config
+from C_episode_charts.generate_network_charts import TMANetworkChart
+from C_episode_charts.retrieve_en import retrieve_included_edges_and_nodes
+from B_episode_dicts.inclusion_index import open_inclusion_index
+
+CONFIG = get_config()
+MAX_EPISODE = CONFIG['MAX_EPISODE']
+TIME_AWARE_INCLUSION = CONFIG['TIME_AWARE_INCLUSION']
+DICT_DIRECTORY = CONFIG['DICT_DIRECTORY']
+ANIMATION = CONFIG['ANIMATION']
+CLIENT_ANIMATION = CONFIG['CLIENT_ANIMATION']
+CLIENT_ANIMATION_SCRIPT = os.path.join(
+    os.path.dirname(__file__), 'client_animation.js'
+)
+
+
+def build_animation_bundle(
+    chart,
+    nodes_incl,
+    edges_incl,
+    start_episode,
+    end_episode,
+    inclusion_index=None,
+):
+    """
+    Collects the cumulative sizes and weights of the included characters and
+    pairs in each episode, against fixed node positions. With an inclusion
+    index, the bundle also holds the frame from which each character and
+    pair is drawn (the frame of the episode by which it has qualified)
+    :param chart: Chart holding the cumulative episode dict and the layout
+    :type chart: TMANetworkChart
+    :param nodes_incl: Nodes to include in the animation
+    :type nodes_incl: list
+    :param edges_incl: Edges to include in the animation
+    :type edges_incl: list
+    :param start_episode: First episode of the animation
+    :type start_episode: int
+    :param end_episode: Last episode of the animation
+    :type end_episode: int
+    :param inclusion_index: If provided, characters and pairs are only drawn
+        from the episode by which they have qualified
+    :type inclusion_index: InclusionIndex
+    :return: JSON-serializable bundle
+    :rtype: dict
+    """
+    cumulative = chart.episode_dict_dict['cumulative']
+    g = chart.build_graph('cumulative', end_episode, nodes_incl, edges_incl)
+    positions = chart.positions_for(g, nodes_incl, edges_incl)
+    characters = [n for n in nodes_incl if n in positions]
+    index = {name: i for i, name in enumerate(characters)}
+    pairs = [(a, b) for a, b in edges_incl if a in index and b in index]
+    sizes, weights = [], []
+    for e in range(start_episode, end_episode + 1):
+        nd = cumulative[e]['nodes_dict']
+        ed = cumulative[e]['edges_dict']
+        sizes.append([nd.get(n, {}).get('size', 0) for n in characters])
+        weights.append(
+            [round(ed.get(pair, {}).get('weight', 0), 3) for pair in pairs]
+        )
+    scaling = TMANetworkChart.SIZE_SCALING['cumulative']
+    bundle = {
+        'start_episode': start_episode,
+        'frame_interval': ANIMATION['FRAME_INTERVAL'],
+        'node_scaling': scaling['node'],
+        'edge_scaling': scaling['edge'],
+        'characters': characters,
+        'positions': [[round(c, 4) for c in positions[n]] for n in characters],
+        'pairs': [[index[a], index[b]] for a, b in pairs],
+        'sizes': sizes,
+        'weights': weights,
+    }
+    if inclusion_index is not None:
+        character_episodes, pair_episodes = inclusion_index.first_episodes(
+            characters, pairs
+        )
+        bundle['character_from'] = [
+            max(e - start_episode, 0) for e in character_episodes
+        ]
+        bundle['pair_from'] = [
+            max(e - start_episode, 0) for e in pair_episodes
+        ]
+    return bundle
+
+
+def save_animation_bundle(
+    bundle, location=CLIENT_ANIMATION['LOCATION'], logger=None
+):
+    """
+    Saves a bundle as gzipped JSON
+    :param bundle: Output of build_animation_bundle
+    :type bundle: dict
+    :param location: Location of the bundle
+    :type location: str
+    :param logger: logging.Logger object
+    :type logger: logging.Logger object
+    :return: None
+    :rtype: None
+    """
+    data = json.dumps(bundle, separators=(',', ':')).encode()
+    with open(location, 'wb') as f:
+        f.write(gzip.compress(data, mtime=0))
+    if logger:
+        logger.info(f'Saved client animation to {location}')
+    return None
+
+
+def client_animation_html(bundle_bytes, size=CLIENT_ANIMATION['SIZE']):
+    """
+    Builds a self-contained page that animates the network chart in the
+    browser from the bundle
+    :param bundle_bytes: Contents of a saved bundle (gzipped JSON)
+    :type bundle_bytes: bytes
+    :param size: Width and height of the chart in pixels
+    :type size: int
+    :return: HTML string
+    :rtype: str
+    """
+    with open(CLIENT_ANIMATION_SCRIPT, 'r') as f:
+        script = f.read()
+    bundle = base64.b64encode(bundle_bytes).decode()
+    html_str = f"""
+        <html>
+        <head>
+        <style>
+            body {{ margin: 0; font-family: Baskerville, serif;
+                color: white; background: #0E1117; }}
+            .controls {{ display: flex; align-items: center; gap: 1em;
+                width: {size}px; margin: 0 auto 0.5em auto; }}
+            .controls input {{ flex: 1; accent-color: #23cf77; }}
+            button {{ background: #1a9340; color: white; border: none;
+                padding: 0.3em 1em; font-family: inherit; }}
+            canvas {{ display: block; margin: 0 auto; }}
+            #tooltip {{ position: absolute; pointer-events: none;
+                background: black; padding: 0.3em 0.6em; display: none; }}
+        </style>
+        </head>
+        <body>
+        <div class="controls">
+            <button id="play">Pause</button>
+            <input id="episode" type="range" step="1">
+            <span id="episode_label"></span>
+        </div>
+        <canvas id="network" width="{size}" height="{size}"></canvas>
+        <div id="tooltip"></div>
+        <script>
+            const BUNDLE = "{bundle}";
+        </script>
+        <script>{script}</script>
+        </body>
+        </html>
+        """
+    return html_str
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--start_episode',
+        '-S',
+        type=int,
+        default=1,
+        choices=range(1, MAX_EPISODE + 1),
+        help='First episode to include in the animation',
+    )
+    parser.add_argument(
+        '--end_episode',
+        '-E',
+        type=int,
+        default=MAX_EPISODE,
+        choices=range(1, MAX_EPISODE + 1),
+        help='Last episode to include in the animation',
+    )
+    parser.add_argument(
+        '--save_dir',
+        '-D',
+        type=str,
+        default=DICT_DIRECTORY,
+        help='Directory where the cumulative, na and ea dicts are saved',
+    )
+    parser.add_argument(
+        '--time_aware',
+        action=argparse.BooleanOptionalAction,
+        default=TIME_AWARE_INCLUSION,
+        help='Only draw each character and pair from the episode by which '
+        'they have appeared in MIN_EPISODE_APPEARANCES episodes',
+    )
+    parser.add_argument(
+        '--logging_level',
+        '-L',
+        type=str.upper,
+        default='info',
+        help='Python logging level',
+    )
+    args = parser.parse_args()
+    if args.end_episode < args.start_episode:
+        parser.error('Start episode # must be less than end episode #')
+    logger = create_logger(
+        'client_animation', logging_level=args.logging_level
+    )
+    nodes_included, edges_included = retrieve_included_edges_and_nodes(
+        args.save_dir
+    )
+    animation_bundle = build_animation_bundle(
+        TMANetworkChart(args.save_dir, logging_level=args.logging_level),
+        nodes_included,
+        edges_included,
+        args.start_episode,
+        args.end_episode,
+        open_inclusion_index(args.save_dir) if args.time_aware else None,
+    )
+    save_animation_bundle(animation_bundle, logger=logger)
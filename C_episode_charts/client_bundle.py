@@ -0,0 +1,238 @@
+"""
+This script exports the data behind the per-character charts as a compact
+bundle that the browser renders on its own.
+
+The bundle is gzipped JSON holding the included characters, the included
+pairs (as indices into the characters), a (character x episode) word matrix,
+a (pair x episode) closeness matrix, the orders in which the all-character
+heatmap lists the characters (see cast_orders()) and, optionally, where the
+exchanges behind each pair's closeness happen (see interaction_index.py).
+client_chart_html() embeds it, along with plotly.js and client_chart.js, in
+a single page: choosing a character, second character or chart type is then
+handled entirely in the browser.
+
+It generates and saves the file CLIENT_BUNDLE: LOCATION.
+"""
+import argparse
+import base64
+import gzip
+import json
+import os
+import sys
+
+p = os.path.abspath('.')
+sys.path.insert(1, p)
+
+from utils import create_logger, get_config, lazy_import
+from B_episode_dicts.appearance_matrices import (
+    cast_orders,
+    open_appearance_matrices,
+)
+from B_episode_dicts.character_registry import pack_pair
+from B_episode_dicts.interaction_index import open_interaction_index
+from C_episode_charts.retrieve_en import retrieve_included_edges_and_nodes
+
+np = lazy_import('numpy')
+plotly_offline = lazy_import('plotly.offline')
+
+CONFIG = get_config()
+MAX_EPISODE = CONFIG['MAX_EPISODE']
+DICT_DIRECTORY = CONFIG['DICT_DIRECTORY']
+CLIENT_BUNDLE = CONFIG['CLIENT_BUNDLE']
+CHART_BY_CHARACTER_DIMENSIONS = CONFIG['CHART_BY_CHARACTER_DIMENSIONS']
+TRANSCRIPT_URL = 'https://snarp.github.io/magnus_archives_transcripts/episode/'
+CLIENT_CHART_SCRIPT = os.path.join(
+    os.path.dirname(__file__), 'client_chart.js'
+)
+
+
+def build_client_bundle(
+    matrices, nodes_incl, edges_incl, end_episode, interaction_index=None
+):
+    """
+    Selects the rows of the appearance matrices (and the exchanges) needed by
+    the app
+    :param matrices: Output of build_appearance_matrices
+    :type matrices: dict
+    :param nodes_incl: Characters that can be selected
+    :type nodes_incl: list
+    :param edges_incl: Character pairs that can be selected
+    :type edges_incl: list
+    :param end_episode: Last episode to include in the charts
+    :type end_episode: int
+    :param interaction_index: If provided, the exchanges (scene, line range
+        and number of interactions) of each included pair are added to the
+        bundle, keyed by episode
+    :type interaction_index: InteractionIndex
+    :return: JSON-serializable bundle
+    :rtype: dict
+    """
+    ids = {name: i for i, name in enumerate(matrices['characters'])}
+    rows = {int(key): row for row, key in enumerate(matrices['pair_keys'])}
+    index = {name: i for i, name in enumerate(nodes_incl)}
+    pair_rows = [rows[pack_pair(ids[a], ids[b])] for a, b in edges_incl]
+    words = matrices['words'][[ids[n] for n in nodes_incl], :end_episode]
+    closeness = matrices['closeness'][pair_rows, :end_episode]
+    bundle = {
+        'end_episode': end_episode,
+        'transcript_url': TRANSCRIPT_URL,
+        'characters': list(nodes_incl),
+        'pairs': [[index[a], index[b]] for a, b in edges_incl],
+        'words': words.tolist(),
+        'closeness': np.round(closeness, 3).tolist(),
+        'cast_orders': {
+            order: rows.tolist() for order, rows in cast_orders(words).items()
+        },
+    }
+    if interaction_index is not None:
+        bundle['exchanges'] = []
+        for a, b in edges_incl:
+            pair_exchanges = {}
+            for exchange in interaction_index.exchanges(a, b):
+                if exchange['episode'] <= end_episode:
+                    pair_exchanges.setdefault(exchange['episode'], []).append(
+                        [
+                            exchange['scene'],
+                            exchange['start'],
+                            exchange['end'],
+                            exchange['count'],
+                        ]
+                    )
+            bundle['exchanges'].append(pair_exchanges)
+    return bundle
+
+
+def save_client_bundle(
+    bundle, location=CLIENT_BUNDLE['LOCATION'], logger=None
+):
+    """
+    Saves a bundle as gzipped JSON
+    :param bundle: Output of build_client_bundle
+    :type bundle: dict
+    :param location: Location of the bundle
+    :type location: str
+    :param logger: logging.Logger object
+    :type logger: logging.Logger object
+    :return: None
+    :rtype: None
+    """
+    data = json.dumps(bundle, separators=(',', ':')).encode()
+    with open(location, 'wb') as f:
+        f.write(gzip.compress(data, mtime=0))
+    if logger:
+        logger.info(f'Saved client bundle to {location}')
+    return None
+
+
+def client_chart_html(
+    bundle_bytes,
+    height=CHART_BY_CHARACTER_DIMENSIONS['HEIGHT'],
+    width=CHART_BY_CHARACTER_DIMENSIONS['WIDTH'],
+    exchanges_height=CLIENT_BUNDLE['EXCHANGES_HEIGHT'],
+    cast_height=CHART_BY_CHARACTER_DIMENSIONS['CAST_HEIGHT'],
+):
+    """
+    Builds a self-contained page with the character selectors and the chart,
+    rendered in the browser from the bundle. If the bundle has exchanges,
+    clicking an episode of a pair's chart lists them below the chart
+    :param bundle_bytes: Contents of a saved bundle (gzipped JSON)
+    :type bundle_bytes: bytes
+    :param height: Height of the chart in pixels
+    :type height: int
+    :param width: Width of the chart in pixels
+    :type width: int
+    :param exchanges_height: Maximum height of the exchanges list in pixels
+    :type exchanges_height: int
+    :param cast_height: Height of the all-character heatmap in pixels
+    :type cast_height: int
+    :return: HTML string
+    :rtype: str
+    """
+    with open(CLIENT_CHART_SCRIPT, 'r') as f:
+        script = f.read()
+    bundle = base64.b64encode(bundle_bytes).decode()
+    html_str = f"""
+        <html>
+        <head>
+        <style>
+            body {{ font-family: Baskerville, serif; color: white; }}
+            .controls {{ display: flex; gap: 1em; margin-bottom: 1em; }}
+            .controls label {{ display: flex; flex-direction: column; flex: 1; }}
+            select {{ background: #262730; color: white; padding: 0.4em; }}
+            #exchanges {{ max-height: {exchanges_height}px; overflow-y: auto; }}
+            #exchanges a {{ color: #23cf77; }}
+        </style>
+        </head>
+        <body>
+        <div class="controls">
+            <label>Select a character
+                <select id="character_a"></select></label>
+            <label>Select a second character (opt.)
+                <select id="character_b"></select></label>
+            <label>Select a chart type
+                <select id="chart_type">
+                    <option value="heatmap">heatmap</option>
+                    <option value="bar">bar</option>
+                    <option value="cast">all characters</option>
+                </select></label>
+            <label>Sort all characters by
+                <select id="cast_order">
+                    <option value="first_appearance">first appearance</option>
+                    <option value="total_words">total words</option>
+                </select></label>
+        </div>
+        <div id="hint"></div>
+        <div id="chart"></div>
+        <div id="exchanges"></div>
+        <script>{plotly_offline.get_plotlyjs()}</script>
+        <script>
+            const BUNDLE = "{bundle}";
+            const HEIGHT = {height};
+            const WIDTH = {width};
+            const CAST_HEIGHT = {cast_height};
+        </script>
+        <script>{script}</script>
+        </body>
+        </html>
+        """
+    return html_str
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--end_episode',
+        '-E',
+        type=int,
+        default=MAX_EPISODE,
+        choices=range(1, MAX_EPISODE + 1),
+        help='Last episode to include in the charts',
+    )
+    parser.add_argument(
+        '--save_dir',
+        '-D',
+        type=str,
+        default=DICT_DIRECTORY,
+        help='Directory where the na, ea, appearance matrices and interaction '
+        'index are saved',
+    )
+    parser.add_argument(
+        '--logging_level',
+        '-L',
+        type=str.upper,
+        default='info',
+        help='Python logging level',
+    )
+    args = parser.parse_args()
+    logger = create_logger('client_bundle', logging_level=args.logging_level)
+    nodes_included, edges_included = retrieve_included_edges_and_nodes(
+        args.save_dir
+    )
+    client_bundle = build_client_bundle(
+        open_appearance_matrices(args.save_dir),
+        nodes_included,
+        edges_included,
+        args.end_episode,
+        open_interaction_index(args.save_dir),
+    )
+    save_client_bundle(client_bundle, logger=logger)
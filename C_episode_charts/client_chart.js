@@ -0,0 +1,217 @@
+// Renders the per-character heatmap and bar charts, the all-character
+// heatmap (and a pair's exchanges in a clicked episode) in the browser from
+// the client bundle (see client_bundle.py). BUNDLE (a base64 string of the
+// gzipped bundle), HEIGHT, WIDTH and CAST_HEIGHT are defined by the page
+// that includes this script.
+(async function () {
+    const response = await fetch('data:application/gzip;base64,' + BUNDLE);
+    const bundle = await new Response(
+        response.body.pipeThrough(new DecompressionStream('gzip'))
+    ).json();
+    const characterA = document.getElementById('character_a');
+    const characterB = document.getElementById('character_b');
+    const chartType = document.getElementById('chart_type');
+    const castOrder = document.getElementById('cast_order');
+    const hint = document.getElementById('hint');
+    const exchanges = document.getElementById('exchanges');
+    const partners = bundle.characters.map(() => []);
+    bundle.pairs.forEach(([i, j], row) => {
+        partners[i].push([j, row]);
+        partners[j].push([i, row]);
+    });
+    const episodes = Array.from({length: bundle.end_episode}, (_, i) => i + 1);
+    const urls = episodes.map(
+        (e) => bundle.transcript_url + String(e).padStart(3, '0') + '.html'
+    );
+
+    function option(value, text) {
+        const element = document.createElement('option');
+        element.value = value;
+        element.textContent = text;
+        return element;
+    }
+
+    function fillCharacterB() {
+        characterB.replaceChildren(option('', 'None'));
+        partners[Number(characterA.value)].forEach(([j, row]) => {
+            characterB.appendChild(option(row, bundle.characters[j]));
+        });
+    }
+
+    function selection() {
+        const a = bundle.characters[Number(characterA.value)];
+        if (characterB.value === '') {
+            return {
+                values: bundle.words[Number(characterA.value)],
+                title: `Words Spoken by ${a}`,
+                label: 'Words Spoken',
+                format: '.3s',
+            };
+        }
+        const b = characterB.options[characterB.selectedIndex].textContent;
+        return {
+            values: bundle.closeness[Number(characterB.value)],
+            title: `Interactions Between ${a} and ${b}`,
+            label: 'Interaction Score',
+            format: '.0f',
+        };
+    }
+
+    function layout(title) {
+        return {
+            title: {text: title},
+            height: HEIGHT,
+            width: WIDTH,
+            font: {family: 'Baskerville', size: 20, color: 'white'},
+            hoverlabel: {font: {family: 'Baskerville', size: 14}},
+            plot_bgcolor: '#262730',
+            paper_bgcolor: '#262730',
+        };
+    }
+
+    function barChart(s) {
+        const trace = {
+            type: 'bar',
+            x: episodes,
+            y: s.values,
+            customdata: urls,
+            marker: {color: '#23cf77'},
+            hovertemplate: `MAG%{x:03}<br>${s.label}: %{y:${s.format}} <extra></extra>`,
+        };
+        const l = layout(s.title);
+        l.xaxis = {title: {text: 'Episode'}};
+        l.yaxis = {title: {text: s.label}, showgrid: false, tickformat: '.1s'};
+        return [[trace], l];
+    }
+
+    function heatMap(s) {
+        const seasons = Math.floor((bundle.end_episode - 1) / 40) + 1;
+        const maximum = Math.max(...s.values);
+        const z = [];
+        const text = [];
+        const customdata = [];
+        for (let season = 0; season < seasons; season++) {
+            const row = Array.from({length: 40}, (_, i) => season * 40 + i + 1);
+            text.push(row);
+            z.push(row.map((e) => (e > bundle.end_episode ? -maximum : s.values[e - 1])));
+            customdata.push(row.map((e) => urls[e - 1] || ''));
+        }
+        const trace = {
+            type: 'heatmap',
+            z: z,
+            y: Array.from({length: seasons}, (_, i) => i + 1),
+            text: text,
+            texttemplate: '%{text}',
+            customdata: customdata,
+            colorscale: [[0, 'white'], [0.5, 'black'], [1, '#23cf77']],
+            zmin: -maximum,
+            zmax: maximum,
+            showscale: false,
+            textfont: {color: 'white', family: 'Baskerville'},
+            hoverlabel: {bgcolor: 'black'},
+            hovertemplate: `MAG%{text:03}<br>${s.label}: %{z:${s.format}} <extra></extra>`,
+        };
+        const l = layout(s.title);
+        l.xaxis = {visible: false};
+        l.yaxis = {
+            title: {text: 'Season'},
+            tickformat: 'd',
+            tick0: 1,
+            dtick: 1,
+            autorange: 'reversed',
+        };
+        return [[trace], l];
+    }
+
+    // Every character in one trace, one row per character
+    function castMap() {
+        const rows = bundle.cast_orders[castOrder.value];
+        const trace = {
+            type: 'heatmap',
+            z: rows.map((i) => bundle.words[i]),
+            x: episodes,
+            y: rows.map((i) => bundle.characters[i]),
+            customdata: rows.map(() => urls),
+            colorscale: [[0, 'black'], [1, '#23cf77']],
+            zmin: 0,
+            showscale: false,
+            xgap: 1,
+            ygap: 1,
+            hoverlabel: {bgcolor: 'black'},
+            hovertemplate: 'MAG%{x:03}<br>%{y}<br>Words Spoken: %{z:.3s} <extra></extra>',
+        };
+        const l = layout('Words Spoken by Every Character');
+        l.height = CAST_HEIGHT;
+        l.font.size = 14;
+        l.xaxis = {title: {text: 'Episode'}, showgrid: false};
+        l.yaxis = {autorange: 'reversed', showgrid: false};
+        return [[trace], l];
+    }
+
+    function showExchanges(episode) {
+        const pair = bundle.exchanges[Number(characterB.value)];
+        const url = urls[episode - 1];
+        exchanges.replaceChildren();
+        const header = document.createElement('p');
+        const link = document.createElement('a');
+        link.href = url;
+        link.target = '_blank';
+        link.textContent = `Open the transcript of MAG${String(episode).padStart(3, '0')}`;
+        header.appendChild(link);
+        exchanges.appendChild(header);
+        (pair[episode] || []).forEach(([scene, start, end, count]) => {
+            const title = document.createElement('div');
+            title.textContent = `Scene ${scene + 1}, lines ${start + 1} to ${end + 1} `
+                + `(${count} interactions)`;
+            exchanges.appendChild(title);
+        });
+    }
+
+    function drillDown() {
+        return bundle.exchanges && chartType.value !== 'cast' && characterB.value !== '';
+    }
+
+    function render() {
+        const cast = chartType.value === 'cast';
+        const square = chartType.value !== 'bar';
+        characterA.disabled = cast;
+        characterB.disabled = cast;
+        castOrder.disabled = !cast;
+        hint.textContent = `Clicking on the episode ${square ? 'square' : 'bar'} `
+            + (drillDown()
+                ? 'will show the exchanges between the pair in that episode.'
+                : 'will open a link to its transcript.');
+        exchanges.replaceChildren();
+        let chart;
+        if (cast) {
+            chart = castMap();
+        } else if (chartType.value === 'heatmap') {
+            chart = heatMap(selection());
+        } else {
+            chart = barChart(selection());
+        }
+        Plotly.react('chart', ...chart);
+    }
+
+    bundle.characters.forEach((name, i) => characterA.appendChild(option(i, name)));
+    fillCharacterB();
+    characterA.addEventListener('change', () => {
+        fillCharacterB();
+        render();
+    });
+    characterB.addEventListener('change', render);
+    chartType.addEventListener('change', render);
+    castOrder.addEventListener('change', render);
+    render();
+    document.getElementById('chart').on('plotly_click', function (data) {
+        const point = data.points[0];
+        if (!point || !point.customdata) {
+            return;
+        }
+        if (drillDown()) {
+            showExchanges(urls.indexOf(point.customdata) + 1);
+        } else {
+            window.open(point.customdata);
+        }
+    });
+})();
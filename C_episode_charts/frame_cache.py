@@ -0,0 +1,205 @@
+"""
+On-disk cache of rendered cumulative network chart frames.
+
+Each frame is saved as a .png named after the episode and a hash of
+everything that affects how it looks: the chart config shared by every frame
+(DPI, figure size, size scaling, font), and the nodes and edges the frame
+draws, with their cumulative sizes and weights and the positions of those
+nodes. Rendering an animation only draws the frames whose hash is not
+already in the cache, so a character who qualifies or is placed later only
+invalidates the frames they appear in.
+"""
+import glob
+import hashlib
+import json
+import os
+
+from utils import create_logger, get_config
+from C_episode_charts.network_renderer import figure_to_png
+
+CONFIG = get_config()
+DPI = CONFIG['CHART_DPI']
+FRAME_CACHE_DIRECTORY = CONFIG['FRAME_CACHE_DIRECTORY']
+FRAME_CACHE_VERSION = 2
+
+
+class FrameCache:
+    """
+    A class used to represent the cache of cumulative network chart frames.
+
+    Attributes
+    ---
+    chart: TMANetworkChart
+        Chart used to render missing frames
+    nodes_incl: list
+        Nodes to include in the chart
+    edges_incl: list
+        Edges to include in the chart
+    directory: str
+        Directory in which frames are saved
+    figsize: (float, float)
+        Width, height of each frame in inches
+    dpi: float
+        The resolution of each frame in dots-per-inch
+    positions: dict
+        Dictionary where key is a character and value is their [x, y]
+        position
+    logger: a logging.Logger object
+    """
+
+    def __init__(
+        self,
+        chart,
+        nodes_incl,
+        edges_incl,
+        directory=FRAME_CACHE_DIRECTORY,
+        figsize=(10, 10),
+        dpi=DPI,
+        logging_level='INFO',
+    ):
+        """
+        :param chart: Chart used to render missing frames
+        :type chart: TMANetworkChart
+        :param nodes_incl: Nodes to include in the chart
+        :type nodes_incl: list
+        :param edges_incl: Edges to include in the chart
+        :type edges_incl: list
+        :param directory: Directory in which frames are saved
+        :type directory: str
+        :param figsize: Width, height of each frame in inches
+        :type figsize: (float, float)
+        :param dpi: The resolution of each frame in dots-per-inch
+        :type dpi: float
+        :param logging_level: A standard Python logging level
+            (DEBUG, INFO, WARNING, ERROR, CRITICAL)
+        :type logging_level: str
+        """
+        self.chart = chart
+        self.nodes_incl = nodes_incl
+        self.edges_incl = edges_incl
+        self.directory = directory
+        self.figsize = figsize
+        self.dpi = dpi
+        self.logger = create_logger('frame_cache', logging_level=logging_level)
+        # Places every included node that does not have a position yet
+        cumulative = self.chart.episode_dict_dict['cumulative']
+        self.positions = self.chart.positions_for(
+            self.chart.build_graph(
+                'cumulative', max(cumulative), nodes_incl, edges_incl
+            ),
+            nodes_incl,
+            edges_incl,
+        )
+        self._config_hash = self.hash_config()
+
+    def hash_config(self):
+        """
+        Hashes the parts of the frame key shared by every episode
+        :return: Hex digest
+        :rtype: str
+        """
+        config = {
+            'version': FRAME_CACHE_VERSION,
+            'dpi': self.dpi,
+            'figsize': list(self.figsize),
+            'scaling': self.chart.SIZE_SCALING['cumulative'],
+            'font': self.chart.FONT_SERIF,
+        }
+        return hashlib.sha256(
+            json.dumps(config, sort_keys=True).encode()
+        ).hexdigest()
+
+    def frame_key(self, episode_number):
+        """
+        :param episode_number: episode number
+        :type episode_number: int
+        :return: Hash of the chart config and the nodes and edges the frame
+            draws (cumulative data and node positions)
+        :rtype: str
+        """
+        episode = self.chart.episode_dict_dict['cumulative'][episode_number]
+        nodes = sorted(
+            [n, v['size']]
+            for n, v in episode['nodes_dict'].items()
+            if n in self.nodes_incl
+        )
+        edges = sorted(
+            [*e, v['weight']]
+            for e, v in episode['edges_dict'].items()
+            if e in self.edges_incl
+        )
+        drawn = {n for n, _ in nodes} | {n for e in edges for n in e[:2]}
+        data = {
+            'nodes': nodes,
+            'edges': edges,
+            'positions': {n: self.positions[n] for n in sorted(drawn)},
+        }
+        digest = hashlib.sha256(self._config_hash.encode())
+        digest.update(json.dumps([episode_number, data]).encode())
+        return digest.hexdigest()[:16]
+
+    def frame_path(self, episode_number):
+        """
+        :param episode_number: episode number
+        :type episode_number: int
+        :return: Location of the cached frame for the episode
+        :rtype: str
+        """
+        key = self.frame_key(episode_number)
+        return f'{self.directory}/MAG{episode_number:03}_{key}.png'
+
+    def render_frame(self, episode_number, save_location):
+        """
+        Renders a cumulative network chart and saves it as a frame, removing
+        frames for the same episode that were rendered with another key. The
+        frame is written to a temporary file and moved into place, so a
+        render that is interrupted never leaves a truncated frame behind
+        :param episode_number: episode number
+        :type episode_number: int
+        :param save_location: Location of the frame
+        :type save_location: str
+        :return: None
+        :rtype: None
+        """
+        fig, ax = self.chart.set_up_individual_plot(
+            figsize=self.figsize, dpi=self.dpi
+        )
+        self.chart.generate_network_chart(
+            'cumulative', episode_number, ax, self.nodes_incl, self.edges_incl
+        )
+        temporary = f'{save_location}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as f:
+            f.write(figure_to_png(fig))
+        os.replace(temporary, save_location)
+        for stale in glob.glob(
+            f'{self.directory}/MAG{episode_number:03}_*.png'
+        ):
+            if stale != save_location:
+                os.remove(stale)
+        return None
+
+    def __call__(self, start_episode, end_episode):
+        """
+        Returns the frames for a range of episodes, rendering only those that
+        are not already cached
+        :param start_episode: First episode
+        :type start_episode: int
+        :param end_episode: Last episode
+        :type end_episode: int
+        :return: Frame locations, in episode order
+        :rtype: list
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        frame_paths = []
+        rendered = 0
+        for e in range(start_episode, end_episode + 1):
+            save_location = self.frame_path(e)
+            if not os.path.exists(save_location):
+                self.render_frame(e, save_location)
+                rendered += 1
+            frame_paths.append(save_location)
+        self.logger.info(
+            f'Rendered {rendered} of {len(frame_paths)} frames '
+            f'({len(frame_paths) - rendered} cached)'
+        )
+        return frame_paths
@@ -1,19 +1,23 @@
 import argparse
 import os
 import sys
-
-import matplotlib.pyplot as plt
-import networkx as nx
+import tempfile
+import webbrowser
 
 p = os.path.abspath('.')
 sys.path.insert(1, p)
 
-from utils import create_logger, load_config
+from utils import create_logger, get_config, lazy_import
 from B_episode_dicts.save_and_load_dict import open_dict_as_pkl
 from C_episode_charts.retrieve_en import retrieve_included_edges_and_nodes
+from C_episode_charts.layout_engine import LayoutEngine
+
+matplotlib = lazy_import('matplotlib')
+mpl_figure = lazy_import('matplotlib.figure')
+mpl_backend_agg = lazy_import('matplotlib.backends.backend_agg')
+nx = lazy_import('networkx')
 
-CONFIG = load_config()
-FIXED_POSITIONS = CONFIG['CHART_FIXED_POSITIONS']
+CONFIG = get_config()
 DPI = CONFIG['CHART_DPI']
 MAX_EPISODE = CONFIG['MAX_EPISODE']
 DICT_DIRECTORY = CONFIG['DICT_DIRECTORY']
@@ -28,10 +32,24 @@ class TMANetworkChart:
     episode_dict_dict: dict
         Nested dictionary containing both the individual and cumulative
         episode dicts
+    layout_engine: LayoutEngine
+        Provides node positions, placing characters without a fixed position
     logger: a logging.Logger object
     """
 
-    def __init__(self, directory=DICT_DIRECTORY, logging_level='INFO'):
+    SIZE_SCALING = {
+        'individual': {'node': 20, 'edge': 50},
+        'cumulative': {'node': 40, 'edge': 100},
+    }
+    FONT_SERIF = ['Baskerville']
+
+    def __init__(
+        self,
+        directory=DICT_DIRECTORY,
+        logging_level='INFO',
+        episode_dict_dict=None,
+        layout_engine=None,
+    ):
         """
         :param directory: Directory from which to retrieve the individual
             and cumulative episode dicts
@@ -39,19 +57,49 @@ class TMANetworkChart:
         :param logging_level: A standard Python logging level
             (DEBUG, INFO, WARNING, ERROR, CRITICAL)
         :type logging_level: str
+        :param episode_dict_dict: Dictionary containing the individual and
+            cumulative episode dicts. If provided, nothing is loaded from the
+            directory
+        :type episode_dict_dict: dict
+        :param layout_engine: Provides the node positions. If not provided,
+            one is created from the LAYOUT and CHART_FIXED_POSITIONS config
+        :type layout_engine: LayoutEngine
         """
-        individual_episode_dict = open_dict_as_pkl(
-            'individual', directory=directory
-        )
-        cumulative_episode_dict = open_dict_as_pkl(
-            'cumulative', directory=directory
-        )
-        self.episode_dict_dict = {
-            'individual': individual_episode_dict,
-            'cumulative': cumulative_episode_dict,
-        }
+        if episode_dict_dict is None:
+            episode_dict_dict = {
+                'individual': open_dict_as_pkl(
+                    'individual', directory=directory
+                ),
+                'cumulative': open_dict_as_pkl(
+                    'cumulative', directory=directory
+                ),
+            }
+        self.episode_dict_dict = episode_dict_dict
+        if layout_engine is None:
+            layout_engine = LayoutEngine(logging_level=logging_level)
+        self.layout_engine = layout_engine
         self.logger = create_logger('TMA_chart', logging_level=logging_level)
 
+    @staticmethod
+    def new_figure(figsize, dpi):
+        """
+        Creates a figure with its own Agg canvas. It is not registered with
+        pyplot, so it shares no global state with other figures and is freed
+        once it is no longer referenced (see network_renderer.release_figure).
+        Also sets the serif font to FONT_SERIF, so charts drawn in any process
+        use the same font
+        :param figsize: Width, height in inches.
+        :type figsize: (float, float)
+        :param dpi: The resolution of the figure in dots-per-inch
+        :type dpi: float
+        :return: matplotlib.figure.Figure object
+        :rtype: matplotlib.figure.Figure object
+        """
+        matplotlib.rcParams['font.serif'] = TMANetworkChart.FONT_SERIF
+        fig = mpl_figure.Figure(figsize=figsize, dpi=dpi, facecolor='#0E1117')
+        mpl_backend_agg.FigureCanvasAgg(fig)
+        return fig
+
     @staticmethod
     def set_up_individual_plot(figsize=(10, 10), dpi=DPI):
         """
@@ -64,7 +112,8 @@ class TMANetworkChart:
         :return: matplotlib.figure.Figure object, matplotlib.axes.Axes object
         :rtype: matplotlib.figure.Figure object, matplotlib.axes.Axes object
         """
-        fig, ax = plt.subplots(figsize=figsize, dpi=dpi, facecolor='#0E1117')
+        fig = TMANetworkChart.new_figure(figsize, dpi)
+        ax = fig.subplots()
         ax.set_facecolor('black')
         ax.set_xlim([-1.2, 1.1])
         ax.set_ylim([-1.1, 1.2])
@@ -83,15 +132,8 @@ class TMANetworkChart:
         :return: matplotlib.figure.Figure object, matplotlib.axes.Axes array
         :rtype: matplotlib.figure.Figure object, matplotlib.axes.Axes array
         """
-        fig, (ax1, ax2) = plt.subplots(
-            1,
-            2,
-            sharex=True,
-            sharey=True,
-            figsize=figsize,
-            dpi=dpi,
-            facecolor='#0E1117',
-        )
+        fig = TMANetworkChart.new_figure(figsize, dpi)
+        ax1, ax2 = fig.subplots(1, 2, sharex=True, sharey=True)
         for axi in [ax1, ax2]:
             axi.set_facecolor('black')
             axi.set_xlim([-1.2, 1.1])
@@ -99,6 +141,56 @@ class TMANetworkChart:
         fig.tight_layout(pad=0.75)
         return fig, ax1, ax2
 
+    def build_graph(
+        self, episode_dict_type, episode_number, nodes_incl, edges_incl
+    ):
+        """
+        Builds the network of included nodes and edges for an episode
+        :param episode_dict_type: 'individual' or 'cumulative'
+        :type episode_dict_type: str
+        :param episode_number: episode number
+        :type episode_number: int
+        :param nodes_incl: Nodes to include in the chart
+        :type nodes_incl: list
+        :param edges_incl: Edges to include in the chart
+        :type edges_incl: list
+        :return: Network with node attribute "size" and edge attribute
+            "weight"
+        :rtype: networkx.Graph
+        """
+        assert episode_dict_type in ('individual', 'cumulative')
+        episode_dict = self.episode_dict_dict[episode_dict_type]
+        nd = episode_dict[episode_number]['nodes_dict']
+        ed = episode_dict[episode_number]['edges_dict']
+        nodes = [(k, v) for k, v in nd.items() if k in nodes_incl]
+        edges = [(*k, v) for k, v in ed.items() if k in edges_incl]
+        g = nx.Graph()
+        g.add_nodes_from(nodes)
+        g.add_edges_from(edges)
+        return g
+
+    def positions_for(self, g, nodes_incl, edges_incl):
+        """
+        Returns node positions for a network. Characters without a position
+        are placed once, against the final cumulative network, so their
+        position does not depend on which episode happens to be drawn first
+        :param g: Network to be drawn
+        :type g: networkx.Graph
+        :param nodes_incl: Nodes to include in the chart
+        :type nodes_incl: list
+        :param edges_incl: Edges to include in the chart
+        :type edges_incl: list
+        :return: Dictionary where key is a character and value is their
+            [x, y] position
+        :rtype: dict
+        """
+        if self.layout_engine.missing_nodes(g):
+            cumulative = self.episode_dict_dict['cumulative']
+            g = self.build_graph(
+                'cumulative', max(cumulative), nodes_incl, edges_incl
+            )
+        return self.layout_engine.positions_for(g)
+
     def generate_network_chart(
         self,
         episode_dict_type,
@@ -126,28 +218,21 @@ class TMANetworkChart:
         :return: None
         :rtype: None
         """
-        assert episode_dict_type in ('individual', 'cumulative')
-        episode_dict = self.episode_dict_dict[episode_dict_type]
-        nd = episode_dict[episode_number]['nodes_dict']
-        ed = episode_dict[episode_number]['edges_dict']
-        nodes = [(k, v) for k, v in nd.items() if k in nodes_incl]
-        edges = [(*k, v) for k, v in ed.items() if k in edges_incl]
-        g = nx.Graph()
-        g.add_nodes_from(nodes)
-        g.add_edges_from(edges)
-        pos = FIXED_POSITIONS
+        g = self.build_graph(
+            episode_dict_type, episode_number, nodes_incl, edges_incl
+        )
+        pos = self.positions_for(g, nodes_incl, edges_incl)
         font = {
             'color': 'white',
             'fontsize': 18,
             'family': 'serif',
             'fontweight': 'bold',
         }
-        if episode_dict_type == 'cumulative':
-            node_size = [s[1]['size'] / 40 for s in g.nodes.data()]
-            edge_weights = [g[u][v]['weight'] / 100 for u, v in g.edges]
-        else:
-            node_size = [s[1]['size'] / 20 for s in g.nodes.data()]
-            edge_weights = [g[u][v]['weight'] / 50 for u, v in g.edges]
+        scaling = self.SIZE_SCALING[episode_dict_type]
+        node_size = [s[1]['size'] / scaling['node'] for s in g.nodes.data()]
+        edge_weights = [
+            g[u][v]['weight'] / scaling['edge'] for u, v in g.edges
+        ]
         nx.draw_networkx_nodes(
             g,
             pos,
@@ -177,13 +262,12 @@ class TMANetworkChart:
         )
         if save:
             save_location = f'MAG{episode_number:03}_{episode_dict_type}.png'
-            plt.savefig(save_location, dpi=DPI)
+            ax.figure.savefig(save_location, dpi=DPI)
             self.logger.info(f'Saved chart to {save_location}')
         return None
 
 
 if __name__ == '__main__':
-    plt.rcParams['font.serif'] = ['Baskerville']
     parser = argparse.ArgumentParser()
     parser.add_argument(
         '--episode',
@@ -210,4 +294,7 @@ if __name__ == '__main__':
     chart.generate_network_chart(
         'cumulative', args.episode, ax2, nodes_included, edges_included
     )
-    plt.show()
+    with tempfile.NamedTemporaryFile('wb', delete=False, suffix='.png') as f:
+        url = 'file://' + f.name
+        fig.savefig(f, format='png')
+    webbrowser.open(url)
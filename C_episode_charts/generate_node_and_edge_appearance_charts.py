@@ -5,19 +5,25 @@ import re
 import webbrowser
 import tempfile
 
-import numpy as np
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.offline import plot
-
 p = os.path.abspath('.')
 sys.path.insert(1, p)
 
-from utils import load_config
+from utils import get_config, lazy_import
 from B_episode_dicts.save_and_load_dict import open_dict_as_pkl
+from B_episode_dicts.appearance_matrices import (
+    CAST_ORDERS,
+    cast_orders,
+    open_appearance_matrices,
+)
+from C_episode_charts.retrieve_en import retrieve_included_edges_and_nodes
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+px = lazy_import('plotly.express')
+go = lazy_import('plotly.graph_objects')
+plotly_offline = lazy_import('plotly.offline')
 
-CONFIG = load_config()
+CONFIG = get_config()
 MAX_EPISODE = CONFIG['MAX_EPISODE']
 DICT_DIRECTORY = CONFIG['DICT_DIRECTORY']
 CHART_BY_CHARACTER_DIMENSIONS = CONFIG['CHART_BY_CHARACTER_DIMENSIONS']
@@ -192,6 +198,105 @@ def generate_bar_chart(
     return html_str
 
 
+def generate_cast_heat_map(
+    end_episode, matrices, characters, sort_by='first_appearance'
+):
+    """
+    Generates a HTML string representing a single heatmap of the words spoken
+    by every character in every episode, one row per character, from the word
+    matrix of the appearance matrices
+    :param end_episode: Last episode to include in chart
+    :type end_episode: int
+    :param matrices: Output of build_appearance_matrices
+    :type matrices: dict
+    :param characters: Characters to include in the chart
+    :type characters: list
+    :param sort_by: 'first_appearance' or 'total_words' (see cast_orders)
+    :type sort_by: str
+    :return: HTML string representing a plotly.graph_objects.Figure with the
+        heatmap plotted on it
+    :rtype: str
+    """
+    ids = {name: i for i, name in enumerate(matrices['characters'])}
+    words = matrices['words'][[ids[c] for c in characters], :end_episode]
+    rows = cast_orders(words)[sort_by]
+    episodes = list(range(1, end_episode + 1))
+    urls = [
+        f'https://snarp.github.io/magnus_archives_transcripts/episode/'
+        + f'{a:03}.html'
+        for a in episodes
+    ]
+    fig = go.Figure(
+        go.Heatmap(
+            z=words[rows],
+            x=episodes,
+            y=[characters[i] for i in rows],
+            customdata=[urls] * len(rows),
+            colorscale=[[0, 'black'], [1, '#23cf77']],
+            zmin=0,
+            showscale=False,
+            xgap=1,
+            ygap=1,
+            hoverlabel_bgcolor='black',
+            hovertemplate='MAG%{x:03}<br>%{y}<br>Words Spoken: %{z:.3s} '
+            + '<extra></extra>',
+        )
+    )
+    fig.update_layout(
+        title='Words Spoken by Every Character',
+        height=CHART_BY_CHARACTER_DIMENSIONS['CAST_HEIGHT'],
+        width=CHART_BY_CHARACTER_DIMENSIONS['WIDTH'],
+    )
+    update_fig_layout(fig)
+    fig.update_layout(font_size=14)
+    fig.update_xaxes(title='Episode', showgrid=False)
+    fig.update_yaxes(autorange='reversed', showgrid=False)
+    html_str = fig_to_html(fig)
+
+    return html_str
+
+
+def generate_closeness_matrix(closeness_matrix, start_episode, end_episode):
+    """
+    Generates a heatmap of the closeness between every pair of characters
+    over a range of episodes
+    :param closeness_matrix: Running closeness of every pair of characters
+    :type closeness_matrix: ClosenessMatrix
+    :param start_episode: First episode of the range
+    :type start_episode: int
+    :param end_episode: Last episode of the range
+    :type end_episode: int
+    :return: plotly.graph_objects.Figure with the heatmap plotted on it
+    :rtype: plotly.graph_objects.Figure
+    """
+    characters = closeness_matrix.characters
+    fig = go.Figure(
+        go.Heatmap(
+            z=closeness_matrix.between(start_episode, end_episode),
+            x=characters,
+            y=characters,
+            colorscale=[[0, 'black'], [1, '#23cf77']],
+            zmin=0,
+            showscale=False,
+            xgap=1,
+            ygap=1,
+            hoverlabel_bgcolor='black',
+            hovertemplate='%{x} & %{y}<br>Interaction Score: %{z:.0f} '
+            + '<extra></extra>',
+        )
+    )
+    fig.update_layout(
+        title=f'Interactions Between Every Pair, MAG{start_episode:03} to '
+        + f'MAG{end_episode:03}',
+        height=CHART_BY_CHARACTER_DIMENSIONS['CAST_HEIGHT'],
+    )
+    update_fig_layout(fig)
+    fig.update_layout(font_size=14)
+    fig.update_xaxes(showgrid=False, tickangle=-45)
+    fig.update_yaxes(autorange='reversed', showgrid=False)
+    return fig
+
+
 def fig_to_html(fig):
     """
     Converts a figure to an HTML string with functionality that opens a url.
@@ -203,7 +308,9 @@ def fig_to_html(fig):
     :rtype: str
     """
     fig = go.Figure(data=fig.data, layout=fig.layout)
-    plot_div = plot(fig, output_type='div', include_plotlyjs=True)
+    plot_div = plotly_offline.plot(
+        fig, output_type='div', include_plotlyjs=True
+    )
 
     # Get id of html div element that looks like
     # <div id="301d22ab-bfba-4621-8f5d-dc4fd855bb33" ... >
@@ -325,25 +432,41 @@ if __name__ == '__main__':
         '--chart_type',
         '-C',
         type=str,
-        choices=['heatmap', 'bar'],
+        choices=['heatmap', 'bar', 'cast'],
         default='bar',
     )
+    parser.add_argument(
+        '--sort_by',
+        type=str,
+        choices=CAST_ORDERS,
+        default=CAST_ORDERS[0],
+        help='Order of the characters in the cast chart',
+    )
     parser.add_argument('--save_dir', '-D', type=str, default=DICT_DIRECTORY)
     args = parser.parse_args()
-    if args.character_b:
-        ad = open_dict_as_pkl('ea', directory=args.save_dir)
-    else:
-        ad = open_dict_as_pkl('na', directory=args.save_dir)
-    if args.chart_type == 'bar':
-        func = generate_bar_chart
+    if args.chart_type == 'cast':
+        nodes_included, _ = retrieve_included_edges_and_nodes(args.save_dir)
+        html = generate_cast_heat_map(
+            args.end_episode,
+            open_appearance_matrices(args.save_dir),
+            nodes_included,
+            args.sort_by,
+        )
     else:
-        func = generate_heat_map
-    html = func(
-        args.end_episode,
-        ad,
-        args.character_a,
-        args.character_b,
-    )
+        if args.character_b:
+            ad = open_dict_as_pkl('ea', directory=args.save_dir)
+        else:
+            ad = open_dict_as_pkl('na', directory=args.save_dir)
+        if args.chart_type == 'bar':
+            func = generate_bar_chart
+        else:
+            func = generate_heat_map
+        html = func(
+            args.end_episode,
+            ad,
+            args.character_a,
+            args.character_b,
+        )
     with tempfile.NamedTemporaryFile('w', delete=False, suffix='.html') as f:
         url = 'file://' + f.name
         f.write(html)
@@ -0,0 +1,164 @@
+"""
+Positions for network chart nodes that are not in CHART_FIXED_POSITIONS.
+
+Known positions (the fixed ones from config.yaml plus any computed earlier)
+are pinned. Only new nodes are placed, by a force-directed pass that starts
+each new node at the mean position of its placed neighbors. The
+result is saved to LAYOUT: LOCATION so later charts and animation frames
+reuse the same positions instead of re-running the layout.
+"""
+import json
+import os
+import random
+import threading
+
+from utils import create_logger, get_config, lazy_import
+
+nx = lazy_import('networkx')
+
+CONFIG = get_config()
+FIXED_POSITIONS = CONFIG['CHART_FIXED_POSITIONS']
+LAYOUT = CONFIG['LAYOUT']
+
+
+class LayoutEngine:
+    """
+    A class used to represent the node positions of the network charts.
+
+    Attributes
+    ---
+    positions: dict
+        Dictionary where key is a character and value is their [x, y]
+        position
+    location: str
+        Location of the .json file in which computed positions are saved
+    iterations: int
+        Number of force-directed iterations used to place new nodes
+    seed: int
+        Seed for the initial jitter and the force-directed pass
+    lock: threading.Lock
+        Serializes placing and saving new nodes when charts are rendered on
+        several threads
+    logger: a logging.Logger object
+    """
+
+    def __init__(
+        self,
+        location=LAYOUT['LOCATION'],
+        fixed_positions=FIXED_POSITIONS,
+        iterations=LAYOUT['ITERATIONS'],
+        seed=LAYOUT['SEED'],
+        logging_level='INFO',
+    ):
+        """
+        :param location: Location of the .json file in which computed
+            positions are saved
+        :type location: str
+        :param fixed_positions: Dictionary where key is a character and value
+            is their fixed [x, y] position. These take precedence over saved
+            positions
+        :type fixed_positions: dict
+        :param iterations: Number of force-directed iterations used to place
+            new nodes
+        :type iterations: int
+        :param seed: Seed for the initial jitter and the force-directed pass
+        :type seed: int
+        :param logging_level: A standard Python logging level
+            (DEBUG, INFO, WARNING, ERROR, CRITICAL)
+        :type logging_level: str
+        """
+        self.location = location
+        self.iterations = iterations
+        self.seed = seed
+        self.lock = threading.Lock()
+        self.logger = create_logger('layout', logging_level=logging_level)
+        self.positions = {}
+        if location and os.path.exists(location):
+            with open(location, 'r') as f:
+                self.positions.update(json.load(f))
+        self.positions.update(
+            {n: list(xy) for n, xy in fixed_positions.items()}
+        )
+
+    def missing_nodes(self, graph):
+        """
+        :param graph: Network to be drawn
+        :type graph: networkx.Graph
+        :return: Nodes in the graph that do not have a position yet
+        :rtype: list
+        """
+        return [n for n in graph if n not in self.positions]
+
+    def positions_for(self, graph):
+        """
+        Returns positions for every node in the graph, placing (and saving)
+        any that are new
+        :param graph: Network to be drawn
+        :type graph: networkx.Graph
+        :return: Dictionary where key is a character and value is their
+            [x, y] position
+        :rtype: dict
+        """
+        if self.missing_nodes(graph):
+            with self.lock:
+                new_nodes = self.missing_nodes(graph)
+                if new_nodes:
+                    self.place_nodes(graph, new_nodes)
+                    self.save()
+        return self.positions
+
+    def place_nodes(self, graph, new_nodes):
+        """
+        Places new nodes with a force-directed pass in which every node that
+        already has a position is pinned
+        :param graph: Network containing the new nodes
+        :type graph: networkx.Graph
+        :param new_nodes: Nodes to place
+        :type new_nodes: list
+        :return: None
+        :rtype: None
+        """
+        rng = random.Random(self.seed)
+        initial = {n: self.positions[n] for n in graph if n in self.positions}
+        for node in new_nodes:
+            placed = [initial[v] for v in graph[node] if v in initial]
+            if placed:
+                x = sum(xy[0] for xy in placed) / len(placed)
+                y = sum(xy[1] for xy in placed) / len(placed)
+            else:
+                x, y = rng.uniform(-1, 1), rng.uniform(-1, 1)
+            initial[node] = [x + rng.gauss(0, 0.05), y + rng.gauss(0, 0.05)]
+        pinned = [n for n in graph if n in self.positions]
+        # Closeness scores span several orders of magnitude, so both the
+        # starting point and the layout use the topology only; raw weights
+        # pull every new node onto the most talkative character
+        layout = nx.spring_layout(
+            graph,
+            pos=initial,
+            fixed=pinned or None,
+            iterations=self.iterations,
+            weight=None,
+            seed=self.seed,
+        )
+        for node in new_nodes:
+            self.positions[node] = [
+                min(max(float(c), -1.0), 1.0) for c in layout[node]
+            ]
+        self.logger.info(f'Placed {len(new_nodes)} new nodes: {new_nodes}')
+        return None
+
+    def save(self):
+        """
+        Saves all positions to the layout location. The file is written
+        under a temporary name and moved into place, so other processes never
+        read a partly written layout
+        :return: None
+        :rtype: None
+        """
+        if self.location:
+            temporary = f'{self.location}.{os.getpid()}.tmp'
+            with open(temporary, 'w') as f:
+                json.dump(self.positions, f, indent=4, sort_keys=True)
+            os.replace(temporary, self.location)
+            self.logger.info(f'Saved node positions to {self.location}')
+        return None
@@ -0,0 +1,376 @@
+"""
+Renders network charts to PNG bytes without going through pyplot.
+
+Each chart is drawn on its own matplotlib.figure.Figure with an Agg canvas
+(see TMANetworkChart.new_figure), encoded, and released straight away, so
+nothing is left behind between reruns and concurrent app sessions do not
+contend for pyplot's global state. Rendering runs on a shared thread pool
+of RENDERING: THREADS workers.
+
+ChartPrefetcher renders the charts of the episodes around the one being
+viewed in the background, on a separate pool of RENDERING: PREFETCH_THREADS
+workers so the chart being waited on never queues behind a prefetch.
+Stepping to a neighbouring episode is then served from its cache instead of
+waiting for two fresh renders. Given a RenderClient, it asks a running render
+server (see render_server.py) for the charts instead of drawing them itself.
+The socket is probed for every new render, so a server started after the app
+is picked up, and charts are drawn locally while no server is listening or
+when a request to it fails.
+"""
+import io
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import get_config, lazy_import
+
+render_server = lazy_import('C_episode_charts.render_server')
+
+CONFIG = get_config()
+MAX_EPISODE = CONFIG['MAX_EPISODE']
+RENDERING = CONFIG['RENDERING']
+RENDER_POOL = ThreadPoolExecutor(
+    max_workers=RENDERING['THREADS'], thread_name_prefix='network_renderer'
+)
+PREFETCH_POOL = ThreadPoolExecutor(
+    max_workers=RENDERING['PREFETCH_THREADS'],
+    thread_name_prefix='network_prefetcher',
+)
+
+
+def release_figure(fig):
+    """
+    Drops every artist of a figure and its reference to its canvas so its
+    memory is freed without waiting for the garbage collector to break the
+    figure/canvas reference cycle
+    :param fig: Figure that is no longer needed
+    :type fig: matplotlib.figure.Figure object
+    :return: None
+    :rtype: None
+    """
+    fig.clear()
+    fig.canvas.figure = None
+    return None
+
+
+def figure_to_png(fig, **savefig_kwargs):
+    """
+    Encodes a figure as a PNG and releases it
+    :param fig: Figure with data already plotted on it
+    :type fig: matplotlib.figure.Figure object
+    :param savefig_kwargs: Keyword arguments for Figure.savefig
+    :type savefig_kwargs: dict
+    :return: PNG image
+    :rtype: bytes
+    """
+    buffer = io.BytesIO()
+    try:
+        fig.savefig(
+            buffer,
+            format='png',
+            facecolor=fig.get_facecolor(),
+            **savefig_kwargs,
+        )
+    finally:
+        release_figure(fig)
+    return buffer.getvalue()
+
+
+def render_dual_network_chart(
+    chart, episode_number, nodes_incl, edges_incl, **figure_kwargs
+):
+    """
+    Renders the side-by-side individual and cumulative network charts for
+    an episode
+    :param chart: Chart used to draw the networks
+    :type chart: TMANetworkChart
+    :param episode_number: episode number
+    :type episode_number: int
+    :param nodes_incl: Nodes to include in the chart
+    :type nodes_incl: list
+    :param edges_incl: Edges to include in the chart
+    :type edges_incl: list
+    :param figure_kwargs: figsize and/or dpi for the figure
+    :type figure_kwargs: dict
+    :return: PNG image
+    :rtype: bytes
+    """
+    fig, ax1, ax2 = chart.set_up_dual_plot(**figure_kwargs)
+    chart.generate_network_chart(
+        'individual', episode_number, ax1, nodes_incl, edges_incl
+    )
+    chart.generate_network_chart(
+        'cumulative', episode_number, ax2, nodes_incl, edges_incl
+    )
+    return figure_to_png(fig, bbox_inches='tight')
+
+
+def render_network_chart(
+    chart, dict_type, episode_number, nodes_incl, edges_incl, **figure_kwargs
+):
+    """
+    Renders the network chart of an episode
+    :param chart: Chart used to draw the networks
+    :type chart: TMANetworkChart
+    :param dict_type: 'individual', 'cumulative', or 'dual' (both side by
+        side)
+    :type dict_type: str
+    :param episode_number: episode number
+    :type episode_number: int
+    :param nodes_incl: Nodes to include in the chart
+    :type nodes_incl: list
+    :param edges_incl: Edges to include in the chart
+    :type edges_incl: list
+    :param figure_kwargs: figsize and/or dpi for the figure
+    :type figure_kwargs: dict
+    :return: PNG image
+    :rtype: bytes
+    """
+    if dict_type == 'dual':
+        return render_dual_network_chart(
+            chart, episode_number, nodes_incl, edges_incl, **figure_kwargs
+        )
+    fig, ax = chart.set_up_individual_plot(**figure_kwargs)
+    chart.generate_network_chart(
+        dict_type, episode_number, ax, nodes_incl, edges_incl
+    )
+    return figure_to_png(fig)
+
+
+def submit_dual_network_chart(
+    chart, episode_number, nodes_incl, edges_incl, pool=RENDER_POOL
+):
+    """
+    Queues render_dual_network_chart on a thread pool
+    :param chart: Chart used to draw the networks
+    :type chart: TMANetworkChart
+    :param episode_number: episode number
+    :type episode_number: int
+    :param nodes_incl: Nodes to include in the chart
+    :type nodes_incl: list
+    :param edges_incl: Edges to include in the chart
+    :type edges_incl: list
+    :param pool: Pool on which to render
+    :type pool: concurrent.futures.ThreadPoolExecutor
+    :return: Future whose result is the PNG image
+    :rtype: concurrent.futures.Future
+    """
+    return pool.submit(
+        render_dual_network_chart,
+        chart,
+        episode_number,
+        nodes_incl,
+        edges_incl,
+    )
+
+
+class ChartPrefetcher:
+    """
+    A class used to represent a bounded cache of dual network charts that is
+    filled ahead of the viewer.
+
+    Each call returns the chart of the requested episode (rendering it if it
+    is not cached) and queues the charts of the episodes within radius of it,
+    nearest first. Queued renders that are no longer within radius of the
+    requested episode (e.g. after jumping far away) are cancelled, and the
+    least recently requested charts are dropped once the cache is full.
+
+    Attributes
+    ---
+    chart: TMANetworkChart
+        Chart used to draw the networks
+    load_chart: function
+        Returns the chart used to draw the networks if chart is not set.
+        Only called when a chart is drawn locally
+    nodes_incl: list
+        Nodes to include in the chart
+    edges_incl: list
+        Edges to include in the chart
+    radius: int
+        Number of episodes on each side of the requested one to prefetch
+    cache_size: int
+        Maximum number of charts (rendered or queued) to hold
+    first_episode: int
+        First episode that can be requested
+    last_episode: int
+        Last episode that can be requested
+    render_client: RenderClient
+        If set, each chart is requested from the render server first and
+        drawn locally if the server is not listening
+    inclusion_index: InclusionIndex
+        If set, each chart only includes the nodes and edges that have
+        qualified by its episode instead of nodes_incl and edges_incl
+    futures: collections.OrderedDict
+        Dictionary where key is an episode number and value is the Future of
+        its PNG image, least recently requested first
+    lock: threading.Lock
+        Serializes calls that modify the cache
+    """
+
+    def __init__(
+        self,
+        chart,
+        nodes_incl,
+        edges_incl,
+        radius=RENDERING['PREFETCH_RADIUS'],
+        cache_size=RENDERING['PREFETCH_CACHE_SIZE'],
+        first_episode=1,
+        last_episode=MAX_EPISODE,
+        render_client=None,
+        inclusion_index=None,
+        load_chart=None,
+    ):
+        """
+        :param chart: Chart used to draw the networks. If None, load_chart
+            is called when a chart is drawn locally
+        :type chart: TMANetworkChart
+        :param nodes_incl: Nodes to include in the chart
+        :type nodes_incl: list
+        :param edges_incl: Edges to include in the chart
+        :type edges_incl: list
+        :param radius: Number of episodes on each side of the requested one
+            to prefetch
+        :type radius: int
+        :param cache_size: Maximum number of charts to hold. At least the
+            requested episode and its neighbours are always held
+        :type cache_size: int
+        :param first_episode: First episode that can be requested
+        :type first_episode: int
+        :param last_episode: Last episode that can be requested
+        :type last_episode: int
+        :param render_client: Client of a running render server (see
+            render_server.py), which renders the charts in its own warm
+            processes
+        :type render_client: RenderClient
+        :param inclusion_index: If provided, each chart only includes the
+            nodes and edges that have qualified by its episode
+        :type inclusion_index: InclusionIndex
+        :param load_chart: Function that returns the chart used to draw the
+            networks if chart is None (e.g. when the render server cannot be
+            reached)
+        :type load_chart: function
+        """
+        self.chart = chart
+        self.load_chart = load_chart
+        self.nodes_incl = nodes_incl
+        self.edges_incl = edges_incl
+        self.radius = radius
+        self.cache_size = max(cache_size, 2 * radius + 1)
+        self.first_episode = first_episode
+        self.last_episode = last_episode
+        self.render_client = render_client
+        self.inclusion_index = inclusion_index
+        self.futures = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __call__(self, episode_number):
+        """
+        :param episode_number: Episode being viewed
+        :type episode_number: int
+        :return: Future whose result is the PNG image of the episode's chart
+        :rtype: concurrent.futures.Future
+        """
+        with self.lock:
+            self.cancel_outside(episode_number)
+            future = self.submit(episode_number)
+            for d in range(1, self.radius + 1):
+                for e in (episode_number + d, episode_number - d):
+                    if self.first_episode <= e <= self.last_episode:
+                        self.submit(e, prefetch=True)
+            self.evict(episode_number)
+        return future
+
+    def submit(self, episode_number, prefetch=False):
+        """
+        Queues the chart of an episode if it is not already cached. A
+        requested chart that is still waiting in the prefetch queue is moved
+        to the render pool
+        :param episode_number: episode number
+        :type episode_number: int
+        :param prefetch: Whether the chart is being prefetched rather than
+            requested
+        :type prefetch: bool
+        :return: Future whose result is the PNG image
+        :rtype: concurrent.futures.Future
+        """
+        future = self.futures.get(episode_number)
+        if future is not None and not prefetch:
+            self.futures.move_to_end(episode_number)
+            if future.cancel():
+                future = None
+        if future is None or future.cancelled():
+            pool = PREFETCH_POOL if prefetch else RENDER_POOL
+            if self.render_client is not None:
+                future = pool.submit(self.render_remotely, episode_number)
+            else:
+                future = pool.submit(self.render_locally, episode_number)
+            self.futures[episode_number] = future
+        return future
+
+    def render_locally(self, episode_number):
+        """
+        :param episode_number: episode number
+        :type episode_number: int
+        :return: PNG image of the episode's chart, drawn in this process
+        :rtype: bytes
+        """
+        chart = self.chart if self.chart is not None else self.load_chart()
+        if self.inclusion_index is not None:
+            nodes_incl, edges_incl = self.inclusion_index.included_as_of(
+                episode_number
+            )
+        else:
+            nodes_incl, edges_incl = self.nodes_incl, self.edges_incl
+        return render_dual_network_chart(
+            chart, episode_number, nodes_incl, edges_incl
+        )
+
+    def render_remotely(self, episode_number):
+        """
+        Requests the chart from the render server, drawing it locally if the
+        server is not listening, has stopped, or could not render it. This
+        runs in the render pool, so a server that is down costs a failed
+        connect there rather than a probe in submit
+        :param episode_number: episode number
+        :type episode_number: int
+        :return: PNG image of the episode's chart
+        :rtype: bytes
+        """
+        try:
+            return self.render_client.render(
+                'dual',
+                episode_number,
+                time_aware=self.inclusion_index is not None,
+            )
+        except (OSError, render_server.RenderServerError):
+            return self.render_locally(episode_number)
+
+    def cancel_outside(self, episode_number):
+        """
+        Cancels the queued renders of episodes farther than radius from the
+        requested one. Renders that have already started run to completion
+        :param episode_number: Episode being viewed
+        :type episode_number: int
+        :return: None
+        :rtype: None
+        """
+        for e, future in list(self.futures.items()):
+            if abs(e - episode_number) > self.radius and future.cancel():
+                del self.futures[e]
+        return None
+
+    def evict(self, episode_number):
+        """
+        Drops the least recently requested charts, other than those within
+        radius of the requested episode, until the cache fits cache_size
+        :param episode_number: Episode being viewed
+        :type episode_number: int
+        :return: None
+        :rtype: None
+        """
+        for e in list(self.futures):
+            if len(self.futures) <= self.cache_size:
+                break
+            if abs(e - episode_number) > self.radius:
+                self.futures.pop(e).cancel()
+        return None
@@ -0,0 +1,449 @@
+"""
+This script runs a local render service for the episode network charts.
+
+Every app process that draws the charts itself pays for importing matplotlib
+and networkx, looking up the chart font, and holding its own copy of the
+individual and cumulative dicts. The render server does that once: it keeps
+a pool of RENDER_SERVER: PROCESSES renderer processes, each with the dicts,
+the included nodes and edges, and a warmed-up chart loaded, and listens on
+the Unix socket RENDER_SERVER: SOCKET. App processes send it
+(dict_type, episode, size, dpi) requests through a RenderClient and receive
+PNG images, so they never load the dicts or matplotlib themselves. The app
+uses the server whenever its socket exists.
+
+Each message is a 4-byte big-endian length followed by its body. A request
+body is a JSON object with the keys dict_type ('individual', 'cumulative',
+or 'dual'), episode, and optionally size ([width, height] in inches), dpi,
+and time_aware (only include the characters and pairs that have qualified
+by the episode, see inclusion_index.py). A response body is preceded by a
+1-byte status: STATUS_OK followed by the PNG image, or STATUS_ERROR followed
+by the error message.
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import socket
+import socketserver
+import struct
+import sys
+import threading
+
+p = os.path.abspath('.')
+sys.path.insert(1, p)
+
+from utils import create_logger, get_config
+from C_episode_charts.network_renderer import render_network_chart
+
+CONFIG = get_config()
+DPI = CONFIG['CHART_DPI']
+MAX_EPISODE = CONFIG['MAX_EPISODE']
+DICT_DIRECTORY = CONFIG['DICT_DIRECTORY']
+RENDER_SERVER = CONFIG['RENDER_SERVER']
+DICT_TYPES = ('individual', 'cumulative', 'dual')
+STATUS_OK = 0
+STATUS_ERROR = 1
+HEADER = struct.Struct('>I')
+# Chart, included nodes and edges, and inclusion index of a renderer process
+RENDERER_STATE = {}
+
+
+class RenderServerError(Exception):
+    """
+    Raised by RenderClient when the render server could not render a chart
+    """
+
+
+def send_message(sock, body):
+    """
+    :param sock: Connected socket
+    :type sock: socket.socket
+    :param body: Message body
+    :type body: bytes
+    :return: None
+    :rtype: None
+    """
+    sock.sendall(HEADER.pack(len(body)) + body)
+    return None
+
+
+def receive_exactly(sock, size):
+    """
+    :param sock: Connected socket
+    :type sock: socket.socket
+    :param size: Number of bytes to read
+    :type size: int
+    :return: The bytes read
+    :rtype: bytes
+    """
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(size - len(buffer))
+        if not chunk:
+            raise ConnectionError('Connection closed mid-message')
+        buffer.extend(chunk)
+    return bytes(buffer)
+
+
+def receive_message(sock):
+    """
+    :param sock: Connected socket
+    :type sock: socket.socket
+    :return: Body of the next message
+    :rtype: bytes
+    """
+    (size,) = HEADER.unpack(receive_exactly(sock, HEADER.size))
+    return receive_exactly(sock, size)
+
+
+def parse_request(body):
+    """
+    Validates a render request
+    :param body: Request body (JSON)
+    :type body: bytes
+    :return: dict_type, episode number, the figsize/dpi keyword arguments
+        of the figure, and whether the inclusion is time-aware
+    :rtype: (str, int, dict, bool)
+    """
+    request = json.loads(body)
+    dict_type = request.get('dict_type')
+    episode_number = request.get('episode')
+    if dict_type not in DICT_TYPES:
+        raise ValueError(f'dict_type must be one of {DICT_TYPES}')
+    if not isinstance(episode_number, int) or not (
+        1 <= episode_number <= MAX_EPISODE
+    ):
+        raise ValueError(f'episode must be an integer from 1 to {MAX_EPISODE}')
+    figure_kwargs = {'dpi': request.get('dpi') or DPI}
+    if request.get('size'):
+        figure_kwargs['figsize'] = tuple(request['size'])
+    width, height = figure_kwargs.get(
+        'figsize', (20, 10) if dict_type == 'dual' else (10, 10)
+    )
+    if min(width, height, figure_kwargs['dpi']) <= 0:
+        raise ValueError('size and dpi must be positive')
+    if (
+        width * height * figure_kwargs['dpi'] ** 2
+        > RENDER_SERVER['MAX_PIXELS']
+    ):
+        raise ValueError(
+            f"Image must be at most {RENDER_SERVER['MAX_PIXELS']:,} pixels"
+        )
+    return (
+        dict_type,
+        episode_number,
+        figure_kwargs,
+        bool(request.get('time_aware')),
+    )
+
+
+def start_renderer(directory, logging_level):
+    """
+    Initializes a renderer process: attaches to the shared dicts (or loads
+    the dicts if they have not been published), finds the included nodes
+    and edges, and renders one chart so that the first request does not pay
+    for the imports and font lookups
+    :param directory: Directory from which to retrieve the dicts
+    :type directory: str
+    :param logging_level: A standard Python logging level
+    :type logging_level: str
+    :return: None
+    :rtype: None
+    """
+    from B_episode_dicts.inclusion_index import open_inclusion_index
+    from B_episode_dicts.shared_dicts import open_shared_dicts
+    from C_episode_charts.generate_network_charts import TMANetworkChart
+    from C_episode_charts.retrieve_en import retrieve_included_edges_and_nodes
+
+    shared_dicts = open_shared_dicts(directory)
+    if shared_dicts is None:
+        nodes_included, edges_included = retrieve_included_edges_and_nodes(
+            directory
+        )
+        episode_dict_dict = None
+    else:
+        nodes_included, edges_included = retrieve_included_edges_and_nodes(
+            node_appearance_dict=shared_dicts['na'],
+            edges_appearance_dict=shared_dicts['ea'],
+        )
+        episode_dict_dict = shared_dicts.episode_dict_dict()
+    RENDERER_STATE.update(
+        chart=TMANetworkChart(
+            directory,
+            logging_level=logging_level,
+            episode_dict_dict=episode_dict_dict,
+        ),
+        nodes_incl=nodes_included,
+        edges_incl=edges_included,
+        inclusion_index=open_inclusion_index(directory)
+        if os.path.exists(f'{directory}/inclusion_index.npz')
+        else None,
+    )
+    render_chart('dual', 1, {})
+    return None
+
+
+def render_chart(dict_type, episode_number, figure_kwargs, time_aware=False):
+    """
+    Renders a chart in a renderer process
+    :param dict_type: 'individual', 'cumulative', or 'dual'
+    :type dict_type: str
+    :param episode_number: episode number
+    :type episode_number: int
+    :param figure_kwargs: figsize and/or dpi for the figure
+    :type figure_kwargs: dict
+    :param time_aware: Whether to only include the nodes and edges that
+        have qualified by the episode
+    :type time_aware: bool
+    :return: PNG image
+    :rtype: bytes
+    """
+    if time_aware:
+        inclusion_index = RENDERER_STATE['inclusion_index']
+        if inclusion_index is None:
+            raise ValueError('The inclusion index has not been built')
+        nodes_incl, edges_incl = inclusion_index.included_as_of(episode_number)
+    else:
+        nodes_incl = RENDERER_STATE['nodes_incl']
+        edges_incl = RENDERER_STATE['edges_incl']
+    return render_network_chart(
+        RENDERER_STATE['chart'],
+        dict_type,
+        episode_number,
+        nodes_incl,
+        edges_incl,
+        **figure_kwargs,
+    )
+
+
+class RenderRequestHandler(socketserver.BaseRequestHandler):
+    """
+    Answers the render requests of one connection, one at a time, until the
+    client closes it
+    """
+
+    def handle(self):
+        while True:
+            try:
+                body = receive_message(self.request)
+            except ConnectionError:
+                return None
+            try:
+                request = parse_request(body)
+                png = self.server.pool.submit(render_chart, *request).result()
+            except Exception as e:
+                self.server.logger.warning(f'Render request failed: {e!r}')
+                send_message(
+                    self.request, bytes([STATUS_ERROR]) + repr(e).encode()
+                )
+            else:
+                send_message(self.request, bytes([STATUS_OK]) + png)
+
+
+class RenderServer(socketserver.ThreadingUnixStreamServer):
+    """
+    A class used to represent the render server. Each connection is handled
+    on its own thread, which hands the rendering to the process pool.
+
+    Attributes
+    ---
+    pool: concurrent.futures.ProcessPoolExecutor
+        Warm renderer processes
+    logger: a logging.Logger object
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        socket_path=RENDER_SERVER['SOCKET'],
+        processes=RENDER_SERVER['PROCESSES'],
+        directory=DICT_DIRECTORY,
+        logging_level='INFO',
+    ):
+        """
+        Starts the renderer processes and waits until they are warm, then
+        binds the socket
+        :param socket_path: Path of the Unix socket to listen on
+        :type socket_path: str
+        :param processes: Number of renderer processes
+        :type processes: int
+        :param directory: Directory from which to retrieve the dicts
+        :type directory: str
+        :param logging_level: A standard Python logging level
+            (DEBUG, INFO, WARNING, ERROR, CRITICAL)
+        :type logging_level: str
+        """
+        self.logger = create_logger(
+            'render_server', logging_level=logging_level
+        )
+        self.pool = concurrent.futures.ProcessPoolExecutor(
+            processes,
+            initializer=start_renderer,
+            initargs=(directory, logging_level),
+        )
+        concurrent.futures.wait(
+            [self.pool.submit(os.getpid) for _ in range(processes)]
+        )
+        self.logger.info(f'Started {processes} renderer processes')
+        if os.path.exists(socket_path):
+            if RenderClient(socket_path).is_running():
+                self.pool.shutdown()
+                raise OSError(f'A render server is already on {socket_path}')
+            os.remove(socket_path)
+        super().__init__(socket_path, RenderRequestHandler)
+        self.logger.info(f'Listening on {socket_path}')
+
+    def server_close(self):
+        super().server_close()
+        os.remove(self.server_address)
+        self.pool.shutdown(cancel_futures=True)
+
+
+class RenderClient:
+    """
+    A class used to request charts from a render server. Each thread keeps
+    its own connection, which is opened on its first request.
+
+    Attributes
+    ---
+    socket_path: str
+        Path of the render server's Unix socket
+    timeout: float
+        Seconds to wait for the server to accept, read, or answer a request
+    local: threading.local
+        Holds the connection of each thread
+    """
+
+    def __init__(
+        self,
+        socket_path=RENDER_SERVER['SOCKET'],
+        timeout=RENDER_SERVER['TIMEOUT'],
+    ):
+        """
+        :param socket_path: Path of the render server's Unix socket
+        :type socket_path: str
+        :param timeout: Seconds to wait for the server to accept, read, or
+            answer a request before giving up with socket.timeout (an
+            OSError)
+        :type timeout: float
+        """
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def connect(self):
+        """
+        :return: A new connection to the render server
+        :rtype: socket.socket
+        """
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def is_running(self):
+        """
+        :return: Whether a render server is accepting connections on the
+            socket
+        :rtype: bool
+        """
+        try:
+            self.connect().close()
+        except OSError:
+            return False
+        return True
+
+    def render(
+        self, dict_type, episode_number, size=None, dpi=None, time_aware=False
+    ):
+        """
+        Requests a chart from the render server. A dropped connection (e.g.
+        after the server restarts) is reopened once; a request that times out
+        is not retried
+        :param dict_type: 'individual', 'cumulative', or 'dual'
+        :type dict_type: str
+        :param episode_number: episode number
+        :type episode_number: int
+        :param size: Width, height of the figure in inches. Defaults to
+            (20, 10) for 'dual' and (10, 10) otherwise
+        :type size: (float, float)
+        :param dpi: The resolution of the figure in dots-per-inch. Defaults to
+            CHART_DPI
+        :type dpi: float
+        :param time_aware: Whether to only include the characters and pairs
+            that have qualified by the episode
+        :type time_aware: bool
+        :return: PNG image
+        :rtype: bytes
+        """
+        body = json.dumps(
+            {
+                'dict_type': dict_type,
+                'episode': episode_number,
+                'size': size,
+                'dpi': dpi,
+                'time_aware': time_aware,
+            }
+        ).encode()
+        for attempt in range(2):
+            sock = getattr(self.local, 'sock', None)
+            try:
+                if sock is None:
+                    sock = self.local.sock = self.connect()
+                send_message(sock, body)
+                response = receive_message(sock)
+                break
+            except OSError as e:
+                if sock is not None:
+                    sock.close()
+                self.local.sock = None
+                if attempt or isinstance(e, socket.timeout):
+                    raise
+        if response[0] != STATUS_OK:
+            raise RenderServerError(response[1:].decode())
+        return response[1:]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--processes',
+        '-P',
+        type=int,
+        default=RENDER_SERVER['PROCESSES'],
+        help='Number of renderer processes',
+    )
+    parser.add_argument(
+        '--socket',
+        '-S',
+        type=str,
+        default=RENDER_SERVER['SOCKET'],
+        help='Path of the Unix socket to listen on',
+    )
+    parser.add_argument(
+        '--save_dir',
+        '-D',
+        type=str,
+        default=DICT_DIRECTORY,
+        help='Directory where individual and cumulative dicts are saved',
+    )
+    parser.add_argument(
+        '--logging_level',
+        '-L',
+        type=str.upper,
+        default='info',
+        help='Python logging level',
+    )
+    args = parser.parse_args()
+    with RenderServer(
+        args.socket, args.processes, args.save_dir, args.logging_level
+    ) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.logger.info('Shutting down')
@@ -1,7 +1,7 @@
-from utils import load_config
+from utils import get_config
 from B_episode_dicts.save_and_load_dict import open_dict_as_pkl
 
-CONFIG = load_config()
+CONFIG = get_config()
 MIN_EPISODE_APPEARANCES = CONFIG['MIN_EPISODE_APPEARANCES']
 DICT_DIRECTORY = CONFIG['DICT_DIRECTORY']
 
@@ -9,6 +9,8 @@ DICT_DIRECTORY = CONFIG['DICT_DIRECTORY']
 def retrieve_included_edges_and_nodes(
     directory=DICT_DIRECTORY,
     minimum_episode_appearances=MIN_EPISODE_APPEARANCES,
+    node_appearance_dict=None,
+    edges_appearance_dict=None,
 ):
     """
     Retrieve a list of nodes that have hit a minimum episode appearance number
@@ -19,11 +21,19 @@ def retrieve_included_edges_and_nodes(
     :param minimum_episode_appearances: Minimum number of episodes node must
         appear in to be included
     :type minimum_episode_appearances: int
+    :param node_appearance_dict: Node appearance dict. If not provided, it is
+        loaded from the directory
+    :type node_appearance_dict: dict
+    :param edges_appearance_dict: Edge appearance dict. If not provided, it
+        is loaded from the directory
+    :type edges_appearance_dict: dict
     :return: list of included nodes, list of included edges
     :rtype: list, list
     """
-    node_appearance_dict = open_dict_as_pkl('na', directory=directory)
-    edges_appearance_dict = open_dict_as_pkl('ea', directory=directory)
+    if node_appearance_dict is None:
+        node_appearance_dict = open_dict_as_pkl('na', directory=directory)
+    if edges_appearance_dict is None:
+        edges_appearance_dict = open_dict_as_pkl('ea', directory=directory)
     nodes_incl = [
         node
         for node, node_appearances in node_appearance_dict.items()
@@ -1,18 +1,525 @@
+import os
+
 import streamlit as st
 
-from utils import load_config
+from utils import get_config
 from B_episode_dicts.save_and_load_dict import open_dict_as_pkl
+from B_episode_dicts.shared_dicts import open_shared_dicts
 from C_episode_charts.generate_network_charts import TMANetworkChart
+from C_episode_charts.network_renderer import ChartPrefetcher
+from C_episode_charts.render_server import RenderClient
 from C_episode_charts.generate_node_and_edge_appearance_charts import (
     generate_bar_chart,
+    generate_cast_heat_map,
+    generate_closeness_matrix,
     generate_heat_map,
 )
 from C_episode_charts.retrieve_en import retrieve_included_edges_and_nodes
+from C_episode_charts.animation_files import (
+    poster_file_name,
+    select_animation_file,
+)
+from B_episode_dicts.appearance_matrices import (
+    CAST_ORDERS,
+    open_appearance_matrices,
+)
+from B_episode_dicts.closeness_matrix import ClosenessMatrix
+from B_episode_dicts.interaction_index import (
+    open_interaction_index,
+    read_exchange_texts,
+)
+from B_episode_dicts.tma_episode_processor import open_episode_texts
+from B_episode_dicts.transcript_index import open_transcript_index
+from B_episode_dicts.leaderboards import open_leaderboards
+from B_episode_dicts.inclusion_index import open_inclusion_index
+from C_episode_charts.client_bundle import TRANSCRIPT_URL, client_chart_html
+from C_episode_charts.client_animation import client_animation_html
 
-CONFIG = load_config()
+CONFIG = get_config()
 MAX_EPISODE = CONFIG['MAX_EPISODE']
+DICT_DIRECTORY = CONFIG['DICT_DIRECTORY']
 CHART_DIRECTORY = CONFIG['CHART_DIRECTORY']
 CHART_BY_CHARACTER_DIMENSIONS = CONFIG['CHART_BY_CHARACTER_DIMENSIONS']
+ANIMATION = CONFIG['ANIMATION']
+CLIENT_BUNDLE = CONFIG['CLIENT_BUNDLE']
+CLIENT_ANIMATION = CONFIG['CLIENT_ANIMATION']
+RENDER_SERVER = CONFIG['RENDER_SERVER']
+TRANSCRIPT_INDEX = CONFIG['TRANSCRIPT_INDEX']
+MIN_EPISODE_APPEARANCES = CONFIG['MIN_EPISODE_APPEARANCES']
+TIME_AWARE_INCLUSION = CONFIG['TIME_AWARE_INCLUSION']
+
+
+@st.experimental_singleton
+def load_animation(file_name):
+    """
+    Reads an animation once per process. Reruns reuse the same bytes object,
+    so Streamlit serves it from the same media URL and the browser's cache
+    instead of receiving the video again
+    :param file_name: File name of the animation in CHART_DIRECTORY
+    :type file_name: str
+    :return: Contents of the animation file
+    :rtype: bytes
+    """
+    with open(f'{CHART_DIRECTORY}/{file_name}', 'rb') as video_file:
+        return video_file.read()
+
+
+@st.experimental_singleton
+def load_shared_dicts():
+    """
+    Attaches to the episode dicts published in shared_dicts.bin once per
+    process. Every app process on the host maps the same file read-only, so
+    running more of them does not add more copies of the dicts
+    :return: SharedDicts object, or None if the dicts have not been
+        published
+    :rtype: SharedDicts
+    """
+    return open_shared_dicts()
+
+
+def open_episode_dict(dict_type):
+    """
+    :param dict_type: 'individual', 'cumulative', 'ea', or 'na'
+    :type dict_type: str
+    :return: The shared dict of the specified type, or the dict loaded from
+        its .pkl file if the dicts have not been published
+    :rtype: SharedDictView or dict
+    """
+    shared_dicts = load_shared_dicts()
+    if shared_dicts is None:
+        return open_dict_as_pkl(dict_type)
+    return shared_dicts[dict_type]
+
+
+@st.experimental_singleton
+def load_network_chart():
+    """
+    Loads the episode dicts into a single chart shared by every session.
+    Rendering only reads from it (new node positions are placed under the
+    layout engine's lock), so sessions can draw with it concurrently
+    :return: TMANetworkChart object
+    :rtype: TMANetworkChart
+    """
+    return TMANetworkChart(
+        episode_dict_dict={
+            'individual': open_episode_dict('individual'),
+            'cumulative': open_episode_dict('cumulative'),
+        }
+    )
+
+
+@st.experimental_singleton
+def load_render_client():
+    """
+    Creates the client of the render server (see render_server.py) once per
+    process. Every render tries the server on RENDER_SERVER: SOCKET first,
+    so the server can be started, stopped, or restarted while the app is
+    running
+    :return: RenderClient object
+    :rtype: RenderClient
+    """
+    return RenderClient(RENDER_SERVER['SOCKET'])
+
+
+@st.experimental_singleton
+def load_client_animation_html():
+    """
+    Builds the client-rendered animation page once per process from the
+    bundle at CLIENT_ANIMATION: LOCATION
+    :return: HTML string, or None if the bundle has not been built
+    :rtype: str
+    """
+    if not os.path.exists(CLIENT_ANIMATION['LOCATION']):
+        return None
+    with open(CLIENT_ANIMATION['LOCATION'], 'rb') as f:
+        return client_animation_html(f.read())
+
+
+def show_animation():
+    """
+    Displays the network animation. If the client animation bundle has been
+    built, the browser animates it (with pausing, scrubbing and hovering).
+    Otherwise the video is shown: the browser streams it (with its poster
+    frame) straight from ANIMATION: BASE_URL, where the committed files are
+    hosted by default, and the app never touches the file. Only if BASE_URL
+    is unset are the cached file contents handed to st.video
+    :return: None
+    :rtype: None
+    """
+    animation_html = load_client_animation_html()
+    if animation_html:
+        st.components.v1.html(
+            animation_html,
+            height=CLIENT_ANIMATION['SIZE']
+            + CLIENT_ANIMATION['CONTROLS_HEIGHT'],
+        )
+        return None
+    file_name = select_animation_file(1, MAX_EPISODE)
+    base_url = ANIMATION['BASE_URL']
+    if base_url:
+        poster_url = f'{base_url}/{poster_file_name(1, MAX_EPISODE)}'
+        st.markdown(
+            f'''
+            <video controls preload="metadata" width="100%"
+                poster="{poster_url}">
+                <source src="{base_url}/{file_name}" type="video/mp4">
+            </video>
+            ''',
+            unsafe_allow_html=True,
+        )
+    else:
+        st.video(load_animation(file_name))
+    return None
+
+
+@st.experimental_singleton
+def load_client_chart_html():
+    """
+    Builds the client-rendered character chart page once per process from
+    the bundle at CLIENT_BUNDLE: LOCATION
+    :return: HTML string, or None if the bundle has not been built
+    :rtype: str
+    """
+    if not os.path.exists(CLIENT_BUNDLE['LOCATION']):
+        return None
+    with open(CLIENT_BUNDLE['LOCATION'], 'rb') as f:
+        return client_chart_html(f.read())
+
+
+def show_character_chart(nodes_included, edges_included):
+    """
+    Displays the character selectors and builds the selected chart on the
+    server. Used when the client bundle has not been built
+    :param nodes_included: Characters that can be selected
+    :type nodes_included: list
+    :param edges_included: Character pairs that can be selected
+    :type edges_included: list
+    :return: None
+    :rtype: None
+    """
+    col1, col2 = st.columns(2)
+    with col1:
+        character_a = st.selectbox('Select a character', nodes_included)
+    with col2:
+        b_selections = [None]
+        for edge in edges_included:
+            if character_a in edge:
+                if character_a == edge[0]:
+                    b_selections.append(edge[1])
+                else:
+                    b_selections.append(edge[0])
+        character_b = st.selectbox(
+            'Select a second character (opt.)', b_selections
+        )
+    if character_b:
+        appearance_dict = open_episode_dict('ea')
+    else:
+        appearance_dict = open_episode_dict('na')
+    chart_types = ['heatmap', 'bar']
+    if load_appearance_matrices() is not None:
+        chart_types.append('all characters')
+    chart_type = st.selectbox('Select a chart type', chart_types)
+    height = CHART_BY_CHARACTER_DIMENSIONS['HEIGHT']
+    if chart_type == 'all characters':
+        sort_by = st.selectbox(
+            'Sort all characters by',
+            CAST_ORDERS,
+            format_func=lambda order: order.replace('_', ' '),
+        )
+        html = load_cast_heat_map(tuple(nodes_included), sort_by)
+        chart_entry = 'square'
+        height = CHART_BY_CHARACTER_DIMENSIONS['CAST_HEIGHT']
+    elif chart_type == 'bar':
+        html = generate_bar_chart(
+            MAX_EPISODE, appearance_dict, character_a, character_b
+        )
+        chart_entry = 'bar'
+    else:
+        html = generate_heat_map(
+            MAX_EPISODE, appearance_dict, character_a, character_b
+        )
+        chart_entry = 'square'
+    st.markdown(
+        f'''
+    Clicking on the episode {chart_entry} will open a link to its transcript.
+    '''
+    )
+    st.components.v1.html(
+        html,
+        height=height,
+        width=CHART_BY_CHARACTER_DIMENSIONS['WIDTH'])
+    if (
+        character_b
+        and chart_type != 'all characters'
+        and load_interaction_index() is not None
+    ):
+        show_exchanges(character_a, character_b)
+    return None
+
+
+@st.experimental_singleton
+def load_appearance_matrices():
+    """
+    Opens the appearance matrices once per process
+    :return: Output of build_appearance_matrices, or None if they have not
+        been built
+    :rtype: dict
+    """
+    if not os.path.exists(f'{DICT_DIRECTORY}/appearance_matrices.npz'):
+        return None
+    return open_appearance_matrices()
+
+
+@st.experimental_singleton
+def load_cast_heat_map(nodes_included, sort_by):
+    """
+    Builds the all-character heatmap once per process and order
+    :param nodes_included: Characters to include in the chart
+    :type nodes_included: tuple
+    :param sort_by: 'first_appearance' or 'total_words'
+    :type sort_by: str
+    :return: HTML string
+    :rtype: str
+    """
+    return generate_cast_heat_map(
+        MAX_EPISODE, load_appearance_matrices(), list(nodes_included), sort_by
+    )
+
+
+@st.experimental_singleton
+def load_closeness_matrix(nodes_included):
+    """
+    Builds the running closeness of every pair of characters once per
+    process
+    :param nodes_included: Characters to include in the matrix
+    :type nodes_included: tuple
+    :return: ClosenessMatrix object
+    :rtype: ClosenessMatrix
+    """
+    return ClosenessMatrix(load_appearance_matrices(), list(nodes_included))
+
+
+def show_closeness_matrix(closeness_matrix):
+    """
+    Displays the episode range selector and the closeness between every pair
+    of characters over that range
+    :param closeness_matrix: Running closeness of every pair of characters
+    :type closeness_matrix: ClosenessMatrix
+    :return: None
+    :rtype: None
+    """
+    start_episode, end_episode = st.slider(
+        'Select a range of episodes',
+        1,
+        closeness_matrix.end_episode,
+        (1, closeness_matrix.end_episode),
+    )
+    fig = generate_closeness_matrix(
+        closeness_matrix, start_episode, end_episode
+    )
+    st.plotly_chart(fig, use_container_width=True)
+    return None
+
+
+@st.experimental_singleton
+def load_interaction_index():
+    """
+    Opens the interaction index once per process
+    :return: InteractionIndex object, or None if the index has not been built
+    :rtype: InteractionIndex
+    """
+    if not os.path.exists(f'{DICT_DIRECTORY}/interaction_index.npz'):
+        return None
+    return open_interaction_index()
+
+
+@st.experimental_singleton
+def load_episode_texts():
+    """
+    Opens the episode texts once per process, for the text of the exchanges
+    :return: Dictionary where key is an episode number and value is the
+        episode text
+    :rtype: dict
+    """
+    return open_episode_texts()
+
+
+def show_exchanges(character_a, character_b):
+    """
+    Displays the exchanges between a pair in a selected episode
+    :param character_a: A character from The Magnus Archives
+    :type character_a: str
+    :param character_b: A second character from The Magnus Archives
+    :type character_b: str
+    :return: None
+    :rtype: None
+    """
+    interaction_index = load_interaction_index()
+    episode = st.selectbox(
+        'View their exchanges in an episode',
+        [None] + interaction_index.episodes_of(character_a, character_b),
+        format_func=lambda e: '' if e is None else f'MAG{e:03}',
+    )
+    if episode is None:
+        return None
+    st.markdown(
+        f'[Open the transcript of MAG{episode:03}]'
+        f'({TRANSCRIPT_URL}{episode:03}.html)'
+    )
+    exchanges = interaction_index.exchanges(character_a, character_b, episode)
+    for exchange in read_exchange_texts(exchanges, load_episode_texts()):
+        st.markdown(
+            f"Scene {exchange['scene'] + 1} "
+            f"({exchange['count']} interactions)"
+        )
+        st.text(exchange['text'])
+    return None
+
+
+@st.experimental_singleton
+def load_transcript_index():
+    """
+    Opens the transcript index once per process
+    :return: TranscriptIndex object, or None if the index has not been built
+    :rtype: TranscriptIndex
+    """
+    if not os.path.exists(TRANSCRIPT_INDEX['LOCATION']):
+        return None
+    return open_transcript_index()
+
+
+def show_transcript_search(index):
+    """
+    Displays a search box and, for a query, the episodes, scenes and speakers
+    where it appears, linked to the transcripts
+    :param index: Transcript index
+    :type index: TranscriptIndex
+    :return: None
+    :rtype: None
+    """
+    query = st.text_input('Search for a word or phrase')
+    if not query:
+        return None
+    hits = index.search(query)
+    mentions = sum(hit['count'] for hit in hits)
+    episodes = len({hit['episode'] for hit in hits})
+    st.markdown(f'"{query}" appears {mentions} times in {episodes} episodes.')
+    results = [
+        f"- [MAG{hit['episode']:03}]({TRANSCRIPT_URL}{hit['episode']:03}.html)"
+        f", scene {hit['scene'] + 1}, {hit['speaker']} ({hit['count']})"
+        for hit in hits[: TRANSCRIPT_INDEX['RESULTS_LIMIT']]
+    ]
+    if len(hits) > TRANSCRIPT_INDEX['RESULTS_LIMIT']:
+        results.append(
+            f"- ... and {len(hits) - TRANSCRIPT_INDEX['RESULTS_LIMIT']} more"
+        )
+    st.markdown('\n'.join(results))
+    return None
+
+
+@st.experimental_singleton
+def load_leaderboards():
+    """
+    Opens the leaderboards once per process
+    :return: Leaderboards object, or None if they have not been built
+    :rtype: Leaderboards
+    """
+    if not os.path.exists(f'{DICT_DIRECTORY}/leaderboards.npz'):
+        return None
+    return open_leaderboards()
+
+
+def show_leaderboards(leaderboards, nodes_included):
+    """
+    Displays the top speakers of the selected season (or the whole show) and
+    the closest partners of the selected character
+    :param leaderboards: Precomputed leaderboards
+    :type leaderboards: Leaderboards
+    :param nodes_included: Characters that can be selected
+    :type nodes_included: list
+    :return: None
+    :rtype: None
+    """
+    col1, col2 = st.columns(2)
+    with col1:
+        season = st.selectbox(
+            'Select a season',
+            [None] + leaderboards.seasons,
+            format_func=lambda s: f'Season {s}' if s else 'All seasons',
+        )
+    with col2:
+        character = st.selectbox(
+            'Select a character for their closest partners', nodes_included
+        )
+    speakers = leaderboards.top_speakers(season)
+    partners = leaderboards.top_partners(character, season)
+    with col1:
+        st.table(
+            {
+                'Character': [c for c, _ in speakers],
+                'Words Spoken': [w for _, w in speakers],
+            }
+        )
+    with col2:
+        if partners:
+            st.table(
+                {
+                    'Partner': [c for c, _ in partners],
+                    'Interaction Score': [round(v, 2) for _, v in partners],
+                }
+            )
+        else:
+            st.markdown(f'{character} has no interactions in this season.')
+    return None
+
+
+@st.experimental_singleton
+def load_inclusion_index():
+    """
+    Loads the episode at which each character and pair qualifies for the
+    network charts once per process
+    :return: InclusionIndex object, or None if it has not been built
+    :rtype: InclusionIndex
+    """
+    if not os.path.exists(f'{DICT_DIRECTORY}/inclusion_index.npz'):
+        return None
+    return open_inclusion_index()
+
+
+def show_network_chart(
+    episode, nodes_included, edges_included, inclusion_index=None
+):
+    """
+    Displays the individual and cumulative network charts of an episode.
+    Each session has its own ChartPrefetcher, which renders the neighbouring
+    episodes in the background so stepping through them does not wait on
+    fresh renders. While a render server is running, it renders the charts
+    and the episode dicts are not loaded into the app
+    :param episode: Episode number
+    :type episode: int
+    :param nodes_included: Characters to include in the chart
+    :type nodes_included: list
+    :param edges_included: Character pairs to include in the chart
+    :type edges_included: list
+    :param inclusion_index: If provided, the chart only includes the
+        characters and pairs that have qualified by the episode
+    :type inclusion_index: InclusionIndex
+    :return: None
+    :rtype: None
+    """
+    prefetcher = st.session_state.get('chart_prefetcher')
+    if prefetcher is None or prefetcher.inclusion_index is not inclusion_index:
+        st.session_state['chart_prefetcher'] = ChartPrefetcher(
+            None,
+            nodes_included,
+            edges_included,
+            render_client=load_render_client(),
+            inclusion_index=inclusion_index,
+            load_chart=load_network_chart,
+        )
+    network_png = st.session_state['chart_prefetcher'](episode).result()
+    st.image(network_png, use_column_width=True)
+    return None
 
 
 def run():
@@ -41,13 +548,9 @@ def run():
         See the FAQ section at the end for further details. 
     '''
     )
-    video_file = open(
-        f'{CHART_DIRECTORY}/tma_network_1_to_{MAX_EPISODE}.mp4', 'rb'
-    )
-    video_bytes = video_file.read()
     col1, col2, col3 = st.columns([1, 3, 1])
     with col2:
-        st.video(video_bytes)
+        show_animation()
     st.subheader('View appearances/interactions episode by episode')
     st.markdown(
         '''
@@ -60,64 +563,62 @@ def run():
     episode = st.number_input(
         f'Select an episode (1 to {MAX_EPISODE})', 1, MAX_EPISODE
     )
-    nodes_included, edges_included = retrieve_included_edges_and_nodes()
-    chart = TMANetworkChart()
-    network_fig, ax1, ax2 = chart.set_up_dual_plot()
-    chart.generate_network_chart(
-        'individual', episode, ax1, nodes_included, edges_included
+    nodes_included, edges_included = retrieve_included_edges_and_nodes(
+        node_appearance_dict=open_episode_dict('na'),
+        edges_appearance_dict=open_episode_dict('ea'),
+    )
+    inclusion_index = load_inclusion_index()
+    time_aware = inclusion_index is not None and st.checkbox(
+        'Only include characters who had appeared in '
+        f'{MIN_EPISODE_APPEARANCES} episodes by this episode',
+        value=TIME_AWARE_INCLUSION,
     )
-    chart.generate_network_chart(
-        'cumulative', episode, ax2, nodes_included, edges_included
+    show_network_chart(
+        episode,
+        nodes_included,
+        edges_included,
+        inclusion_index if time_aware else None,
     )
-    st.pyplot(fig=network_fig)
     st.subheader('View appearances/interactions for each character')
     st.markdown(
         '''
         Select a character to view their appearances over the course of the
         show. If you select a second character, you can view the interactions
-        between the pair. 
+        between the pair. Choose the "all characters" chart to compare the
+        appearances of the whole cast at once.
     '''
     )
-    col1, col2 = st.columns(2)
-    with col1:
-        character_a = st.selectbox('Select a character', nodes_included)
-    with col2:
-        b_selections = [None]
-        for edge in edges_included:
-            if character_a in edge:
-                if character_a == edge[0]:
-                    b_selections.append(edge[1])
-                else:
-                    b_selections.append(edge[0])
-        character_b = st.selectbox(
-            'Select a second character (opt.)', b_selections
+    chart_html = load_client_chart_html()
+    if chart_html:
+        st.components.v1.html(
+            chart_html,
+            height=max(
+                CHART_BY_CHARACTER_DIMENSIONS['HEIGHT']
+                + CLIENT_BUNDLE['EXCHANGES_HEIGHT'],
+                CHART_BY_CHARACTER_DIMENSIONS['CAST_HEIGHT'],
+            )
+            + CLIENT_BUNDLE['CONTROLS_HEIGHT'],
+            width=CHART_BY_CHARACTER_DIMENSIONS['WIDTH'],
         )
-    if character_b:
-        appearance_dict = open_dict_as_pkl('ea')
     else:
-        appearance_dict = open_dict_as_pkl('na')
-    chart_type = st.selectbox('Select a chart type', ['heatmap', 'bar'])
-    if chart_type == 'bar':
-        func = generate_bar_chart
-        chart_entry = 'bar'
-    else:
-        func = generate_heat_map
-        chart_entry = 'square'
-    html = func(
-        MAX_EPISODE,
-        appearance_dict,
-        character_a,
-        character_b,
-    )
-    st.markdown(
-        f'''
-    Clicking on the episode {chart_entry} will open a link to its transcript.
-    '''
-    )
-    st.components.v1.html(
-        html,
-        height=CHART_BY_CHARACTER_DIMENSIONS['HEIGHT'],
-        width=CHART_BY_CHARACTER_DIMENSIONS['WIDTH'])
+        show_character_chart(nodes_included, edges_included)
+    if load_appearance_matrices() is not None:
+        st.subheader('View interactions between every pair of characters')
+        st.markdown(
+            '''
+            Select a range of episodes to view the "closeness" of every pair
+            of characters over those episodes.
+        '''
+        )
+        show_closeness_matrix(load_closeness_matrix(tuple(nodes_included)))
+    leaderboards = load_leaderboards()
+    if leaderboards:
+        st.subheader('Leaderboards')
+        show_leaderboards(leaderboards, nodes_included)
+    transcript_index = load_transcript_index()
+    if transcript_index:
+        st.subheader('Search the transcripts')
+        show_transcript_search(transcript_index)
     with st.expander('FAQ'):
         st.markdown(
             '''
@@ -0,0 +1,389 @@
+"""
+Batch runner that builds the episode dicts and network charts of several
+transcript corpora on one shared process pool.
+
+Each corpus is described by a small YAML file (see corpora/tma.yaml) whose
+keys override config.yaml for that corpus only: NAME, TEXT_DIRECTORY,
+START_EPISODE, END_EPISODE, CHARACTER_CONSOLIDATION_DICT,
+MIN_EPISODE_APPEARANCES and CHART_FIXED_POSITIONS. Everything a corpus
+produces goes to its own namespace, BATCH: OUTPUT_DIRECTORY/<NAME>/ (dicts/
+and charts/), so corpora never overwrite each other's or the app's files.
+
+Episodes of every corpus are parsed on the same pool, interleaved so that no
+corpus waits for another to finish. As soon as all episodes of a corpus are
+parsed, its dicts are assembled and saved, its node positions are placed
+once, and its chart renders are queued on the same pool. Throughput is
+reported per corpus.
+
+    python tma.py batch corpora/tma.yaml corpora/<OTHER SHOW>.yaml
+"""
+import concurrent.futures
+import itertools
+import os
+import time
+
+from utils import create_logger, get_config, load_config
+from B_episode_dicts.alias_resolver import AliasResolver
+from B_episode_dicts.generate_episode_dicts import (
+    generate_cumulative_episode_dict,
+    update_item_appearance_dict,
+)
+from B_episode_dicts.save_and_load_dict import (
+    save_dict_as_pkl,
+    save_scenes_as_pkl,
+)
+from B_episode_dicts.tma_episode_processor import (
+    TMAEpisode,
+    open_episode_texts,
+)
+
+CONFIG = get_config()
+BATCH = CONFIG['BATCH']
+# State kept by each worker process (see worker_state)
+WORKER_STATE = {}
+
+
+class Corpus:
+    """
+    A class used to represent a transcript corpus processed by the batch
+    runner.
+
+    Attributes
+    ---
+    name: str
+        Name of the corpus, also the name of its output namespace
+    text_directory: str
+        Directory in which the corpus's tma_text_from_epub.pkl is saved
+    start_episode: int
+        First episode to process
+    end_episode: int
+        Last episode to process
+    consolidation_dict: dict
+        Character consolidation table of the corpus
+    min_episode_appearances: int
+        Minimum number of episodes for a character or pair to be charted
+    fixed_positions: dict
+        Dictionary where key is a character and value is their fixed [x, y]
+        chart position
+    dict_directory: str
+        Directory to which the corpus's dicts are saved
+    chart_directory: str
+        Directory to which the corpus's charts are saved
+    """
+
+    def __init__(
+        self, corpus_config, output_directory=BATCH['OUTPUT_DIRECTORY']
+    ):
+        """
+        :param corpus_config: Corpus keys (see module docstring). Missing keys
+            fall back to config.yaml
+        :type corpus_config: dict
+        :param output_directory: Directory in which the corpus's namespace is
+            created
+        :type output_directory: str
+        """
+        cfg = {**CONFIG, **corpus_config}
+        self.name = cfg['NAME']
+        self.text_directory = cfg['TEXT_DIRECTORY']
+        self.start_episode = cfg.get('START_EPISODE', 1)
+        self.end_episode = cfg.get('END_EPISODE', cfg['MAX_EPISODE'])
+        self.consolidation_dict = cfg['CHARACTER_CONSOLIDATION_DICT']
+        self.min_episode_appearances = cfg['MIN_EPISODE_APPEARANCES']
+        self.fixed_positions = cfg['CHART_FIXED_POSITIONS']
+        namespace = os.path.join(output_directory, self.name)
+        self.dict_directory = os.path.join(namespace, 'dicts')
+        self.chart_directory = os.path.join(namespace, 'charts')
+
+    @classmethod
+    def from_file(cls, location, output_directory=BATCH['OUTPUT_DIRECTORY']):
+        """
+        :param location: Location of the corpus's .yaml file
+        :type location: str
+        :param output_directory: Directory in which the corpus's namespace is
+            created
+        :type output_directory: str
+        :return: Corpus object
+        :rtype: Corpus
+        """
+        return cls(load_config(location), output_directory)
+
+    @property
+    def episodes(self):
+        """
+        :return: Episode numbers of the corpus
+        :rtype: range
+        """
+        return range(self.start_episode, self.end_episode + 1)
+
+    @property
+    def layout_location(self):
+        """
+        :return: Location of the corpus's computed node positions
+        :rtype: str
+        """
+        return os.path.join(self.chart_directory, 'layout_positions.json')
+
+
+def worker_state(corpus):
+    """
+    Opens a corpus's episode texts and builds its alias resolver and chart
+    once per worker process. Tasks receive a fresh copy of the corpus, so
+    the state is keyed by corpus name
+    :param corpus: Corpus being processed
+    :type corpus: Corpus
+    :return: Dictionary with the corpus's 'texts', 'alias_resolver', and (once
+        a chart has been rendered) 'chart'
+    :rtype: dict
+    """
+    if corpus.name not in WORKER_STATE:
+        WORKER_STATE[corpus.name] = {
+            'texts': open_episode_texts(corpus.text_directory),
+            'alias_resolver': AliasResolver(corpus.consolidation_dict),
+        }
+    return WORKER_STATE[corpus.name]
+
+
+def corpus_chart(corpus, episode_dict_dict=None):
+    """
+    :param corpus: Corpus to chart
+    :type corpus: Corpus
+    :param episode_dict_dict: Dictionary containing the corpus's individual
+        and cumulative episode dicts. If not provided, they are loaded from
+        the corpus's dict directory
+    :type episode_dict_dict: dict
+    :return: Chart that uses the corpus's own node positions
+    :rtype: TMANetworkChart
+    """
+    from C_episode_charts.generate_network_charts import TMANetworkChart
+    from C_episode_charts.layout_engine import LayoutEngine
+
+    layout_engine = LayoutEngine(
+        location=corpus.layout_location,
+        fixed_positions=corpus.fixed_positions,
+        logging_level='WARNING',
+    )
+    return TMANetworkChart(
+        corpus.dict_directory,
+        logging_level='WARNING',
+        episode_dict_dict=episode_dict_dict,
+        layout_engine=layout_engine,
+    )
+
+
+def parse_episode(corpus, episode_number):
+    """
+    Parses one episode of a corpus (run on a worker process)
+    :param corpus: Corpus of the episode
+    :type corpus: Corpus
+    :param episode_number: Episode number
+    :type episode_number: int
+    :return: Speaker info in each scene, nodes dict, edges dict, and the
+        seconds spent parsing
+    :rtype: dict, dict, dict, float
+    """
+    start = time.perf_counter()
+    state = worker_state(corpus)
+    episode = TMAEpisode(
+        episode_number,
+        logging_level='WARNING',
+        episode_texts=state['texts'],
+        alias_resolver=state['alias_resolver'],
+    )
+    episode()
+    return (
+        episode.speaker_info_in_scenes,
+        episode.nodes_dict,
+        episode.edges_dict,
+        time.perf_counter() - start,
+    )
+
+
+def render_episode(corpus, episode_number, nodes_incl, edges_incl):
+    """
+    Renders and saves the dual network chart of one episode of a corpus (run
+    on a worker process)
+    :param corpus: Corpus of the episode
+    :type corpus: Corpus
+    :param episode_number: Episode number
+    :type episode_number: int
+    :param nodes_incl: Nodes to include in the chart
+    :type nodes_incl: list
+    :param edges_incl: Edges to include in the chart
+    :type edges_incl: list
+    :return: Seconds spent rendering
+    :rtype: float
+    """
+    from C_episode_charts.network_renderer import render_dual_network_chart
+
+    start = time.perf_counter()
+    state = worker_state(corpus)
+    if 'chart' not in state:
+        state['chart'] = corpus_chart(corpus)
+    png = render_dual_network_chart(
+        state['chart'], episode_number, nodes_incl, edges_incl
+    )
+    location = os.path.join(
+        corpus.chart_directory, f'network_{episode_number:03}.png'
+    )
+    with open(location, 'wb') as f:
+        f.write(png)
+    return time.perf_counter() - start
+
+
+def assemble_corpus(corpus, parsed, logger=None):
+    """
+    Builds and saves a corpus's dicts from its parsed episodes, and places
+    its node positions so that the render workers only read them
+    :param corpus: Corpus whose episodes were parsed
+    :type corpus: Corpus
+    :param parsed: Dictionary where key is an episode number and value is
+        the output of parse_episode
+    :type parsed: dict
+    :param logger: logging.Logger object
+    :type logger: logging.Logger object
+    :return: Included nodes and edges of the corpus's charts
+    :rtype: list, list
+    """
+    from C_episode_charts.retrieve_en import retrieve_included_edges_and_nodes
+
+    os.makedirs(corpus.dict_directory, exist_ok=True)
+    os.makedirs(corpus.chart_directory, exist_ok=True)
+    scene_info_dict, indi, na, ea = {}, {}, {}, {}
+    for e in sorted(parsed):
+        scenes, nodes_dict, edges_dict, _ = parsed[e]
+        scene_info_dict[e] = scenes
+        indi[e] = {'nodes_dict': nodes_dict, 'edges_dict': edges_dict}
+        update_item_appearance_dict(edges_dict, ea, e)
+        update_item_appearance_dict(nodes_dict, na, e)
+    cumu = generate_cumulative_episode_dict(indi)
+    save_scenes_as_pkl(scene_info_dict, corpus.dict_directory, logger)
+    for dict_type, episode_dict in zip(
+        ('individual', 'cumulative', 'na', 'ea'), (indi, cumu, na, ea)
+    ):
+        save_dict_as_pkl(
+            episode_dict, dict_type, corpus.dict_directory, logger
+        )
+    nodes_incl, edges_incl = retrieve_included_edges_and_nodes(
+        corpus.dict_directory, corpus.min_episode_appearances, na, ea
+    )
+    chart = corpus_chart(corpus, {'individual': indi, 'cumulative': cumu})
+    g = chart.build_graph(
+        'cumulative', corpus.end_episode, nodes_incl, edges_incl
+    )
+    chart.positions_for(g, nodes_incl, edges_incl)
+    return nodes_incl, edges_incl
+
+
+def run_batch(corpora, workers=BATCH['WORKERS'], render=True, logger=None):
+    """
+    Parses (and optionally charts) every corpus on one shared process pool
+    :param corpora: Corpora to process. Names must be unique
+    :type corpora: list
+    :param workers: Number of worker processes
+    :type workers: int
+    :param render: Whether to render each episode's network chart
+    :type render: bool
+    :param logger: logging.Logger object
+    :type logger: logging.Logger object
+    :return: Dictionary where key is a corpus name and value is a dictionary
+        of its number of episodes and charts, the worker seconds spent
+        parsing and rendering, and the seconds from the start of the batch
+        until its dicts were saved and until its last task finished
+    :rtype: dict
+    """
+    names = [corpus.name for corpus in corpora]
+    if len(set(names)) != len(names):
+        raise ValueError(f'Corpus names must be unique: {names}')
+    start = time.perf_counter()
+    stats = {
+        corpus.name: {
+            'episodes': len(corpus.episodes),
+            'charts': 0,
+            'parse_seconds': 0.0,
+            'render_seconds': 0.0,
+            'dicts_saved_at': 0.0,
+            'wall_seconds': 0.0,
+        }
+        for corpus in corpora
+    }
+    parsed = {corpus.name: {} for corpus in corpora}
+    pending = {}
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        # Interleave the corpora so they share the pool from the start
+        for tasks in itertools.zip_longest(
+            *[[(c, e) for e in c.episodes] for c in corpora]
+        ):
+            for corpus, e in filter(None, tasks):
+                future = pool.submit(parse_episode, corpus, e)
+                pending[future] = ('parse', corpus, e)
+        while pending:
+            done, _ = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                stage, corpus, e = pending.pop(future)
+                corpus_stats = stats[corpus.name]
+                if stage == 'parse':
+                    parsed[corpus.name][e] = future.result()
+                    corpus_stats['parse_seconds'] += future.result()[-1]
+                else:
+                    corpus_stats['render_seconds'] += future.result()
+                    corpus_stats['charts'] += 1
+                corpus_stats['wall_seconds'] = time.perf_counter() - start
+                if stage == 'parse' and len(parsed[corpus.name]) == len(
+                    corpus.episodes
+                ):
+                    nodes_incl, edges_incl = assemble_corpus(
+                        corpus, parsed.pop(corpus.name), logger
+                    )
+                    corpus_stats['dicts_saved_at'] = (
+                        time.perf_counter() - start
+                    )
+                    corpus_stats['wall_seconds'] = corpus_stats[
+                        'dicts_saved_at'
+                    ]
+                    if logger:
+                        logger.info(f'Saved the dicts of {corpus.name}')
+                    if render:
+                        for episode_number in corpus.episodes:
+                            future = pool.submit(
+                                render_episode,
+                                corpus,
+                                episode_number,
+                                nodes_incl,
+                                edges_incl,
+                            )
+                            pending[future] = (
+                                'render',
+                                corpus,
+                                episode_number,
+                            )
+    return stats
+
+
+def log_throughput(stats, logger):
+    """
+    Logs the throughput of each corpus
+    :param stats: Output of run_batch
+    :type stats: dict
+    :param logger: logging.Logger object
+    :type logger: logging.Logger object
+    :return: None
+    :rtype: None
+    """
+    for name, s in stats.items():
+        rates = [
+            f"{s['episodes'] / s['dicts_saved_at']:.1f} episodes/s "
+            f"({s['parse_seconds']:.1f} worker seconds parsing)"
+        ]
+        if s['charts']:
+            render_wall = s['wall_seconds'] - s['dicts_saved_at']
+            rates.append(
+                f"{s['charts'] / render_wall:.1f} charts/s "
+                f"({s['render_seconds']:.1f} worker seconds rendering)"
+            )
+        logger.info(
+            f"{name}: {s['episodes']} episodes, {s['charts']} charts in "
+            f"{s['wall_seconds']:.1f}s: {', '.join(rates)}"
+        )
+    return None
@@ -0,0 +1,93 @@
+"""
+This script measures how long a fresh interpreter takes to import app.py
+(i.e., the cold start of the Streamlit app before its first render) and
+fails if the median exceeds a budget.
+
+It also checks that the chart backends (pandas, networkx, matplotlib) are
+not imported as a side effect of importing the app, since they should only
+load when a chart is first drawn.
+
+Run it from the repository root:
+    $ python3 benchmarks/app_import_time.py
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+p = os.path.abspath('.')
+sys.path.insert(1, p)
+
+from utils import create_logger, get_config
+
+CONFIG = get_config()
+IMPORT_TIME_BUDGET = CONFIG['BENCHMARKS']['APP_IMPORT_TIME_BUDGET']
+LAZY_MODULES = ('pandas', 'networkx', 'matplotlib')
+IMPORT_SNIPPET = '''
+import sys, time
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+eager = [m for m in {lazy_modules!r} if m in sys.modules]
+print(elapsed, ','.join(eager))
+'''
+
+
+def time_app_import(repeats):
+    """
+    Imports app.py in a fresh interpreter several times
+    :param repeats: Number of fresh interpreters to time
+    :type repeats: int
+    :return: Import times in seconds, and the lazy modules that were
+        imported eagerly in any run
+    :rtype: list, set
+    """
+    snippet = IMPORT_SNIPPET.format(lazy_modules=LAZY_MODULES)
+    timings = []
+    eager = set()
+    for _ in range(repeats):
+        out = subprocess.run(
+            [sys.executable, '-c', snippet],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.split()
+        timings.append(float(out[0]))
+        if len(out) > 1:
+            eager.update(out[1].split(','))
+    return timings, eager
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--repeats',
+        '-R',
+        type=int,
+        default=5,
+        help='Number of fresh interpreters to time',
+    )
+    parser.add_argument(
+        '--budget',
+        '-B',
+        type=float,
+        default=IMPORT_TIME_BUDGET,
+        help='Maximum median import time in seconds',
+    )
+    args = parser.parse_args()
+    logger = create_logger('import_benchmark')
+    import_times, eager_modules = time_app_import(args.repeats)
+    median = statistics.median(import_times)
+    logger.info(
+        f'app import: median {median:.3f}s, '
+        f'min {min(import_times):.3f}s, max {max(import_times):.3f}s'
+    )
+    failed = False
+    if eager_modules:
+        logger.error(f'Imported eagerly: {sorted(eager_modules)}')
+        failed = True
+    if median > args.budget:
+        logger.error(f'Median exceeds budget of {args.budget:.3f}s')
+        failed = True
+    sys.exit(1 if failed else 0)
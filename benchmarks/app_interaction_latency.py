@@ -0,0 +1,330 @@
+"""
+This script measures how long the Streamlit app takes to rerun after a user
+interaction (changing the episode, a character, the season, a search query,
+etc.) and fails if the p95 rerun latency exceeds a budget.
+
+app.run() is driven headlessly against a stub of the streamlit module. The
+stub records the options of every widget the app draws, and each simulated
+interaction changes one of those widgets to a random option before the next
+rerun, like a user clicking around the page (or, with --step, steps the
+episode selector forward or back by one, like its +/- buttons, to measure
+the prefetched network charts). For every rerun it records the
+time spent in each section of the app (see SECTIONS) and the size of the
+image and HTML payloads sent to the browser, and reports their p50/p95.
+
+Run it from the repository root:
+    $ python3 benchmarks/app_interaction_latency.py
+"""
+import argparse
+import contextlib
+import functools
+import os
+import random
+import statistics
+import sys
+import time
+import types
+
+p = os.path.abspath('.')
+sys.path.insert(1, p)
+
+from utils import create_logger, get_config
+
+CONFIG = get_config()
+RERUN_P95_BUDGET = CONFIG['BENCHMARKS']['APP_RERUN_P95_BUDGET']
+# Section name: functions of app.py whose time is counted towards it
+SECTIONS = {
+    'data_load': (
+        'retrieve_included_edges_and_nodes',
+        'open_episode_dict',
+        'load_shared_dicts',
+        'load_animation',
+        'load_network_chart',
+        'load_render_client',
+        'load_interaction_index',
+        'load_episode_texts',
+        'load_leaderboards',
+        'load_inclusion_index',
+        'load_closeness_matrix',
+        'load_transcript_index',
+    ),
+    'network_chart': ('show_network_chart',),
+    'character_chart': (
+        'load_client_chart_html',
+        'load_appearance_matrices',
+        'load_cast_heat_map',
+        'generate_heat_map',
+        'generate_bar_chart',
+    ),
+    'exchanges': ('show_exchanges',),
+    'closeness_matrix': ('show_closeness_matrix',),
+    'leaderboards': ('show_leaderboards',),
+    'search': ('show_transcript_search',),
+}
+SEARCH_QUERIES = ('', 'the archivist', 'statement', 'the eye', 'jonathan')
+
+
+class StubStreamlit(types.ModuleType):
+    """
+    A stand-in for the streamlit module that renders nothing.
+
+    Attributes
+    ---
+    values: dict
+        Dictionary where key is a widget label and value is the value the
+        widget returns on the next rerun
+    options: dict
+        Dictionary where key is a widget label and value is the options it
+        had on the last rerun
+    number_inputs: set
+        Labels of the number inputs drawn so far
+    payloads: dict
+        Dictionary where key is 'image' or 'html' and value is the number of
+        bytes sent to the browser on the last rerun
+    session_state: dict
+        Stands in for st.session_state
+    components: types.SimpleNamespace
+        Provides components.v1.html
+    """
+
+    def __init__(self):
+        super().__init__('streamlit')
+        self.values = {}
+        self.options = {}
+        self.number_inputs = set()
+        self.payloads = {}
+        self.session_state = {}
+        self.components = types.SimpleNamespace(
+            v1=types.SimpleNamespace(html=self.html)
+        )
+
+    @staticmethod
+    def experimental_singleton(func):
+        """
+        Caches the function's output for the life of the process, like
+        st.experimental_singleton
+        """
+        return functools.lru_cache(maxsize=None)(func)
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        # set_page_config, title, markdown, subheader, text, table, video...
+        return lambda *args, **kwargs: None
+
+    def columns(self, spec):
+        count = spec if isinstance(spec, int) else len(spec)
+        return [contextlib.nullcontext() for _ in range(count)]
+
+    def expander(self, label, expanded=False):
+        return contextlib.nullcontext()
+
+    def selectbox(self, label, options, index=0, format_func=str, **kwargs):
+        options = list(options)
+        self.options[label] = options
+        value = self.values.get(label)
+        return value if value in options else options[index]
+
+    def number_input(self, label, min_value=None, max_value=None, **kwargs):
+        self.options[label] = list(range(min_value, max_value + 1))
+        self.number_inputs.add(label)
+        return self.values.get(label, min_value)
+
+    def checkbox(self, label, value=False, **kwargs):
+        self.options[label] = [False, True]
+        return self.values.get(label, value)
+
+    def slider(self, label, min_value, max_value, value=None, **kwargs):
+        values = range(min_value, max_value + 1)
+        self.options[label] = [
+            (a, b) for a in values for b in values if a <= b
+        ]
+        return self.values.get(label, value)
+
+    def text_input(self, label, value='', **kwargs):
+        self.options[label] = list(SEARCH_QUERIES)
+        return self.values.get(label, value)
+
+    def image(self, image, **kwargs):
+        self.payloads['image'] = self.payloads.get('image', 0) + len(image)
+
+    def html(self, html, **kwargs):
+        self.payloads['html'] = self.payloads.get('html', 0) + len(html)
+
+
+def install_section_timers(app, timings):
+    """
+    Wraps the functions of each section of app.py so that the time spent in
+    them is added to timings
+    :param app: The imported app module
+    :type app: module
+    :param timings: Dictionary where key is a section name and value is the
+        time (s) spent in it during the current rerun
+    :type timings: dict
+    :return: None
+    :rtype: None
+    """
+
+    active = set()
+
+    def timed(section, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            # Only the outermost call of a section is counted
+            if section in active:
+                return func(*args, **kwargs)
+            active.add(section)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timings[section] += time.perf_counter() - start
+                active.discard(section)
+
+        return wrapper
+
+    for section, names in SECTIONS.items():
+        for name in names:
+            setattr(app, name, timed(section, getattr(app, name)))
+    return None
+
+
+def simulate_interactions(
+    interactions, seed, server_charts=False, step=False, think_time=0.0
+):
+    """
+    Reruns app.run() after each simulated interaction
+    :param interactions: Number of interactions to simulate
+    :type interactions: int
+    :param seed: Seed of the random widget changes
+    :type seed: int
+    :param server_charts: If True, the character charts are built on the
+        server (as when the client bundle has not been built)
+    :type server_charts: bool
+    :param step: If True, every interaction steps a number input (the
+        episode selector) forward or back by one instead of changing a random
+        widget
+    :type step: bool
+    :param think_time: Seconds to wait between reruns, as a user would (and
+        as background work such as prefetching would get to run)
+    :type think_time: float
+    :return: One dictionary per rerun (the first is the cold start) with the
+        rerun time, the time of each section, and the payload sizes
+    :rtype: list
+    """
+    st = StubStreamlit()
+    sys.modules['streamlit'] = st
+    import app
+
+    if server_charts:
+        app.load_client_chart_html = lambda: None
+    timings = {}
+    install_section_timers(app, timings)
+    rng = random.Random(seed)
+    reruns = []
+    for i in range(interactions + 1):
+        if i > 0:
+            time.sleep(think_time)
+        if i > 0 and step:
+            for label in st.number_inputs:
+                options = st.options[label]
+                value = st.values.get(label, options[0]) + rng.choice(
+                    (-1, 1, 1)
+                )
+                st.values[label] = min(max(value, options[0]), options[-1])
+        elif i > 0:
+            label = rng.choice(sorted(st.options))
+            st.values[label] = rng.choice(st.options[label])
+        timings.update({section: 0.0 for section in SECTIONS})
+        st.payloads.clear()
+        start = time.perf_counter()
+        app.run()
+        rerun = {'rerun': time.perf_counter() - start}
+        rerun.update(timings)
+        rerun.update({f'{k}_bytes': v for k, v in st.payloads.items()})
+        reruns.append(rerun)
+    return reruns
+
+
+def percentile(values, q):
+    """
+    :param values: Sample
+    :type values: list
+    :param q: Percentile (0 to 100)
+    :type q: int
+    :return: The q-th percentile of the sample (nearest rank)
+    :rtype: float
+    """
+    ordered = sorted(values)
+    return ordered[max(0, -(-q * len(ordered) // 100) - 1)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--interactions',
+        '-N',
+        type=int,
+        default=200,
+        help='Number of interactions to simulate',
+    )
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=0,
+        help='Seed of the random widget changes',
+    )
+    parser.add_argument(
+        '--server_charts',
+        action='store_true',
+        help='Build the character charts on the server instead of using the '
+        'client bundle',
+    )
+    parser.add_argument(
+        '--step',
+        action='store_true',
+        help='Step the episode selector by one at each interaction',
+    )
+    parser.add_argument(
+        '--think_time',
+        '-T',
+        type=float,
+        default=0.0,
+        help='Seconds to wait between interactions',
+    )
+    parser.add_argument(
+        '--budget',
+        '-B',
+        type=float,
+        default=RERUN_P95_BUDGET,
+        help='Maximum p95 rerun time in seconds',
+    )
+    args = parser.parse_args()
+    logger = create_logger('interaction_benchmark')
+    all_reruns = simulate_interactions(
+        args.interactions,
+        args.seed,
+        args.server_charts,
+        args.step,
+        args.think_time,
+    )
+    cold, warm = all_reruns[0], all_reruns[1:]
+    logger.info(f"cold start rerun: {cold['rerun']:.3f}s")
+    for metric in dict.fromkeys(k for rerun in warm for k in rerun):
+        sample = [rerun.get(metric, 0) for rerun in warm]
+        if metric.endswith('_bytes'):
+            logger.info(
+                f'{metric}: p50 {percentile(sample, 50):,.0f}, '
+                f'p95 {percentile(sample, 95):,.0f}'
+            )
+        else:
+            logger.info(
+                f'{metric}: p50 {percentile(sample, 50) * 1000:.1f}ms, '
+                f'p95 {percentile(sample, 95) * 1000:.1f}ms, '
+                f'mean {statistics.mean(sample) * 1000:.1f}ms'
+            )
+    p95 = percentile([rerun['rerun'] for rerun in warm], 95)
+    if p95 > args.budget:
+        logger.error(f'p95 rerun time exceeds budget of {args.budget:.3f}s')
+        sys.exit(1)
+    sys.exit(0)
@@ -0,0 +1,101 @@
+"""
+Checks that the window kernel reproduces the original two-pointer closeness
+counts and exchanges on every pair of every scene in scenes.pkl.
+"""
+import itertools
+import os
+import sys
+
+import pytest
+
+p = os.path.abspath('.')
+sys.path.insert(1, p)
+
+from B_episode_dicts.closeness_kernel import ClosenessKernel
+from B_episode_dicts.save_and_load_dict import open_scenes_as_pkl
+from B_episode_dicts.tma_episode_processor import TMAEpisode
+
+
+def two_pointer_count(list_1, list_2, lines_needed):
+    """
+    Number of times two characters speak within lines_needed lines of each
+    other, as counted before the closeness kernels were added
+    """
+    l_idx, r_idx, counter, curr_count = 0, 0, 0, 0
+    for num in list_1:
+        while l_idx < len(list_2) and num - list_2[l_idx] > lines_needed:
+            l_idx += 1
+            curr_count -= 1
+        while r_idx < len(list_2) and list_2[r_idx] - num <= lines_needed:
+            r_idx += 1
+            curr_count += 1
+        counter += curr_count
+    return counter
+
+
+def two_pointer_exchanges(list_1, list_2, lines_needed):
+    """
+    Exchanges of two characters, as found before the closeness kernels were
+    added
+    """
+    ranges = []
+    l_idx, r_idx = 0, 0
+    for num in list_1:
+        while l_idx < len(list_2) and num - list_2[l_idx] > lines_needed:
+            l_idx += 1
+        while r_idx < len(list_2) and list_2[r_idx] - num <= lines_needed:
+            r_idx += 1
+        for other in list_2[l_idx:r_idx]:
+            ranges.append((min(num, other), max(num, other)))
+    exchanges = []
+    for start, end in sorted(ranges):
+        if exchanges and start <= exchanges[-1][1]:
+            exchanges[-1][1] = max(exchanges[-1][1], end)
+            exchanges[-1][2] += 1
+        else:
+            exchanges.append([start, end, 1])
+    return [tuple(exchange) for exchange in exchanges]
+
+
+@pytest.fixture(scope='module')
+def scenes():
+    scenes = []
+    for e, speaker_info_in_scenes in open_scenes_as_pkl().items():
+        episode = TMAEpisode(e, logging_level='WARNING')
+        episode.speaker_info_in_scenes = speaker_info_in_scenes
+        episode.resolve_aliases()
+        scenes.extend(
+            scene_info
+            for scene_info in episode.character_info_in_scenes.values()
+            if len(scene_info) > 1
+        )
+    return scenes
+
+
+@pytest.mark.parametrize('lines_needed', [1, 3, 8])
+def test_window_kernel_matches_two_pointer_count(scenes, lines_needed):
+    kernel = ClosenessKernel('window', lines_needed)
+    for scene_info in scenes:
+        characters, scores = kernel.scene_scores(scene_info)
+        for (i, c1), (j, c2) in itertools.combinations(
+            enumerate(characters), 2
+        ):
+            expected = two_pointer_count(
+                scene_info[c1]['appearances'],
+                scene_info[c2]['appearances'],
+                lines_needed,
+            )
+            assert scores[i, j] == expected
+            assert scores[j, i] == expected
+
+
+@pytest.mark.parametrize('lines_needed', [1, 3, 8])
+def test_window_kernel_matches_two_pointer_exchanges(scenes, lines_needed):
+    kernel = ClosenessKernel('window', lines_needed)
+    for scene_info in scenes:
+        for c1, c2 in itertools.combinations(scene_info, 2):
+            list_1 = scene_info[c1]['appearances']
+            list_2 = scene_info[c2]['appearances']
+            assert kernel.exchanges(list_1, list_2) == (
+                two_pointer_exchanges(list_1, list_2, lines_needed)
+            )
@@ -0,0 +1,409 @@
+"""
+Single entry point for rebuilding the project's artifacts.
+
+    python tma.py build texts       # .epub -> tma_text_from_epub.pkl
+    python tma.py build dicts       # transcripts -> episode dicts
+    python tma.py build index       # transcripts -> transcript search index
+    python tma.py build bundle      # episode dicts -> client chart bundle
+    python tma.py build animation   # episode dicts -> client animation
+    python tma.py build all         # all of the above, in one process
+    python tma.py batch <CORPUS .yaml FILES>  # several corpora, one pool
+
+Stages run in a single process. With "all", the transcripts and episode dicts
+are handed from one stage to the next in memory; the .pkl, .npz and .gz
+files are only written as outputs, never read back. Stage modules are
+imported when their stage runs, so e.g. "build dicts" does not need ebooklib
+and does not import matplotlib. The animation is animated in the browser
+from per-episode data; add --video to also render it as .mp4 files.
+
+"batch" builds the dicts and network charts of several corpora on one
+shared process pool, each in its own output namespace (see batch_runner.py).
+"""
+import argparse
+import os
+
+from utils import create_logger, get_config
+
+CONFIG = get_config()
+MAX_EPISODE = CONFIG['MAX_EPISODE']
+TEXT_DIRECTORY = CONFIG['TEXT_DIRECTORY']
+DICT_DIRECTORY = CONFIG['DICT_DIRECTORY']
+ANIMATION = CONFIG['ANIMATION']
+BATCH = CONFIG['BATCH']
+BUILD_STAGES = ('texts', 'dicts', 'index', 'bundle', 'animation', 'all')
+
+
+def build_texts(epub_location, logger):
+    """
+    Extracts the episode texts from the .epub and saves them
+    :param epub_location: Location of the .epub file
+    :type epub_location: str
+    :param logger: logging.Logger object
+    :type logger: logging.Logger object
+    :return: Dictionary where key is an episode number and value is the
+        episode text
+    :rtype: dict
+    """
+    from A_episode_texts.extract_episode_text_from_epub import (
+        extract_episode_texts,
+        save_episode_texts,
+    )
+
+    episode_texts = extract_episode_texts(epub_location)
+    save_episode_texts(episode_texts)
+    logger.info(f'Extracted {len(episode_texts)} episode texts')
+    return episode_texts
+
+
+def build_dicts(
+    start_episode, end_episode, directory, logger, episode_texts=None
+):
+    """
+    Generates and saves the episode dicts, scenes and graph metrics
+    :param start_episode: First episode to appear in the dicts
+    :type start_episode: int
+    :param end_episode: Last episode to appear in the dicts
+    :type end_episode: int
+    :param directory: Directory to which to save the dicts
+    :type directory: str
+    :param logger: logging.Logger object
+    :type logger: logging.Logger object
+    :param episode_texts: Dictionary where key is an episode number and value
+        is the episode text. If not provided, it is loaded from the text
+        directory
+    :type episode_texts: dict
+    :return: Output of generate_episode_dicts
+    :rtype: dict
+    """
+    from B_episode_dicts.generate_episode_dicts import (
+        generate_episode_dicts,
+        save_episode_dicts,
+    )
+
+    scenes = {}
+    episode_dicts = generate_episode_dicts(
+        start_episode, end_episode, logger, scenes, episode_texts
+    )
+    save_episode_dicts(episode_dicts, directory, scenes, logger)
+    return episode_dicts
+
+
+def build_index(start_episode, end_episode, logger, episode_texts=None):
+    """
+    Builds and saves the full-text index of the transcripts
+    :param start_episode: First episode to index
+    :type start_episode: int
+    :param end_episode: Last episode to index
+    :type end_episode: int
+    :param logger: logging.Logger object
+    :type logger: logging.Logger object
+    :param episode_texts: Dictionary where key is an episode number and value
+        is the episode text. If not provided, it is loaded from the text
+        directory
+    :type episode_texts: dict
+    :return: Output of build_transcript_index
+    :rtype: dict
+    """
+    from B_episode_dicts.transcript_index import (
+        build_transcript_index,
+        save_transcript_index,
+    )
+
+    arrays = build_transcript_index(
+        start_episode, end_episode, episode_texts, logger
+    )
+    save_transcript_index(arrays, logger=logger)
+    return arrays
+
+
+def build_bundle(end_episode, directory, logger, episode_dicts=None):
+    """
+    Exports the data behind the per-character charts for client-side
+    rendering
+    :param end_episode: Last episode to include in the charts
+    :type end_episode: int
+    :param directory: Directory from which to load the dicts if episode_dicts
+        is not provided
+    :type directory: str
+    :param logger: logging.Logger object
+    :type logger: logging.Logger object
+    :param episode_dicts: Output of generate_episode_dicts. If not provided,
+        the dicts are loaded from the directory
+    :type episode_dicts: dict
+    :return: Output of build_client_bundle
+    :rtype: dict
+    """
+    from B_episode_dicts.appearance_matrices import open_appearance_matrices
+    from B_episode_dicts.interaction_index import (
+        InteractionIndex,
+        open_interaction_index,
+    )
+    from C_episode_charts.client_bundle import (
+        build_client_bundle,
+        save_client_bundle,
+    )
+    from C_episode_charts.retrieve_en import retrieve_included_edges_and_nodes
+
+    if episode_dicts is None:
+        episode_dicts = {}
+    nodes_incl, edges_incl = retrieve_included_edges_and_nodes(
+        directory,
+        node_appearance_dict=episode_dicts.get('na'),
+        edges_appearance_dict=episode_dicts.get('ea'),
+    )
+    matrices = episode_dicts.get('appearance_matrices')
+    if matrices is None:
+        matrices = open_appearance_matrices(directory)
+    if 'interaction_index' in episode_dicts:
+        interaction_index = InteractionIndex(
+            episode_dicts['interaction_index']
+        )
+    else:
+        interaction_index = open_interaction_index(directory)
+    bundle = build_client_bundle(
+        matrices, nodes_incl, edges_incl, end_episode, interaction_index
+    )
+    save_client_bundle(bundle, logger=logger)
+    return bundle
+
+
+def build_animation(
+    start_episode,
+    end_episode,
+    directory,
+    bitrates,
+    logger,
+    episode_dicts=None,
+    video=False,
+):
+    """
+    Exports the network chart animation for the browser and, optionally,
+    renders it as video
+    :param start_episode: First episode to include in the animation
+    :type start_episode: int
+    :param end_episode: Last episode to include in the animation
+    :type end_episode: int
+    :param directory: Directory from which to load the dicts if episode_dicts
+        is not provided
+    :type directory: str
+    :param bitrates: Additional bitrates (kbps) at which to save the animation
+    :type bitrates: list
+    :param logger: logging.Logger object
+    :type logger: logging.Logger object
+    :param episode_dicts: Output of generate_episode_dicts. If not provided,
+        the dicts are loaded from the directory
+    :type episode_dicts: dict
+    :param video: Whether to also render the frames and save the .mp4 files
+    :type video: bool
+    :return: Output of build_animation_bundle, and the locations of the
+        saved videos (empty unless video is True)
+    :rtype: dict, list
+    """
+    from C_episode_charts.client_animation import (
+        build_animation_bundle,
+        save_animation_bundle,
+    )
+    from C_episode_charts.generate_network_charts import TMANetworkChart
+    from C_episode_charts.retrieve_en import retrieve_included_edges_and_nodes
+
+    if episode_dicts is None:
+        episode_dicts = {}
+    nodes_incl, edges_incl = retrieve_included_edges_and_nodes(
+        directory,
+        node_appearance_dict=episode_dicts.get('na'),
+        edges_appearance_dict=episode_dicts.get('ea'),
+    )
+    episode_dict_dict = None
+    if 'individual' in episode_dicts:
+        episode_dict_dict = {
+            'individual': episode_dicts['individual'],
+            'cumulative': episode_dicts['cumulative'],
+        }
+    chart = TMANetworkChart(
+        directory,
+        logging_level=logger.level,
+        episode_dict_dict=episode_dict_dict,
+    )
+    bundle = build_animation_bundle(
+        chart, nodes_incl, edges_incl, start_episode, end_episode
+    )
+    save_animation_bundle(bundle, logger=logger)
+    video_locations = []
+    if video:
+        from C_episode_charts.animate_network_chart import (
+            animate_network_chart,
+        )
+
+        video_locations = animate_network_chart(
+            start_episode,
+            end_episode,
+            bitrates,
+            chart,
+            nodes_incl,
+            edges_incl,
+            logger,
+        )
+    return bundle, video_locations
+
+
+def build(args, logger):
+    """
+    Runs the requested build stage(s)
+    :param args: Parsed command line arguments
+    :type args: argparse.Namespace
+    :param logger: logging.Logger object
+    :type logger: logging.Logger object
+    :return: None
+    :rtype: None
+    """
+    episode_texts = None
+    episode_dicts = None
+    if args.stage == 'texts' or (
+        args.stage == 'all' and os.path.exists(args.epub)
+    ):
+        episode_texts = build_texts(args.epub, logger)
+    elif args.stage == 'all':
+        from B_episode_dicts.tma_episode_processor import open_episode_texts
+
+        logger.info(
+            f'{args.epub} not found, using the saved episode texts instead'
+        )
+        episode_texts = open_episode_texts()
+    if args.stage in ('dicts', 'all'):
+        episode_dicts = build_dicts(
+            args.start_episode,
+            args.end_episode,
+            args.save_dir,
+            logger,
+            episode_texts,
+        )
+    if args.stage in ('index', 'all'):
+        build_index(
+            args.start_episode, args.end_episode, logger, episode_texts
+        )
+    if args.stage in ('bundle', 'all'):
+        build_bundle(args.end_episode, args.save_dir, logger, episode_dicts)
+    if args.stage in ('animation', 'all'):
+        build_animation(
+            args.start_episode,
+            args.end_episode,
+            args.save_dir,
+            args.bitrates,
+            logger,
+            episode_dicts,
+            args.video,
+        )
+    return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser(
+        'build',
+        help='Rebuild the texts, dicts, index, bundle, and/or animation',
+    )
+    build_parser.add_argument(
+        'stage',
+        choices=BUILD_STAGES,
+        help='Stage to run. "all" runs every stage, passing outputs between '
+        'them in memory',
+    )
+    build_parser.add_argument(
+        '--start_episode',
+        '-S',
+        type=int,
+        default=1,
+        choices=range(1, MAX_EPISODE + 1),
+        help='First episode to include in the dicts, index, and animation',
+    )
+    build_parser.add_argument(
+        '--end_episode',
+        '-E',
+        type=int,
+        default=MAX_EPISODE,
+        choices=range(1, MAX_EPISODE + 1),
+        help='Last episode to include in the dicts, index, bundle, and animation',
+    )
+    build_parser.add_argument(
+        '--save_dir',
+        '-D',
+        type=str,
+        default=DICT_DIRECTORY,
+        help='Directory to which to save (or from which to load) the dicts',
+    )
+    build_parser.add_argument(
+        '--epub',
+        type=str,
+        default=f'{TEXT_DIRECTORY}/the_magnus_archives.epub',
+        help='Location of the .epub file containing the transcripts',
+    )
+    build_parser.add_argument(
+        '--bitrates',
+        '-B',
+        type=int,
+        nargs='*',
+        default=ANIMATION['BITRATES'],
+        help='Additional bitrates (kbps) at which to save the video',
+    )
+    build_parser.add_argument(
+        '--video',
+        action='store_true',
+        help='Also render the animation as .mp4 files (requires ffmpeg)',
+    )
+    build_parser.add_argument(
+        '--logging_level',
+        '-L',
+        type=str.upper,
+        default='info',
+        help='Python logging level',
+    )
+    batch_parser = subparsers.add_parser(
+        'batch',
+        help='Build the dicts and network charts of several corpora on one '
+        'process pool',
+    )
+    batch_parser.add_argument(
+        'corpora',
+        nargs='+',
+        help='Corpus .yaml files (see corpora/tma.yaml)',
+    )
+    batch_parser.add_argument(
+        '--workers',
+        '-W',
+        type=int,
+        default=BATCH['WORKERS'],
+        help='Number of worker processes shared by all corpora',
+    )
+    batch_parser.add_argument(
+        '--output_dir',
+        '-O',
+        type=str,
+        default=BATCH['OUTPUT_DIRECTORY'],
+        help='Directory in which each corpus gets its own namespace',
+    )
+    batch_parser.add_argument(
+        '--no_charts',
+        action='store_true',
+        help='Only build the dicts',
+    )
+    batch_parser.add_argument(
+        '--logging_level',
+        '-L',
+        type=str.upper,
+        default='info',
+        help='Python logging level',
+    )
+    args = parser.parse_args()
+    logger = create_logger('tma', logging_level=args.logging_level)
+    logger.info(vars(args))
+    if args.command == 'batch':
+        from batch_runner import Corpus, log_throughput, run_batch
+
+        corpora = [Corpus.from_file(c, args.output_dir) for c in args.corpora]
+        stats = run_batch(corpora, args.workers, not args.no_charts, logger)
+        log_throughput(stats, logger)
+    else:
+        if args.end_episode < args.start_episode:
+            parser.error('Start episode # must be less than end episode #')
+        build(args, logger)
@@ -1,4 +1,8 @@
+import functools
+import importlib
 import logging
+import sys
+import types
 
 import yaml
 
@@ -11,6 +15,46 @@ def load_config(filename='config.yaml'):
     return cfg
 
 
+@functools.lru_cache(maxsize=None)
+def get_config(filename='config.yaml'):
+    """
+    Returns the parsed config, reading the file only on the first call for
+    each filename. The returned dict is shared, so treat it as read-only
+    :param filename: Path to the config file
+    :type filename: str
+    :return: Parsed config
+    :rtype: dict
+    """
+    return load_config(filename)
+
+
+class LazyModule(types.ModuleType):
+    """
+    A module placeholder that imports the real module the first time one of
+    its attributes is accessed. Used for the heavy chart backends (pandas,
+    plotly, networkx, matplotlib) so that importing a module that uses them
+    stays cheap until a chart is actually drawn.
+    """
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+
+def lazy_import(module_name):
+    """
+    :param module_name: Fully qualified module name (e.g. 'matplotlib.pyplot')
+    :type module_name: str
+    :return: The module if it has already been imported, otherwise a
+        LazyModule placeholder for it
+    :rtype: module
+    """
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    return LazyModule(module_name)
+
+
 def create_logger(logger_name, logging_level='INFO'):
     """
     Creates a logging.Logger object and adds a StreamHandler if one is not